@@ -0,0 +1,193 @@
+# Libraries
+import os
+import sys
+import glob
+import html
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import matplotlib
+matplotlib.use("Agg")  # Headless rendering, also in the worker processes
+import matplotlib.pyplot as plt
+from missions_logs import load_missions_log, mission_rows
+from battery_consumption import battery_pivot_table, battery_usage_from_mission_rows
+from mission_figures import altitude_frame, plot_altitudes, plot_battery_consumption
+
+# The RSSI tools live with the Mininet-WiFi scripts
+RSSI_TOOLS_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Scripts", "Network", "mininet")
+sys.path.insert(0, RSSI_TOOLS_DIRECTORY)
+from generate_rssi_graph import read_rssi_files, plot_rssi_data
+
+# -----------------------------------------------------------------------------------------------------
+
+# Version of the rendered reports. Changing it renders every run again
+REPORT_VERSION = 1
+
+# Index of the rendered reports, written in the output directory
+INDEX_FILE = "index.json"
+INDEX_PAGE = "index.html"
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to find the reports to render in a directory tree
+def find_report_jobs(input_directory):
+    """One job per MissionsLogs_*.csv, and one job per directory for its DRO*.csv RSSI files."""
+    jobs = []
+    for directory, _, _ in sorted(os.walk(input_directory)):
+        relative_directory = os.path.relpath(directory, input_directory)
+        prefix = "" if relative_directory == "." else relative_directory + "/"
+
+        for csv_file in sorted(glob.glob(os.path.join(directory, "MissionsLogs_*.csv"))):
+            stem = os.path.splitext(os.path.basename(csv_file))[0]
+            jobs.append({"name": prefix + stem, "kind": "mission", "inputs": [csv_file]})
+
+        # The same files generate_rssi_graph.read_rssi_files reads
+        rssi_files = sorted(glob.glob(os.path.join(directory, "DRO*.csv")))
+        if rssi_files:
+            jobs.append({"name": prefix + "rssi", "kind": "rssi", "inputs": rssi_files})
+    return jobs
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to hash the content of the inputs of a report
+def content_hash(paths):
+    """SHA-1 of the report version and of the names and bytes of the input files."""
+    digest = hashlib.sha1(f"report-v{REPORT_VERSION}".encode("utf-8"))
+    for path in paths:
+        digest.update(os.path.basename(path).encode("utf-8") + b"\0")
+        with open(path, "rb") as file:
+            for block in iter(lambda: file.read(1024 * 1024), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to render the altitude and battery figures of one mission log
+def render_mission_report(csv_file, output_directory):
+    """Save altitude.png and battery.png for a MissionsLogs CSV and return their names."""
+    df = mission_rows(load_missions_log(csv_file))
+    pivot_table = battery_pivot_table(battery_usage_from_mission_rows(df))
+
+    figures = {
+        "altitude.png": plot_altitudes(altitude_frame(df)),
+        "battery.png": plot_battery_consumption(pivot_table),
+    }
+    for name, fig in figures.items():
+        fig.savefig(os.path.join(output_directory, name))
+        plt.close(fig)
+    return list(figures)
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to render the RSSI figure of a directory
+def render_rssi_report(directory, output_directory):
+    """Save rssi.png for the DRO*.csv files of a directory and return its name."""
+    plot_rssi_data(read_rssi_files(directory), os.path.join(output_directory, "rssi.png"))
+    return ["rssi.png"]
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to render one report in a worker process
+def render_job(job, output_root):
+    """Render the figures of a job and return its index entry."""
+    start = time.perf_counter()
+    output_directory = os.path.join(output_root, job["name"])
+    os.makedirs(output_directory, exist_ok=True)
+
+    entry = dict(job)
+    try:
+        if job["kind"] == "mission":
+            outputs = render_mission_report(job["inputs"][0], output_directory)
+        else:
+            outputs = render_rssi_report(os.path.dirname(job["inputs"][0]), output_directory)
+        entry["outputs"] = [f"{job['name']}/{name}" for name in outputs]
+    except Exception as e:
+        entry["outputs"] = []
+        entry["error"] = f"{type(e).__name__}: {e}"
+    entry["render_seconds"] = round(time.perf_counter() - start, 3)
+    return entry
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to read the index of a previous batch
+def read_index(output_root):
+    """Return the entries of the previous index by job name."""
+    try:
+        with open(os.path.join(output_root, INDEX_FILE)) as file:
+            return {entry["name"]: entry for entry in json.load(file)["reports"]}
+    except (OSError, ValueError, KeyError):
+        return {}
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to write the index of the rendered reports
+def write_index(output_root, entries):
+    """Write index.json and an index.html page showing every figure."""
+    entries = sorted(entries, key=lambda entry: entry["name"])
+    with open(os.path.join(output_root, INDEX_FILE), "w") as file:
+        json.dump({"version": REPORT_VERSION, "reports": entries}, file, indent=2)
+
+    sections = []
+    for entry in entries:
+        images = "".join(f'<img src="{html.escape(output)}" width="600">' for output in entry["outputs"])
+        error = f'<p>{html.escape(entry["error"])}</p>' if "error" in entry else ""
+        sections.append(f"<h2>{html.escape(entry['name'])}</h2>{error}{images}")
+    with open(os.path.join(output_root, INDEX_PAGE), "w") as file:
+        file.write("<html><head><title>UNetyEmu reports</title></head><body>\n" + "\n".join(sections) + "\n</body></html>\n")
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to render the reports of every run that changed
+def generate_reports(input_directory, output_root, workers=None, force=False):
+    """Render the new or changed runs in a process pool and return (rendered, skipped, failed) counts."""
+    os.makedirs(output_root, exist_ok=True)
+    previous = read_index(output_root)
+
+    entries = []
+    pending = []
+    for job in find_report_jobs(input_directory):
+        job["hash"] = content_hash(job["inputs"])
+        job["inputs"] = [os.path.abspath(path) for path in job["inputs"]]
+        entry = previous.get(job["name"])
+        up_to_date = (entry is not None and entry.get("hash") == job["hash"] and "error" not in entry and
+                      all(os.path.exists(os.path.join(output_root, output)) for output in entry["outputs"]))
+        if up_to_date and not force:
+            entries.append(entry)
+        else:
+            pending.append(job)
+
+    failed = 0
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(render_job, job, output_root) for job in pending]
+            for future in as_completed(futures):
+                entry = future.result()
+                entries.append(entry)
+                if "error" in entry:
+                    failed += 1
+                    print(f"{entry['name']}: FAILED ({entry['error']})")
+                else:
+                    print(f"{entry['name']}: {', '.join(entry['outputs'])} ({entry['render_seconds']:.2f} s)")
+
+    write_index(output_root, entries)
+    return len(pending) - failed, len(entries) - len(pending), failed
+
+# -----------------------------------------------------------------------------------------------------
+
+# Main function
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Render the mission and RSSI figures of every simulation run.")
+    parser.add_argument("input_directory", help="Directory (searched recursively) with MissionsLogs_*.csv and DRO*_rssi.csv files")
+    parser.add_argument("--output", default="reports", help="Directory of the figures and of the index")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per CPU)")
+    parser.add_argument("--force", action="store_true", help="Render every run, even unchanged ones")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    rendered, skipped, failed = generate_reports(args.input_directory, args.output, args.workers, args.force)
+    print(f"{rendered} rendered, {skipped} unchanged, {failed} failed in {time.perf_counter() - start:.2f} s. "
+          f"Index: {os.path.join(args.output, INDEX_PAGE)}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,217 @@
+# Libraries
+import sys
+import argparse
+import itertools
+import pandas as pd
+from missions_logs import MISSIONS_LOG_DTYPES, NO_MISSION, TIME_FORMAT, find_missions_logs, load_missions_log, mission_rows
+
+# -----------------------------------------------------------------------------------------------------
+
+# Columns needed by the battery analysis
+BATTERY_COLUMNS = ["PlayerName", "CurrentTime", "BatteryLevel", "CurrentState", "MissionId"]
+
+# Keys of the battery level differences and of the consumption totals
+DRONE_KEYS = ["MissionId", "PlayerName"]
+STATE_KEYS = ["MissionId", "PlayerName", "CurrentState"]
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to compute the battery consumption per state of a loaded MissionsLogs DataFrame
+def battery_usage_from_frame(df):
+    """In-memory computation: sort the whole log, diff the battery level per drone and sum it per state."""
+    return battery_usage_from_mission_rows(mission_rows(df))
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to compute the battery consumption per state of rows already filtered by mission_rows
+def battery_usage_from_mission_rows(df):
+    """Same as battery_usage_from_frame, for callers that already filtered and sorted the log with mission_rows."""
+
+    # Calculate battery consumption for each state by taking the absolute difference in BatteryLevel
+    consumption = df.groupby(DRONE_KEYS, observed=False)['BatteryLevel'].diff().abs().fillna(0)
+
+    # Group by MissionId, PlayerName, and CurrentState to get total battery consumption per state
+    return df.assign(BatteryConsumption=consumption).groupby(STATE_KEYS, observed=False)['BatteryConsumption'].sum().reset_index()
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to pivot the battery consumption per drone and state
+def battery_pivot_table(battery_usage):
+    """Average the per-mission consumption of every drone and state, as plotted by plotMissionsLogsResult.py."""
+    return battery_usage.pivot_table(index=['PlayerName'], columns='CurrentState', values='BatteryConsumption',
+                                     fill_value=0, observed=False)
+
+# -----------------------------------------------------------------------------------------------------
+
+# Class to aggregate the battery consumption of a mission log chunk by chunk
+class BatteryConsumptionAggregator:
+    """Streaming equivalent of battery_usage_from_frame.
+
+    Instead of sorting the whole log, every chunk is sorted by time on its own and the last battery level
+    of every (MissionId, PlayerName) is carried across chunks, so memory only grows with the number of
+    missions, drones and states. The result is the one of the sorted computation as long as no row goes
+    back in time before the last row of its drone in an earlier chunk, which holds for logs written by
+    Unity. Such late rows raise a ValueError before anything is aggregated, or with strict=False are
+    aggregated in file order and counted in out_of_order.
+    """
+
+    def __init__(self, strict=True):
+        self.strict = strict
+        self.last_level = pd.Series(dtype="float64", index=pd.MultiIndex.from_tuples([], names=DRONE_KEYS))
+        self.last_time = pd.Series(dtype="datetime64[us]", index=pd.MultiIndex.from_tuples([], names=DRONE_KEYS))
+        self.totals = pd.Series(dtype="float64", index=pd.MultiIndex.from_tuples([], names=STATE_KEYS))
+        self.missions = {}  # Ordered set of the missions, in order of appearance
+        self.players = set()
+        self.states = set()
+        self.rows = 0
+        self.out_of_order = 0
+
+    def add_chunk(self, chunk):
+        """Accumulate one chunk of raw rows (columns as in the CSV, CurrentTime parsed or not)."""
+        chunk = chunk[BATTERY_COLUMNS].copy()
+        chunk["MissionId"] = chunk["MissionId"].fillna(NO_MISSION).astype(str)
+        chunk = chunk[chunk["MissionId"] != NO_MISSION]
+        if chunk.empty:
+            return self
+        if not pd.api.types.is_datetime64_any_dtype(chunk["CurrentTime"]):
+            chunk["CurrentTime"] = pd.to_datetime(chunk["CurrentTime"], format=TIME_FORMAT, errors="coerce")
+        for column in ["PlayerName", "CurrentState"]:
+            chunk[column] = chunk[column].astype(object)
+
+        # Stable sort, as the sorted computation: rows logged in the same second keep their file order, NaT last
+        chunk = chunk.sort_values("CurrentTime", kind="stable")
+
+        # Previous battery level of every row: the previous row of the drone in this chunk, or the carried one
+        drones = chunk.groupby(DRONE_KEYS, sort=False)
+        previous_level = drones["BatteryLevel"].shift()
+        previous_time = drones["CurrentTime"].shift()
+        first = ~chunk.duplicated(DRONE_KEYS)
+        first_keys = pd.MultiIndex.from_frame(chunk.loc[first, DRONE_KEYS])
+        previous_level[first] = self.last_level.reindex(first_keys).to_numpy()
+        previous_time[first] = self.last_time.reindex(first_keys).to_numpy()
+
+        # Rows before the carried row of their drone, or with a time when the carried row has none
+        carried = first.copy()
+        carried[first] = first_keys.isin(self.last_level.index)
+        late = (chunk["CurrentTime"] < previous_time) | (carried & previous_time.isna() & chunk["CurrentTime"].notna())
+        if late.any():
+            if self.strict:
+                row = chunk[late].iloc[0]
+                raise ValueError(f"{int(late.sum())} rows go back in time before a previous chunk, the first one of "
+                                 f"{row['PlayerName']} in mission {row['MissionId']} at {row['CurrentTime'].strftime(TIME_FORMAT)}: "
+                                 f"sort the log or read it in larger chunks")
+            self.out_of_order += int(late.sum())
+        self.rows += len(chunk)
+
+        # Battery consumption of every row, summed per state and added to the totals
+        chunk["BatteryConsumption"] = (chunk["BatteryLevel"] - previous_level).abs().fillna(0)
+        chunk_totals = chunk.groupby(STATE_KEYS, sort=False)["BatteryConsumption"].sum()
+        self.totals = self.totals.add(chunk_totals, fill_value=0)
+
+        # Carry the last row of every drone to the next chunk
+        last = chunk.drop_duplicates(DRONE_KEYS, keep="last").set_index(DRONE_KEYS)
+        self.last_level = pd.concat([self.last_level.drop(last.index, errors="ignore"), last["BatteryLevel"]])
+        self.last_time = pd.concat([self.last_time.drop(last.index, errors="ignore"), last["CurrentTime"]])
+
+        self.missions.update(dict.fromkeys(chunk["MissionId"].unique()))
+        self.players.update(chunk["PlayerName"].dropna().unique())
+        self.states.update(chunk["CurrentState"].dropna().unique())
+        return self
+
+    def battery_usage(self):
+        """Return the consumption of every (MissionId, PlayerName, CurrentState), 0 for the unseen ones."""
+        index = pd.MultiIndex.from_tuples(
+            list(itertools.product(self.missions, sorted(self.players), sorted(self.states))), names=STATE_KEYS)
+        totals = self.totals.reindex(index, fill_value=0.0)
+        return totals.rename("BatteryConsumption").reset_index()
+
+    def pivot_table(self):
+        """Return the average consumption per drone and state."""
+        return battery_pivot_table(self.battery_usage())
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to aggregate a mission log without loading it entirely
+def stream_battery_consumption(csv_file, chunksize=100000, strict=True):
+    """Read the CSV in chunks of chunksize rows and return the filled aggregator."""
+    aggregator = BatteryConsumptionAggregator(strict)
+    dtypes = {column: MISSIONS_LOG_DTYPES.get(column, "str") for column in BATTERY_COLUMNS}
+    for chunk in pd.read_csv(csv_file, usecols=BATTERY_COLUMNS, dtype=dtypes, chunksize=chunksize):
+        aggregator.add_chunk(chunk)
+    return aggregator
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to compute the battery consumption as the original plotMissionsLogsResult.py did
+def reference_pivot_table(csv_file):
+    """Original computation of plotMissionsLogsResult.py, kept as is as the reference of verify."""
+    df = pd.read_csv(csv_file)
+    df['MissionId'] = df['MissionId'].fillna('NoMission')
+    df['MissionStatus'] = df['MissionStatus'].fillna('NoMissionStatus')
+    df = df[df['MissionId'] != 'NoMission']
+    df['MissionId'] = pd.Categorical(df['MissionId'], categories=df['MissionId'].unique(), ordered=True)
+    df['CurrentTime'] = pd.to_datetime(df['CurrentTime'], format='%H:%M:%S', errors='coerce')
+    df.sort_values(by=['MissionId', 'PlayerName', 'CurrentTime'], inplace=True)
+    df['BatteryConsumption'] = df.groupby(['MissionId', 'PlayerName'], observed=False)['BatteryLevel'].diff().abs()
+    df['BatteryConsumption'] = df['BatteryConsumption'].fillna(0)
+    battery_usage = df.groupby(['MissionId', 'PlayerName', 'CurrentState'], observed=False)['BatteryConsumption'].sum().reset_index()
+    return battery_usage.pivot_table(index=['PlayerName'], columns='CurrentState', values='BatteryConsumption', fill_value=0, observed=False)
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to compare two battery pivot tables
+def compare_pivot_tables(result, expected):
+    """Return "OK", or "MISMATCH" followed by the differences."""
+    try:
+        pd.testing.assert_frame_equal(result.rename(index=str, columns=str), expected.rename(index=str, columns=str),
+                                      check_names=False, check_index_type=False, check_column_type=False,
+                                      check_exact=False, rtol=1e-12)
+    except AssertionError as e:
+        return f"MISMATCH\n{e}"
+    return "OK"
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to check the streaming aggregator and the in-memory computation against the original one
+def verify(csv_files, chunksizes=(1, 7, 100000)):
+    """Compare both computations with reference_pivot_table on every file and chunk size. Returns True if they all match."""
+    matched = True
+    for csv_file in csv_files:
+        expected = reference_pivot_table(csv_file)
+        status = compare_pivot_tables(battery_pivot_table(battery_usage_from_frame(load_missions_log(csv_file, use_cache=False))), expected)
+        matched &= status == "OK"
+        print(f"{csv_file} | in memory | {status}")
+        for chunksize in chunksizes:
+            try:
+                aggregator = stream_battery_consumption(csv_file, chunksize=chunksize)
+                status = compare_pivot_tables(aggregator.pivot_table(), expected)
+                rows = aggregator.rows
+            except ValueError as e:
+                status, rows = f"FAILED\n{e}", "-"
+            matched &= status == "OK"
+            print(f"{csv_file} | chunks of {chunksize} rows | {rows} rows | {status}")
+    return matched
+
+# -----------------------------------------------------------------------------------------------------
+
+# Main function
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Battery consumption per drone and state of large mission logs.")
+    parser.add_argument("paths", nargs="*", default=["."], help="MissionsLogs CSV files, directories or glob patterns")
+    parser.add_argument("--chunksize", type=int, default=100000, help="Rows read per chunk")
+    parser.add_argument("--verify", action="store_true", help="Compare with the in-memory computation on the given logs")
+    args = parser.parse_args()
+
+    csv_files = find_missions_logs(args.paths)
+    if args.verify:
+        sys.exit(0 if verify(csv_files, chunksizes=(1, 7, args.chunksize)) else 1)
+
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        for csv_file in csv_files:
+            try:
+                aggregator = stream_battery_consumption(csv_file, chunksize=args.chunksize)
+            except ValueError as e:
+                sys.exit(f"{csv_file}: {e}")
+            print(f"{csv_file} ({aggregator.rows} mission rows)")
+            print(aggregator.pivot_table().round(3))
@@ -0,0 +1,306 @@
+# Libraries
+import io
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use("Agg")  # Headless rendering: the figures are written to files while the run goes on
+import matplotlib.pyplot as plt
+from missions_logs import MISSIONS_LOG_DTYPES, NO_MISSION, TIME_FORMAT, find_missions_logs, load_missions_log, mission_rows, mission_seconds
+from battery_consumption import BATTERY_COLUMNS, BatteryConsumptionAggregator, battery_pivot_table, battery_usage_from_mission_rows
+from mission_figures import altitude_frame, plot_altitudes, plot_battery_consumption
+
+# -----------------------------------------------------------------------------------------------------
+
+# Columns read from the appended rows
+FOLLOW_COLUMNS = BATTERY_COLUMNS + ["Altitude"]
+
+# Files written in the output directory at every refresh
+ALTITUDE_FIGURE = "altitude.png"
+BATTERY_FIGURE = "battery.png"
+SUMMARY_FILE = "summary.json"
+
+# -----------------------------------------------------------------------------------------------------
+
+# Class to read the complete lines appended to a file since the last read
+class LogTail:
+    """Keep the byte offset of a CSV being written and return only its new complete lines.
+
+    The last line may still be incomplete when it is read: the bytes after the last newline are kept and
+    completed by the next read. A file that got shorter was replaced, and is read again from the start.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.header = None
+        self.partial = b""
+
+    def read(self):
+        """Return the new complete lines as bytes, without the header, and whether the file was restarted."""
+        restarted = False
+        with open(self.path, "rb") as file:
+            if os.fstat(file.fileno()).st_size < self.offset:
+                self.offset, self.header, self.partial = 0, None, b""
+                restarted = True
+            file.seek(self.offset)
+            data = file.read()
+        self.offset += len(data)
+
+        data = self.partial + data
+        end = data.rfind(b"\n") + 1
+        self.partial = data[end:]
+        data = data[:end]
+
+        if self.header is None and data:
+            header_end = data.index(b"\n") + 1
+            self.header, data = data[:header_end], data[header_end:]
+        return data, restarted
+
+# -----------------------------------------------------------------------------------------------------
+
+# Class to keep a bounded, evenly decimated time series
+class DecimatedSeries:
+    """Keep every stride-th point of a series, doubling the stride when more than max_points are kept.
+
+    Memory and plotting cost stay bounded by max_points however long the run is. The kept points are the
+    ones whose index is a multiple of the stride, so they stay evenly spread over the whole run.
+    """
+
+    def __init__(self, max_points=2000):
+        self.max_points = max_points
+        self.stride = 1
+        self.seen = 0
+        self.x = np.zeros(0)
+        self.y = np.zeros(0)
+
+    def extend(self, x, y):
+        """Append the points of x and y that fall on the current stride."""
+        keep = (self.seen + np.arange(len(x))) % self.stride == 0
+        self.seen += len(x)
+        self.x = np.concatenate([self.x, np.asarray(x, dtype=np.float64)[keep]])
+        self.y = np.concatenate([self.y, np.asarray(y, dtype=np.float64)[keep]])
+        while len(self.x) > self.max_points:
+            self.x, self.y = self.x[::2], self.y[::2]
+            self.stride *= 2
+
+# -----------------------------------------------------------------------------------------------------
+
+# Class to update the altitude series and battery totals of a mission log as it grows
+class MissionsLogFollower:
+    """Incremental equivalent of plotMissionsLogsResult.py for a MissionsLogs CSV that Unity is still writing."""
+
+    def __init__(self, csv_file, max_points=2000):
+        self.csv_file = csv_file
+        self.max_points = max_points
+        self.reset()
+
+    def reset(self):
+        """Forget everything read so far."""
+        self.tail = LogTail(self.csv_file)
+        self.battery = BatteryConsumptionAggregator(strict=False)  # A live view keeps going: late rows are reported in the summary
+        self.altitudes = {}
+        self.last = {}  # Last telemetry of every drone
+        self.origin = None  # mission_seconds of the first mission row, time 0 of the altitude axis
+        self.last_seconds = None  # mission_seconds of the last mission row with a time
+        self.rows = 0
+
+    def update(self):
+        """Read and aggregate the rows appended since the last update. Returns the number of new rows."""
+        data, restarted = self.tail.read()
+        if restarted:
+            tail = self.tail
+            self.reset()
+            self.tail = tail
+        if not data.strip():
+            return 0
+
+        dtypes = {column: MISSIONS_LOG_DTYPES.get(column, "str") for column in FOLLOW_COLUMNS}
+        chunk = pd.read_csv(io.BytesIO(self.tail.header + data), usecols=FOLLOW_COLUMNS, dtype=dtypes)
+        chunk["CurrentTime"] = pd.to_datetime(chunk["CurrentTime"], format=TIME_FORMAT, errors="coerce")
+        self.rows += len(chunk)
+
+        # Battery totals per state, carried across updates by the streaming aggregator
+        self.battery.add_chunk(chunk)
+
+        # Altitude of the mission rows, on the axis of mission_figures.altitude_frame: mission_seconds carried
+        # across chunks, since the first mission row
+        in_mission = chunk[chunk["MissionId"].fillna(NO_MISSION) != NO_MISSION]
+        seconds = mission_seconds(in_mission["CurrentTime"], self.last_seconds)
+        timed = seconds[~np.isnan(seconds)]
+        if len(timed):
+            self.last_seconds = timed[-1]
+            if self.origin is None:
+                self.origin = timed.min()
+        if self.origin is not None:
+            for drone, rows in in_mission.groupby("PlayerName", sort=False).indices.items():
+                series = self.altitudes.setdefault(drone, DecimatedSeries(self.max_points))
+                series.extend(seconds[rows] - self.origin, in_mission["Altitude"].to_numpy()[rows])
+
+        # Last telemetry of every drone in this chunk
+        for row in chunk.dropna(subset=["PlayerName"]).drop_duplicates("PlayerName", keep="last").itertuples(index=False):
+            self.last[row.PlayerName] = {"time": row.CurrentTime.strftime(TIME_FORMAT) if pd.notna(row.CurrentTime) else None,
+                                         "state": row.CurrentState if isinstance(row.CurrentState, str) else None,
+                                         "altitude": float(row.Altitude), "battery": float(row.BatteryLevel)}
+        return len(chunk)
+
+    def altitude_frame(self):
+        """Return the kept altitude points as the frame plotted by mission_figures.plot_altitudes."""
+        frames = [pd.DataFrame({"PlayerName": drone, "RelativeTime": series.x, "Altitude": series.y})
+                  for drone, series in sorted(self.altitudes.items())]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=["PlayerName", "RelativeTime", "Altitude"])
+
+    def summary(self):
+        """Return the progress of the log, the last telemetry of every drone and the battery consumption."""
+        pivot_table = self.battery.pivot_table() if self.battery.rows else pd.DataFrame()
+        return {
+            "file": os.path.abspath(self.csv_file),
+            "offset": self.tail.offset,
+            "rows": self.rows,
+            "mission_rows": self.battery.rows,
+            "out_of_order": self.battery.out_of_order,
+            "updated": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "drones": dict(sorted(self.last.items())),
+            "battery_consumption": {str(drone): {str(state): float(value) for state, value in row.items()}
+                                    for drone, row in pivot_table.iterrows()},
+        }
+
+    def write(self, output_directory):
+        """Write the altitude and battery figures and the JSON summary, each replaced atomically."""
+        os.makedirs(output_directory, exist_ok=True)
+        if self.altitudes:
+            save_figure(plot_altitudes(self.altitude_frame()), os.path.join(output_directory, ALTITUDE_FIGURE))
+        if self.battery.rows:
+            save_figure(plot_battery_consumption(self.battery.pivot_table()), os.path.join(output_directory, BATTERY_FIGURE))
+        write_atomically(os.path.join(output_directory, SUMMARY_FILE), json.dumps(self.summary(), indent=2))
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to write a file so that readers never see it half written
+def write_atomically(path, text):
+    """Write text to a temporary file next to path and rename it over path."""
+    temporary_file = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_file, "w") as file:
+        file.write(text)
+    os.replace(temporary_file, path)
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to save and close a figure atomically
+def save_figure(fig, path):
+    """Save a figure to path through a temporary file and close it."""
+    temporary_file = f"{path}.{os.getpid()}.tmp.png"
+    fig.savefig(temporary_file)
+    plt.close(fig)
+    os.replace(temporary_file, path)
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to pick the log to follow
+def newest_missions_log(path):
+    """Return path if it is a file, else the newest MissionsLogs_*.csv of the directory (names sort by date)."""
+    if not os.path.isdir(path):
+        return path
+    csv_files = find_missions_logs(path)
+    return csv_files[-1] if csv_files else None
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to follow a mission log until interrupted
+def follow(path, output_directory, interval=5.0, max_points=2000, once=False):
+    """Refresh the outputs every interval seconds with the rows appended since the previous refresh.
+
+    When path is a directory, the newest MissionsLogs_*.csv is followed and a newer one (a new run)
+    replaces it.
+    """
+    follower = None
+    while True:
+        start = time.perf_counter()
+        csv_file = newest_missions_log(path)
+        if csv_file is not None and (follower is None or follower.csv_file != csv_file):
+            print(f"Following {csv_file}")
+            follower = MissionsLogFollower(csv_file, max_points)
+
+        if follower is not None:
+            new_rows = follower.update()
+            if new_rows or once:
+                follower.write(output_directory)
+                print(f"{time.strftime('%H:%M:%S')} | +{new_rows} rows | {follower.rows} rows | "
+                      f"{follower.tail.offset} bytes | {len(follower.last)} drones | "
+                      f"refreshed in {time.perf_counter() - start:.2f} s")
+        if once:
+            return follower
+        time.sleep(max(0.0, interval - (time.perf_counter() - start)))
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to check the incremental aggregation against the whole-file computation
+def verify(csv_files, seed=0):
+    """Append every log to a temporary file in random pieces, cut anywhere including inside lines, updating
+    after each one. Compare the battery totals with battery_usage_from_mission_rows and the altitude points with
+    mission_figures.altitude_frame. Returns True if they match."""
+    rng = random.Random(seed)
+    matched = True
+    for csv_file in csv_files:
+        with open(csv_file, "rb") as file:
+            content = file.read()
+        expected_frame = mission_rows(load_missions_log(csv_file, use_cache=False))
+        expected = battery_pivot_table(battery_usage_from_mission_rows(expected_frame)).rename(index=str, columns=str)
+        expected_altitudes = altitude_frame(expected_frame)
+
+        with tempfile.TemporaryDirectory() as directory:
+            live_file = os.path.join(directory, os.path.basename(csv_file))
+            follower = MissionsLogFollower(live_file, max_points=sys.maxsize)
+            position = 0
+            open(live_file, "wb").close()
+            while position < len(content):
+                piece = rng.randint(1, 200)
+                with open(live_file, "ab") as file:
+                    file.write(content[position:position + piece])
+                position += piece
+                follower.update()
+
+        try:
+            pd.testing.assert_frame_equal(follower.battery.pivot_table(), expected, check_names=False,
+                                          check_index_type=False, check_column_type=False, check_exact=False, rtol=1e-12)
+            points = follower.altitude_frame()
+            assert len(points) == len(expected_altitudes), f"{len(points)} altitude points, expected {len(expected_altitudes)}"
+            points = points.astype({"PlayerName": str}).sort_values(["PlayerName", "RelativeTime", "Altitude"])
+            expected_points = expected_altitudes[points.columns].astype({"PlayerName": str, "Altitude": "float64"})
+            expected_points = expected_points.sort_values(["PlayerName", "RelativeTime", "Altitude"])
+            pd.testing.assert_frame_equal(points.reset_index(drop=True), expected_points.reset_index(drop=True),
+                                          check_exact=False, rtol=1e-6)
+            status = "OK"
+        except AssertionError as e:
+            status = f"MISMATCH\n{e}"
+            matched = False
+        print(f"{csv_file} | {follower.rows} rows | {follower.tail.offset} bytes | {status}")
+    return matched
+
+# -----------------------------------------------------------------------------------------------------
+
+# Main function
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Follow a mission log while Unity writes it and refresh its figures and summary.")
+    parser.add_argument("path", nargs="?", default=".", help="MissionsLogs CSV to follow, or a directory to follow its newest one")
+    parser.add_argument("--output", default="live", help="Directory of altitude.png, battery.png and summary.json")
+    parser.add_argument("--interval", type=float, default=5.0, help="Seconds between refreshes")
+    parser.add_argument("--max-points", type=int, default=2000, help="Altitude points kept per drone")
+    parser.add_argument("--once", action="store_true", help="Process what has been written so far and exit")
+    parser.add_argument("--verify", action="store_true", help="Check the incremental totals against the whole-file computation")
+    args = parser.parse_args()
+
+    if args.verify:
+        sys.exit(0 if verify(find_missions_logs(args.path)) else 1)
+
+    try:
+        follow(args.path, args.output, args.interval, args.max_points, args.once)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,76 @@
+# Libraries
+import pandas as pd
+import matplotlib.pyplot as plt
+from missions_logs import mission_seconds
+
+# -----------------------------------------------------------------------------------------------------
+
+# Predefined colors for each state
+classic_colors = ['red', 'blue', 'green', 'brown', 'orange', 'purple', 'black', 'pink', 'magenta', 'yellow', 'cyan']
+
+# Assign colors to each state
+state_colors = {
+    'StandBy': classic_colors[0],
+    'TakeOff': classic_colors[1],
+    'MoveToPickupPackage': classic_colors[2],
+    'MoveToCheckPoint': classic_colors[3],
+    'MoveToDelivery': classic_colors[4],
+    'Land': classic_colors[5],
+    'PickUpPackage': classic_colors[6],
+    'DeliverPackage': classic_colors[7],
+    'ReturnToHub': classic_colors[8]
+}
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to keep the altitude of the drones over time
+def altitude_frame(df):
+    """Return PlayerName, CurrentTime and Altitude, with the seconds since the first row as RelativeTime.
+
+    The rows keep the index of the loaded log (as mission_rows does), so their mission_seconds are computed
+    in file order and stay continuous past midnight.
+    """
+    df = df[['PlayerName', 'CurrentTime', 'Altitude']].copy()
+    current_time = df['CurrentTime'].sort_index()
+    seconds = pd.Series(mission_seconds(current_time), index=current_time.index)
+    df['RelativeTime'] = seconds - seconds.min()
+    return df
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to plot the altitude of each drone over time
+def plot_altitudes(df):
+    """Plot the altitudes of an altitude_frame in a new figure, slicing the drones in one groupby pass."""
+    fig = plt.figure(figsize=(10, 6))
+    for drone, drone_data in df.groupby('PlayerName', observed=True, sort=False):
+        plt.plot(drone_data['RelativeTime'], drone_data['Altitude'], linewidth=1.5, label=drone)
+
+    # Add labels and legend
+    plt.title('Altitudes during drone flight')
+    plt.xlabel('Time (s)')
+    plt.ylabel('Altitude (m)')
+    plt.legend()
+    plt.grid(True, linestyle='-', color='gray', alpha=0.5)
+    return fig
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to plot the battery consumption of each drone by state
+def plot_battery_consumption(pivot_table):
+    """Plot the battery pivot table as grouped bars in a new figure."""
+    fig, ax = plt.subplots(figsize=(12, 6))
+
+    # Plot the stacked bar plot
+    pivot_table.plot(kind='bar', stacked=False, color=[state_colors.get(state, 'gray') for state in pivot_table.columns], ax=ax)
+
+    # Set labels and title
+    ax.set_ylabel('Battery Consumption (%)')
+    ax.set_xlabel('')
+    ax.set_title('Battery Consumption by Drone and Mission Status')
+    ax.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
+    ax.set_xticklabels(pivot_table.index, rotation=0, ha='right')
+    ax.grid(True, linestyle='-', color='gray', alpha=0.5)
+
+    # Adjust layout for the bar plot
+    fig.tight_layout()
+    return fig
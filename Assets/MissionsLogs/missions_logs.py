@@ -0,0 +1,217 @@
+# Libraries
+import os
+import re
+import glob
+import time
+import hashlib
+import importlib.util
+import numpy as np
+import pandas as pd
+
+# -----------------------------------------------------------------------------------------------------
+
+# Compact dtypes of the MissionsLogs columns. BatteryLevel stays float64: the consumption sums many small differences
+CATEGORY_COLUMNS = ["PlayerName", "CurrentState", "MissionId", "MissionStatus", "action"]
+TELEMETRY_COLUMNS = ["Latitude", "Longitude", "Altitude", "Azimuth", "packageWeight"]
+MISSIONS_LOG_DTYPES = {
+    **{column: "str" for column in CATEGORY_COLUMNS},
+    **{column: "float32" for column in TELEMETRY_COLUMNS},
+    "BatteryLevel": "float64",
+    "priority": "Int16",  # Nullable: the cell is empty in some logs
+}
+
+# Format of the CurrentTime column
+TIME_FORMAT = "%H:%M:%S"
+
+# Values used for the rows logged outside of a mission
+NO_MISSION = "NoMission"
+NO_MISSION_STATUS = "NoMissionStatus"
+
+# Seconds in a day, and the backwards jump of CurrentTime that means the log crossed midnight
+DAY_SECONDS = 86400.0
+MIDNIGHT_JUMP = DAY_SECONDS / 2
+
+# Cache format: Parquet or Feather when pyarrow is installed, pickle otherwise
+CACHE_DIRECTORY = ".cache"
+CACHE_VERSION = 2
+if importlib.util.find_spec("pyarrow") is not None:
+    CACHE_EXTENSION = ".parquet"
+else:
+    CACHE_EXTENSION = ".pkl"
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to parse one MissionsLogs CSV with compact dtypes
+def read_missions_log_csv(csv_file, **read_csv_options):
+    """Read a MissionsLogs CSV, parsing CurrentTime once and converting the labels to categoricals."""
+    df = pd.read_csv(csv_file, dtype=MISSIONS_LOG_DTYPES, **read_csv_options)
+    return normalize_missions_log(df)
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to convert the raw columns of a MissionsLogs chunk
+def normalize_missions_log(df):
+    """Fill the rows outside of missions, parse the time and convert the labels to categoricals.
+
+    Labels are sorted like string columns would be, except MissionId, whose categories keep the order of
+    appearance in the file so that sorting by MissionId follows the mission order.
+    """
+    df["MissionId"] = df["MissionId"].fillna(NO_MISSION)
+    df["MissionStatus"] = df["MissionStatus"].fillna(NO_MISSION_STATUS)
+    df["CurrentTime"] = pd.to_datetime(df["CurrentTime"], format=TIME_FORMAT, errors="coerce")
+    for column in CATEGORY_COLUMNS:
+        df[column] = as_category(df[column], by_appearance=column == "MissionId")
+    return df
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to convert a column to a categorical
+def as_category(values, by_appearance=False):
+    """Convert values to a categorical with sorted categories, or in order of appearance."""
+    categories = pd.unique(values.dropna())
+    if not by_appearance:
+        categories = sorted(categories)
+    return pd.Categorical(values, categories=categories)
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to get the cache file of a CSV
+def cache_file_for(csv_file, cache_dir=None):
+    """Return the cache file of a CSV, keyed by its absolute path, modification time and size."""
+    csv_file = os.path.abspath(csv_file)
+    stat = os.stat(csv_file)
+    key = f"{CACHE_VERSION}:{csv_file}:{stat.st_mtime_ns}:{stat.st_size}"
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+    cache_dir = cache_dir or os.path.join(os.path.dirname(csv_file), CACHE_DIRECTORY)
+    stem = os.path.splitext(os.path.basename(csv_file))[0]
+    return os.path.join(cache_dir, f"{stem}.{digest}{CACHE_EXTENSION}")
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to read a cached DataFrame
+def read_cache(cache_file):
+    """Read a DataFrame written by write_cache."""
+    if cache_file.endswith(".parquet"):
+        return pd.read_parquet(cache_file)
+    return pd.read_pickle(cache_file)
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to write a DataFrame to the cache
+def write_cache(df, cache_file):
+    """Write the DataFrame atomically and remove the stale cache files of the same CSV."""
+    cache_dir = os.path.dirname(cache_file)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    temporary_file = f"{cache_file}.{os.getpid()}.tmp"
+    if cache_file.endswith(".parquet"):
+        df.to_parquet(temporary_file, index=False)
+    else:
+        df.to_pickle(temporary_file)
+    os.replace(temporary_file, cache_file)
+
+    # Entries of older versions of the CSV share its stem but not its key
+    stem = os.path.basename(cache_file).rsplit(".", 2)[0]
+    for stale_file in glob.glob(os.path.join(cache_dir, f"{stem}.*{CACHE_EXTENSION}")):
+        if stale_file != cache_file:
+            os.remove(stale_file)
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to load one MissionsLogs file, using the cache when it is up to date
+def load_missions_log(csv_file, cache_dir=None, use_cache=True):
+    """Load a MissionsLogs CSV. Repeated loads of an unchanged file skip the CSV parsing."""
+    if not use_cache:
+        return read_missions_log_csv(csv_file)
+
+    cache_file = cache_file_for(csv_file, cache_dir)
+    if os.path.exists(cache_file):
+        try:
+            return read_cache(cache_file)
+        except Exception as e:
+            print(f"Ignoring unreadable cache {cache_file}: {e}")
+
+    df = read_missions_log_csv(csv_file)
+    try:
+        write_cache(df, cache_file)
+    except OSError as e:
+        print(f"Could not cache {csv_file}: {e}")
+    return df
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to load several MissionsLogs files into one DataFrame
+def load_missions_logs(paths, cache_dir=None, use_cache=True):
+    """Load MissionsLogs CSVs (files, directories or glob patterns) with a categorical Run column."""
+    csv_files = find_missions_logs(paths)
+    frames = []
+    for csv_file in csv_files:
+        df = load_missions_log(csv_file, cache_dir=cache_dir, use_cache=use_cache)
+        df.insert(0, "Run", os.path.splitext(os.path.basename(csv_file))[0])
+        frames.append(df)
+    if not frames:
+        return pd.DataFrame(columns=["Run"])
+
+    # Concatenating categoricals with different categories falls back to strings, so convert them again
+    df = pd.concat(frames, ignore_index=True)
+    for column in ["Run"] + CATEGORY_COLUMNS:
+        df[column] = as_category(df[column], by_appearance=column == "MissionId")
+    return df
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to list the MissionsLogs files of some paths
+def find_missions_logs(paths):
+    """Expand files, directories and glob patterns into a sorted list of MissionsLogs CSVs."""
+    if isinstance(paths, (str, os.PathLike)):
+        paths = [paths]
+    csv_files = set()
+    for path in map(str, paths):
+        if os.path.isdir(path):
+            csv_files.update(glob.glob(os.path.join(path, "MissionsLogs_*.csv")))
+        else:
+            csv_files.update(glob.glob(path) or [path])
+    return sorted(csv_files)
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to get the date of a MissionsLogs file
+def missions_log_midnight(csv_file):
+    """Return the Unix time of the local midnight of the day the log started.
+
+    CurrentTime only has the time of day: the day comes from the MissionsLogs_YYYYMMDD_HHMMSS name of the
+    file, or from its modification time for files named otherwise.
+    """
+    match = re.match(r"MissionsLogs_(\d{8})_\d{6}", os.path.basename(csv_file))
+    if match:
+        return time.mktime(time.strptime(match.group(1), "%Y%m%d"))
+    modified = time.localtime(os.path.getmtime(csv_file))
+    return time.mktime((modified.tm_year, modified.tm_mon, modified.tm_mday, 0, 0, 0, 0, 0, -1))
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to keep the rows logged during missions, in mission order
+def mission_rows(df):
+    """Drop the rows outside of missions and sort by MissionId (order of appearance), PlayerName and CurrentTime."""
+    df = df[df["MissionId"] != NO_MISSION].copy()
+    for column in ["MissionId", "PlayerName", "CurrentState"]:
+        df[column] = df[column].cat.remove_unused_categories()
+    df["MissionId"] = df["MissionId"].cat.as_ordered()
+    return df.sort_values(by=["MissionId", "PlayerName", "CurrentTime"])
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to get the time of the mission log rows on a continuous scale
+def mission_seconds(current_time, previous=None):
+    """Return the seconds since the midnight of the first row, counting a day more each time the log crosses midnight.
+
+    CurrentTime only has the time of day, so a log that runs past midnight goes back in time in file order.
+    previous is the last value returned for the rows logged before these ones, to continue its scale chunk by chunk.
+    """
+    seconds = (current_time - current_time.dt.normalize()).dt.total_seconds().to_numpy()
+    first_day, start = 0.0, seconds[:1]
+    if previous is not None:
+        first_day = np.floor(previous / DAY_SECONDS)
+        start = [previous - first_day * DAY_SECONDS]
+    days = first_day + np.cumsum(np.diff(np.concatenate([start, seconds])) < -MIDNIGHT_JUMP)
+    return seconds + days * DAY_SECONDS
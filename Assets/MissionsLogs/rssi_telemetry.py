@@ -0,0 +1,203 @@
+# Libraries
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from missions_logs import DAY_SECONDS, load_missions_log, mission_seconds
+
+# The RSSI tools live with the Mininet-WiFi scripts
+RSSI_TOOLS_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Scripts", "Network", "mininet")
+sys.path.insert(0, RSSI_TOOLS_DIRECTORY)
+from generate_rssi_graph import read_rssi_files
+from handshake_protocol import parse_initial_positions
+
+# -----------------------------------------------------------------------------------------------------
+
+# Telemetry columns attached to every RSSI sample
+JOIN_COLUMNS = ["CurrentState", "MissionId", "Latitude", "Longitude", "Altitude", "BatteryLevel"]
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to put the RSSI timestamps on the scale of the mission log
+def rssi_seconds(timestamps, clock_offset=0.0):
+    """Return the seconds since the local midnight of the first sample of Unix timestamps, plus clock_offset."""
+    if not len(timestamps):
+        return np.asarray(timestamps, dtype=np.float64)
+    local = np.asarray(timestamps, dtype=np.float64) + time.localtime(timestamps[0]).tm_gmtoff
+    return local - np.floor(local[0] / DAY_SECONDS) * DAY_SECONDS + clock_offset
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to load the RSSI samples of a directory into one DataFrame
+def rssi_frame(directory, clock_offset=0.0):
+    """Return PlayerName, RSSI and Time (seconds, on the scale of mission_seconds) of the DRO*_rssi.csv files."""
+    frames = []
+    for name, series in read_rssi_files(directory, relative=False).items():
+        drone_id = name[:-len("_rssi")] if name.endswith("_rssi") else name
+        if series.time is None:
+            print(f"Skipping {name}: the file has no Timestamp column")
+            continue
+        frames.append(pd.DataFrame({"PlayerName": drone_id, "RSSI": series.rssi,
+                                    "Time": rssi_seconds(series.time, clock_offset)}))
+    if not frames:
+        return pd.DataFrame({"PlayerName": pd.Series(dtype="category"), "RSSI": pd.Series(dtype="float32"),
+                             "Time": pd.Series(dtype="float64")})
+    df = pd.concat(frames, ignore_index=True)
+    df["PlayerName"] = df["PlayerName"].astype("category")
+    return df
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to join every RSSI sample with the last telemetry row of its drone
+def join_telemetry(rssi, missions, tolerance=2.0, align_start=False):
+    """As-of join of the RSSI samples with the mission log, per drone.
+
+    Each sample gets the telemetry of the last row of its drone logged at most tolerance seconds before it,
+    found with a binary search in the time-sorted rows of that drone: O((n + m) log m) for n samples and
+    m rows. Samples without such a row are dropped. With align_start, the first sample of every drone is
+    moved to its first telemetry row, for RSSI files whose timestamps are not wall-clock times.
+    """
+    missions = missions.dropna(subset=["CurrentTime"])
+    telemetry_time = mission_seconds(missions["CurrentTime"])
+    telemetry_rows = missions.groupby("PlayerName", observed=True).indices
+    samples = rssi.groupby("PlayerName", observed=True).indices
+    sample_time = rssi["Time"].to_numpy()
+
+    sample_parts = []
+    row_parts = []
+    lag_parts = []
+    for drone_id, sample_rows in samples.items():
+        rows = telemetry_rows.get(drone_id)
+        if rows is None:
+            continue
+
+        # Stable sort: of the rows sharing a second, the search lands on the last one logged
+        rows = rows[np.argsort(telemetry_time[rows], kind="stable")]
+        times = telemetry_time[rows]
+        sample_rows = sample_rows[np.argsort(sample_time[sample_rows], kind="stable")]
+        query = sample_time[sample_rows]
+        if align_start:
+            query = query - query[0] + times[0]
+
+        match = np.searchsorted(times, query, side="right") - 1
+        lag = query - times[np.maximum(match, 0)]
+        found = (match >= 0) & (lag <= tolerance)
+        sample_parts.append(sample_rows[found])
+        row_parts.append(rows[match[found]])
+        lag_parts.append(lag[found])
+
+    if not sample_parts:
+        sample_parts, row_parts, lag_parts = [np.zeros(0, dtype=np.intp)], [np.zeros(0, dtype=np.intp)], [np.zeros(0)]
+    sample_index = np.concatenate(sample_parts)
+    row_index = np.concatenate(row_parts)
+
+    joined = rssi.iloc[sample_index].reset_index(drop=True)
+    telemetry = missions[JOIN_COLUMNS].iloc[row_index].reset_index(drop=True)
+    joined = pd.concat([joined, telemetry], axis=1)
+    joined["TelemetryLag"] = np.concatenate(lag_parts)
+    return joined
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to compute the distance of every joined sample to the AP
+def ap_distance(joined, ap_position):
+    """Euclidean distance (m) to an AP in Mininet-WiFi coordinates, i.e. (Longitude, Latitude, Altitude)."""
+    positions = np.column_stack([joined["Longitude"].to_numpy(np.float64), joined["Latitude"].to_numpy(np.float64),
+                                 joined["Altitude"].to_numpy(np.float64)])
+    return np.linalg.norm(positions - np.asarray(ap_position, dtype=np.float64), axis=1)
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to bucket the AP distances
+def distance_buckets(distance, width=50.0):
+    """Return the [start, end) bucket of width meters of every distance, as an ordered categorical."""
+    edges = np.arange(0.0, (np.nanmax(distance) if len(distance) else 0.0) + width, width)
+    if len(edges) < 2:
+        edges = np.array([0.0, width])
+    labels = [f"{start:.0f}-{end:.0f} m" for start, end in zip(edges[:-1], edges[1:])]
+    return pd.cut(distance, edges, right=False, labels=labels)
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to aggregate the RSSI of the joined samples
+def rssi_by(joined, column, threshold=-80.0):
+    """Return samples, mean, p5, median, min and the fraction below threshold of the RSSI per value of column."""
+    grouped = joined.assign(Below=joined["RSSI"] < threshold).groupby(column, observed=True)
+    summary = grouped["RSSI"].agg(samples="count", mean="mean", min="min")
+    summary["p5"] = grouped["RSSI"].quantile(0.05)
+    summary["median"] = grouped["RSSI"].quantile(0.5)
+    summary["below_fraction"] = grouped["Below"].mean()
+    return summary[["samples", "mean", "p5", "median", "min", "below_fraction"]]
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to print an aggregate table
+def print_summary(title, summary, threshold):
+    """Print one row per group of an rssi_by table."""
+    print(f"\nRSSI by {title}:")
+    for name, row in summary.iterrows():
+        print(f"  {str(name):<22} {int(row['samples']):>9} samples | mean {row['mean']:6.1f} dBm | p5 {row['p5']:6.1f} | "
+              f"median {row['median']:6.1f} | min {row['min']:6.1f} | below {threshold:g} dBm {row['below_fraction']:.1%}")
+
+# -----------------------------------------------------------------------------------------------------
+
+# Main function
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Join the drone RSSI samples with the mission telemetry and aggregate them.")
+    parser.add_argument("missions_log", help="MissionsLogs_*.csv file of the run")
+    parser.add_argument("rssi_directory", help="Directory with the DRO*_rssi.csv files of the same run")
+    parser.add_argument("--ap", default=None, help="AP position x,y,z in Mininet-WiFi coordinates")
+    parser.add_argument("--handshake", default=None, help="handshake.json of a recording, to take the AP position from")
+    parser.add_argument("--tolerance", type=float, default=2.0, help="Maximum age (s) of the telemetry row joined to a sample")
+    parser.add_argument("--clock-offset", type=float, default=0.0,
+                        help="Seconds added to the RSSI timestamps, e.g. when Unity ran in another time zone")
+    parser.add_argument("--align-start", action="store_true",
+                        help="Align the first sample of every drone with its first telemetry row instead of using the timestamps")
+    parser.add_argument("--bucket", type=float, default=50.0, help="Width (m) of the distance buckets")
+    parser.add_argument("--threshold", type=float, default=-80.0, help="RSSI threshold (dBm) of the below fraction")
+    parser.add_argument("--output", default=None, help="Write the joined samples to this CSV file")
+    parser.add_argument("--json", default=None, help="Write the aggregates to this JSON file")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    missions = load_missions_log(args.missions_log)
+    rssi = rssi_frame(args.rssi_directory, args.clock_offset)
+    joined = join_telemetry(rssi, missions, args.tolerance, args.align_start)
+    print(f"{len(joined)} of {len(rssi)} RSSI samples joined with {len(missions)} telemetry rows "
+          f"in {time.perf_counter() - start:.2f} s")
+    if not len(joined):
+        print("No sample has a telemetry row within the tolerance: check --clock-offset, or use --align-start")
+        sys.exit(1)
+
+    # AP position, as in propagation_model.py
+    if args.ap:
+        ap_position = [float(value) for value in args.ap.split(",")]
+    elif args.handshake:
+        with open(args.handshake) as file:
+            ap_position = list(parse_initial_positions(json.load(file))["ap_position"])
+    else:
+        ap_position = [float(joined["Longitude"].mean()), float(joined["Latitude"].mean()), 0.0]
+        print(f"No --ap or --handshake: using the ground point under the mean drone position {ap_position}")
+    joined["APDistance"] = ap_distance(joined, ap_position)
+    joined["DistanceBucket"] = distance_buckets(joined["APDistance"].to_numpy(), args.bucket)
+
+    aggregates = {
+        "CurrentState": rssi_by(joined, "CurrentState", args.threshold),
+        "DistanceBucket": rssi_by(joined, "DistanceBucket", args.threshold),
+        "PlayerName": rssi_by(joined, "PlayerName", args.threshold),
+    }
+    for column, summary in aggregates.items():
+        print_summary(column, summary, args.threshold)
+
+    if args.output:
+        joined.to_csv(args.output, index=False)
+        print(f"\nJoined samples written to {args.output}")
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({column: summary.reset_index().astype({column: str}).to_dict(orient="records")
+                       for column, summary in aggregates.items()}, file, indent=2)
+        print(f"Aggregates written to {args.json}")
@@ -6,6 +6,8 @@ using UnityEngine; // Library to use the MonoBehaviour class
 using System.Collections.Generic; // Library to use lists
 using System.Threading.Tasks; // Library to use tasks
 using System.Diagnostics;  // Library to use the ProcessStartInfo class
+using System.Net; // Library to use the IPAddress class
+using Newtonsoft.Json.Linq; // Library to use the JObject and JArray classes
 
 // Class to control the communication of the base station (Unity to Mininet-WiFi)
 public class BaseStationMininetWifi : MonoBehaviour
@@ -31,6 +33,17 @@ public class BaseStationMininetWifi : MonoBehaviour
     // Time interval between messages in seconds
     public float messageInterval = 1f;
 
+    // Send messages through a long-running broker_tcp_sender.py daemon instead of one Python process per message
+    public bool useBrokerDaemon = true;
+    public int brokerDaemonPort = 55556; // Local port where the broker daemon listens
+
+    // Add a sequence id and origin timestamp to every position message, and let the broker daemon record its hops
+    public bool enableTracing = false;
+    public string traceDirectory = "traces"; // Directory of the broker trace log, relative to the project folder
+
+    // Let the broker daemon send untraced positions to the drones as compact binary messages instead of JSON
+    public bool binaryWireFormat = false;
+
     // Get the current user's username dynamically
     string userName = Environment.UserName;
 
@@ -47,6 +60,13 @@ public class BaseStationMininetWifi : MonoBehaviour
     private int dstPort = 12345; // send through this port
     private List<string> droneIPs = new List<string>(); // List to store drone IPs (10.0.0.X), where X is 101, 102, 103, and so on
     private int baseIPLastOctet = 101; // Start IP counter from 101
+
+    // Variables to communicate with the broker daemon
+    private Process brokerDaemonProcess;
+    private TcpClient brokerClient;
+    private NetworkStream brokerStream;
+    private readonly object brokerLock = new object();
+    private long traceSequence = 0; // Sequence id of the last traced message
  
     // -----------------------------------------------------------------------------------------------------
     // Start is called before the first frame update:
@@ -64,6 +84,12 @@ public class BaseStationMininetWifi : MonoBehaviour
         // Execute the PowerShell script to get the IP address of the Mininet-WiFi VM
         executor.ExecuteScript(vmName, adapterIndex, userName, this);
 
+        // Start the broker daemon early, so it finishes importing scapy before the first drone message
+        if (useBrokerDaemon)
+        {
+            StartBrokerDaemon();
+        }
+
         // Start the coroutine when the scene starts
         StartCoroutine(WaitForDrones());
 
@@ -123,17 +149,28 @@ public class BaseStationMininetWifi : MonoBehaviour
                 // Get all drones in the scene
                 GameObject[] droneObjects = GameObject.FindGameObjectsWithTag("Drone");
 
+                // Messages of this tick, sent to the broker daemon as a single batch
+                List<(string dstIp, string message)> batch = new List<(string dstIp, string message)>();
+
                 // Send the position of each drone
                 foreach (GameObject drone in droneObjects)
                 {
                     
                     // Encode the drone position and ID
-                    string message = EncodeDecode.EncodeSingleDronePositionWithLabelAndID(drone, Label.Position.ToString());
+                    string message = EncodeDecode.EncodeSingleDronePositionWithLabelAndID(drone, Label.Position.ToString(),
+                                                                                          enableTracing ? ++traceSequence : -1);
                     string droneIP = droneIPs[Array.IndexOf(droneObjects,drone)];
 
                     // Log the encoded message
                     UnityEngine.Debug.Log($"Encoded message for drone {drone.name} ({droneIP}): {message}");
 
+                    // Queue the message for the broker daemon
+                    if (useBrokerDaemon)
+                    {
+                        batch.Add((droneIP, message));
+                        continue;
+                    }
+
                     // Start the Python script as a task
                     Task.Run(() => CallSenderPythonScriptTask(droneIP, dstPort, message));
 
@@ -142,6 +179,21 @@ public class BaseStationMininetWifi : MonoBehaviour
 
                 }
 
+                // Send the whole tick through the broker daemon, falling back to one Python script per message
+                if (batch.Count > 0)
+                {
+                    Task.Run(() =>
+                    {
+                        if (!SendToBrokerDaemon(batch, dstPort))
+                        {
+                            foreach (var entry in batch)
+                            {
+                                CallSenderPythonScriptTask(entry.dstIp, dstPort, entry.message);
+                            }
+                        }
+                    });
+                }
+
                 // Update the last message time
                 lastMessageTime = Time.time;
 
@@ -261,6 +313,121 @@ public class BaseStationMininetWifi : MonoBehaviour
 
     }
 
+    // -----------------------------------------------------------------------------------------------------
+    // Class to start the broker daemon (broker_tcp_sender.py --daemon):
+
+    void StartBrokerDaemon()
+    {
+        
+        // Try to start the broker daemon
+        try
+        {
+            
+            // Create a new instance of ProcessStartInfo
+            ProcessStartInfo psi = new ProcessStartInfo();
+            psi.FileName = "python";
+
+            // Get the path of the Python script
+            string folder = Application.dataPath + "/Scripts/Network/broker_tcp_sender.py";
+
+            // Set the arguments for the Python script
+            psi.Arguments = $"\"{folder}\" --daemon {brokerDaemonPort}";
+            if (enableTracing)
+            {
+                psi.Arguments += $" --trace \"{traceDirectory}\"";
+            }
+            if (binaryWireFormat)
+            {
+                psi.Arguments += " --wire binary";
+            }
+            psi.UseShellExecute = false;
+            psi.CreateNoWindow = true;
+
+            // Start the Python script. It keeps running until the simulation stops
+            brokerDaemonProcess = Process.Start(psi);
+            UnityEngine.Debug.Log($"(Broker Daemon) Started with arguments: {psi.Arguments}");
+
+        }
+        catch (Exception e)
+        {
+            
+            // Log the error. Messages will be sent with one Python script per message
+            UnityEngine.Debug.LogError($"(Broker Daemon) Error starting broker_tcp_sender.py: {e.Message}");
+
+        }
+
+    }
+
+    // -----------------------------------------------------------------------------------------------------
+    // Class to send a batch of messages through the broker daemon as one length-prefixed JSON frame:
+
+    bool SendToBrokerDaemon(List<(string dstIp, string message)> messages, int dstPort)
+    {
+        
+        // Serialize the access to the daemon connection, since messages are sent from several tasks
+        lock (brokerLock)
+        {
+            
+            // Try to send the frame
+            try
+            {
+                
+                // Connect to the daemon if needed
+                if (brokerClient == null || !brokerClient.Connected)
+                {
+                    brokerClient = new TcpClient();
+                    brokerClient.NoDelay = true;
+                    brokerClient.Connect("127.0.0.1", brokerDaemonPort);
+                    brokerStream = brokerClient.GetStream();
+                }
+
+                // Encode the request
+                JArray batch = new JArray();
+                foreach (var entry in messages)
+                {
+                    JObject message = new JObject();
+                    message["dst_ip"] = entry.dstIp;
+                    message["dst_port"] = dstPort;
+                    message["message"] = entry.message;
+                    batch.Add(message);
+                }
+                JObject request = new JObject();
+                request["batch"] = batch;
+                byte[] payload = Encoding.UTF8.GetBytes(request.ToString(Newtonsoft.Json.Formatting.None));
+
+                // 4-byte big-endian length followed by the payload
+                byte[] header = BitConverter.GetBytes(IPAddress.HostToNetworkOrder(payload.Length));
+                brokerStream.Write(header, 0, header.Length);
+                brokerStream.Write(payload, 0, payload.Length);
+
+                return true;
+
+            }
+            catch (Exception e)
+            {
+                
+                // Log the error and drop the connection, so the next message reconnects
+                UnityEngine.Debug.LogWarning($"(Broker Daemon) Not available, using the per-message broker: {e.Message}");
+                CleanupBrokerConnection();
+                return false;
+
+            }
+
+        }
+
+    }
+
+    // -----------------------------------------------------------------------------------------------------
+    // Class to close the connection with the broker daemon:
+
+    void CleanupBrokerConnection()
+    {
+        if (brokerStream != null) brokerStream.Close(); // Close the stream
+        if (brokerClient != null) brokerClient.Close(); // Close the TCP client
+        brokerStream = null;
+        brokerClient = null;
+    }
+
     // -----------------------------------------------------------------------------------------------------
     // Class to connect to Mininet-WiFi:
 
@@ -374,7 +541,11 @@ public class BaseStationMininetWifi : MonoBehaviour
             // Encode the message to bytes
             byte[] messageBytes = Encoding.UTF8.GetBytes(message);
 
+            // Prefix the message with its 4-byte big-endian length, so Mininet reads it whole whatever its size
+            byte[] header = BitConverter.GetBytes(IPAddress.HostToNetworkOrder(messageBytes.Length));
+
             // Send the message bytes to the stream
+            stream.Write(header, 0, header.Length);
             stream.Write(messageBytes, 0, messageBytes.Length);
             UnityEngine.Debug.Log($"Sent message bytes to {ip}:{port}: {message}");
             UnityEngine.Debug.Log($"Sent message to {ip}:{port}: {message}");
@@ -423,6 +594,11 @@ public class BaseStationMininetWifi : MonoBehaviour
                     // Get the response from the buffer
                     response = Encoding.UTF8.GetString(buffer, 0, bytesRead);
 
+                    // Mininet sends one JSON message per line. Any following line is already a coverage update
+                    int newline = response.IndexOf('\n');
+                    string pending = newline >= 0 ? response.Substring(newline + 1) : "";
+                    if (newline >= 0) response = response.Substring(0, newline);
+
                     // Decode the response to a CoverageData object
                     var coverageData = JsonUtility.FromJson<EncodeDecode.CoverageData>(response);
 
@@ -436,6 +612,9 @@ public class BaseStationMininetWifi : MonoBehaviour
                         
                         // Activate the flag to indicate that Mininet is ready
                         flagMininetWifiReady = true;
+
+                        // Keep receiving the radius re-planned by Mininet while the drones move
+                        _ = ListenForCoverageUpdatesAsync(pending);
                         
                     }
 
@@ -457,12 +636,71 @@ public class BaseStationMininetWifi : MonoBehaviour
 
     }
 
+    // -----------------------------------------------------------------------------------------------------
+    // Class to receive the coverage radius updates sent by Mininet-WiFi during the simulation:
+
+    async Task ListenForCoverageUpdatesAsync(string pending)
+    {
+        
+        // Try to read the updates until the connection closes
+        try
+        {
+            
+            // Create a buffer to read the updates
+            byte[] buffer = new byte[1024];
+
+            // Read while the stream is open
+            while (stream != null && stream.CanRead)
+            {
+                
+                // Apply every complete line received so far
+                int newline;
+                while ((newline = pending.IndexOf('\n')) >= 0)
+                {
+                    string line = pending.Substring(0, newline);
+                    pending = pending.Substring(newline + 1);
+                    if (line.Trim().Length == 0) continue;
+
+                    // Decode the line to a CoverageData object and update the coverage radius
+                    var coverageData = JsonUtility.FromJson<EncodeDecode.CoverageData>(line);
+                    if (coverageData != null)
+                    {
+                        UnityEngine.Debug.Log($"Coverage radius updated: {coverageData.coverageRadius}");
+                        radius = coverageData.coverageRadius;
+                    }
+                }
+
+                // Wait for the next update
+                int bytesRead = await stream.ReadAsync(buffer, 0, buffer.Length);
+                if (bytesRead <= 0) break;
+                pending += Encoding.UTF8.GetString(buffer, 0, bytesRead);
+
+            }
+
+        }
+        catch (Exception e)
+        {
+            UnityEngine.Debug.LogWarning($"Stopped receiving coverage updates: {e.Message}"); // Log the end of the updates
+        }
+
+    }
+
     // -----------------------------------------------------------------------------------------------------
     // Special Unity method to clean the stream once it terminates:
 
     void OnApplicationQuit()
     {
         CleanupConnection(); // Clean up the connection
+
+        // Stop the broker daemon
+        lock (brokerLock)
+        {
+            CleanupBrokerConnection();
+        }
+        if (brokerDaemonProcess != null && !brokerDaemonProcess.HasExited)
+        {
+            brokerDaemonProcess.Kill();
+        }
     }
 
     // -----------------------------------------------------------------------------------------------------
@@ -146,7 +146,7 @@ public class EncodeDecode : MonoBehaviour
     // -----------------------------------------------------------------------------------------------------
     // Static class to encode the drone positions as a JSON message:
 
-    public static string EncodeSingleDronePositionWithLabelAndID(GameObject drone, string label)
+    public static string EncodeSingleDronePositionWithLabelAndID(GameObject drone, string label, long traceSequence = -1)
     {
         
         // Create the JSON object
@@ -168,6 +168,15 @@ public class EncodeDecode : MonoBehaviour
         droneJson["id"] = drone.name;  // Use the drone's name as the IDct
         jsonData["drone"] = droneJson;
 
+        // Add the sequence id and origin timestamp (Unix seconds) of traced messages
+        if (traceSequence >= 0)
+        {
+            JObject traceJson = new JObject();
+            traceJson["seq"] = traceSequence;
+            traceJson["t0"] = DateTimeOffset.UtcNow.ToUnixTimeMilliseconds() / 1000.0;
+            jsonData["trace"] = traceJson;
+        }
+
         // Convert the JSON object to a string
         string jsonMessage = jsonData.ToString();
 
@@ -0,0 +1,107 @@
+# Libraries
+import os
+import sys
+import math
+import time
+import socket
+import argparse
+import subprocess
+from broker_tcp_sender import DAEMON_HOST, encode_frame, read_frame
+
+# -----------------------------------------------------------------------------------------------------
+
+# Path of the broker script benchmarked by this file
+BROKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "broker_tcp_sender.py")
+
+# Example drone position message, similar to the ones encoded by Unity
+SAMPLE_MESSAGE = '{"label":"Position","drone":{"position":{"x":250.1,"y":30.2,"z":248.7},"id":"DRO001A"}}'
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to get a percentile of a list of latencies
+def percentile(values, q):
+    """Return the q-th percentile (0-100) of a list of values using the nearest-rank method."""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to print the summary of one benchmark run
+def print_summary(name, latencies, elapsed):
+    """Print messages per second and latency percentiles of one run."""
+    print(f"{name:>10}: {len(latencies) / elapsed:10.1f} msg/s | "
+          f"p50 {percentile(latencies, 50) * 1000:8.2f} ms | "
+          f"p99 {percentile(latencies, 99) * 1000:8.2f} ms")
+
+# -----------------------------------------------------------------------------------------------------
+
+# Benchmark the original path: one Python process per message
+def benchmark_per_spawn(dst_ip, dst_port, count):
+    """Spawn broker_tcp_sender.py once per message, as BaseStationMininetWifi does."""
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(count):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, BROKER_SCRIPT, dst_ip, str(dst_port), SAMPLE_MESSAGE],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+        latencies.append(time.perf_counter() - t0)
+    return latencies, time.perf_counter() - start
+
+# -----------------------------------------------------------------------------------------------------
+
+# Benchmark the daemon path: one long-running broker fed with framed messages
+def benchmark_daemon(dst_ip, dst_port, count, daemon_port):
+    """Start the broker daemon once and send every message as an acknowledged frame."""
+    daemon = subprocess.Popen([sys.executable, BROKER_SCRIPT, "--daemon", str(daemon_port)],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+
+        # Wait for the daemon to finish importing scapy and start listening
+        deadline = time.time() + 30
+        while True:
+            try:
+                client_socket = socket.create_connection((DAEMON_HOST, daemon_port), timeout=1)
+                break
+            except OSError:
+                if time.time() > deadline or daemon.poll() is not None:
+                    raise RuntimeError("Broker daemon did not start")
+                time.sleep(0.1)
+
+        client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        reader = client_socket.makefile("rb")
+        request = encode_frame({"dst_ip": dst_ip, "dst_port": dst_port, "message": SAMPLE_MESSAGE, "ack": True})
+
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(count):
+            t0 = time.perf_counter()
+            client_socket.sendall(request)
+            if read_frame(reader) is None:
+                raise RuntimeError("Broker daemon closed the connection")
+            latencies.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - start
+
+        client_socket.close()
+        return latencies, elapsed
+
+    finally:
+        daemon.terminate()
+        daemon.wait()
+
+# -----------------------------------------------------------------------------------------------------
+
+# Main function
+if __name__ == "__main__":
+
+    # Sending raw packets needs the same privileges as the broker itself (administrator / Npcap)
+    parser = argparse.ArgumentParser(description="Compare the per-spawn broker with the broker daemon.")
+    parser.add_argument("--dst-ip", default="127.0.0.1", help="Destination IP of the generated packets")
+    parser.add_argument("--dst-port", type=int, default=12345, help="Destination port of the generated packets")
+    parser.add_argument("--spawn-count", type=int, default=20, help="Messages sent through the per-spawn path")
+    parser.add_argument("--daemon-count", type=int, default=2000, help="Messages sent through the daemon")
+    parser.add_argument("--daemon-port", type=int, default=55557, help="Local port used by the benchmarked daemon")
+    args = parser.parse_args()
+
+    print_summary("per-spawn", *benchmark_per_spawn(args.dst_ip, args.dst_port, args.spawn_count))
+    print_summary("daemon", *benchmark_daemon(args.dst_ip, args.dst_port, args.daemon_count, args.daemon_port))
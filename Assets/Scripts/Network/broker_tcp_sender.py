@@ -1,46 +1,361 @@
 # Libraries
+import os
 import sys
-from scapy.all import send, TCP, IP, Raw, Ether
+import json
+import time
+import socket
+import struct
+import threading
+from collections import OrderedDict
+from scapy.all import send, conf, TCP, IP, Raw, Ether
+
+# The trace log is shared with the Mininet-WiFi scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "mininet"))
+from trace_log import open_trace_log, text_trace
+from wire_format import encode_unity_message
+
+# -----------------------------------------------------------------------------------------------------
+
+# Default local port where the broker daemon listens for framed messages from Unity
+DAEMON_HOST = "127.0.0.1"
+DAEMON_PORT = 55556
+
+# Frame header: 4-byte big-endian payload length
+FRAME_HEADER = struct.Struct("!I")
+
+# Source port of every packet sent by the broker
+SOURCE_PORT = 55555
+
+# Payload encodings: JSON as received from Unity (default), or binary position messages (wire_format)
+WIRE_FORMATS = ["json", "binary"]
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to construct a TCP packet with RAW payload
+def build_tcp_packet(dst_ip, dst_port, message):
+    """Build the IP/TCP/Raw packet carrying one message (a JSON string or an encoded binary message)."""
+    return (
+        IP(dst=dst_ip) /
+        TCP(sport=SOURCE_PORT, dport=int(dst_port)) /
+        Raw(load=message if isinstance(message, bytes) else message.encode())
+    )
 
 # -----------------------------------------------------------------------------------------------------
 
 # Function to send a TCP packet
-def send_tcp_packet(dst_ip, dst_port, message):
+def send_tcp_packet(dst_ip, dst_port, message, l3_socket=None, verbose=False):
     
     try:
         
         # Construct TCP packet with RAW payload
-        packet = (
-            IP(dst=dst_ip) /
-            TCP(sport=55555, dport=int(dst_port)) /
-            Raw(load=message.encode())
-        )
+        packet = build_tcp_packet(dst_ip, dst_port, message)
         
-        # Send the packet
-        print(f"Sending TCP packet to {dst_ip}:{dst_port} with message: {message}")
-        send(packet, verbose=True)
-        packet.show()
+        # Send the packet, reusing the daemon socket when available (the CLI path opens a new one)
+        if verbose:
+            print(f"Sending TCP packet to {dst_ip}:{dst_port} with message: {message}")
+        send(packet, socket=l3_socket, verbose=verbose)
+
+        # Formatting the packet costs more than sending it, so it is only done on request
+        if verbose:
+            packet.show()
                 
     except Exception as e:
         print(f"Error sending TCP packet: {e}")
 
 # -----------------------------------------------------------------------------------------------------
 
+# Function to keep only the newest message for each destination
+def coalesce_messages(messages):
+    """Return an ordered {(dst_ip, dst_port): message} mapping holding the newest message per destination."""
+    latest = OrderedDict()
+    for dst_ip, dst_port, message in messages:
+        key = (dst_ip, int(dst_port))
+        latest.pop(key, None)  # A superseded destination moves to the end, keeping send order by recency
+        latest[key] = message
+    return latest
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to send several TCP packets with a single send() call
+def send_tcp_batch(messages, l3_socket=None, verbose=False, wire="json"):
+    """Coalesce a list of (dst_ip, dst_port, message) tuples per destination and send them in one call.
+
+    With the binary wire format, untraced position messages are encoded after coalescing.
+    Returns the batch statistics: messages received, packets sent, messages coalesced and elapsed time.
+    """
+    start = time.perf_counter()
+    stats = {"received": len(messages), "sent": 0, "coalesced": 0, "elapsed_ms": 0.0}
+
+    try:
+
+        # Construct one packet per destination, dropping superseded messages
+        latest = coalesce_messages(messages)
+        if wire == "binary":
+            latest = OrderedDict((key, encode_unity_message(key[0], message)) for key, message in latest.items())
+        packets = [build_tcp_packet(dst_ip, dst_port, message) for (dst_ip, dst_port), message in latest.items()]
+
+        # Send all packets at once
+        if packets:
+            send(packets, socket=l3_socket, verbose=verbose)
+        stats["sent"] = len(packets)
+        stats["coalesced"] = len(messages) - len(packets)
+
+        # Formatting the packets costs more than sending them, so it is only done on request
+        if verbose:
+            for packet in packets:
+                packet.show()
+
+    except Exception as e:
+        print(f"Error sending TCP batch: {e}")
+
+    stats["elapsed_ms"] = (time.perf_counter() - start) * 1000.0
+    return stats
+
+# -----------------------------------------------------------------------------------------------------
+
+# Class to group the daemon messages received within a time window into coalesced batches
+class BatchDispatcher:
+    """Send daemon requests in batches, keeping only the newest message per destination within each window."""
+
+    def __init__(self, l3_socket, window=0.0, verbose=False, trace_log=None, wire="json"):
+        self.l3_socket = l3_socket
+        self.window = window
+        self.verbose = verbose
+        self.trace_log = trace_log
+        self.wire = wire
+        self.pending_lock = threading.Lock()
+        self.send_lock = threading.Lock()
+        self.pending = []
+        self.stop_event = threading.Event()
+        self.flush_thread = None
+
+        # With a window, a background thread flushes the pending messages periodically
+        if self.window > 0:
+            self.flush_thread = threading.Thread(target=self.flush_periodically, daemon=True)
+            self.flush_thread.start()
+
+    def submit(self, messages):
+        """Queue a list of (dst_ip, dst_port, message) tuples, or send them right away without a window."""
+        self.record_traces("broker_receive", [message for _, _, message in messages])
+        if self.window > 0:
+            with self.pending_lock:
+                self.pending.extend(messages)
+        else:
+            self.dispatch(messages)
+
+    def flush_periodically(self):
+        """Send the messages collected during each window as one coalesced batch, until closed."""
+        while not self.stop_event.wait(self.window):
+            self.flush()
+
+    def flush(self):
+        """Send the pending messages as one coalesced batch."""
+        with self.pending_lock:
+            messages, self.pending = self.pending, []
+        if messages:
+            self.dispatch(messages)
+
+    def close(self):
+        """Stop the flush thread and send what is still pending. The layer-3 socket can be closed afterwards."""
+        self.stop_event.set()
+        if self.flush_thread is not None:
+            self.flush_thread.join()
+        self.flush()
+
+    def dispatch(self, messages):
+        """Send one batch and report its timing."""
+        with self.send_lock:
+            stats = send_tcp_batch(messages, l3_socket=self.l3_socket, verbose=self.verbose, wire=self.wire)
+        self.record_traces("broker_send", coalesce_messages(messages).values())
+        print(f"(BROKER-BATCH) {stats['sent']} packets sent, {stats['coalesced']} coalesced, "
+              f"{stats['elapsed_ms']:.2f} ms")
+
+    def record_traces(self, event, messages):
+        """Record event for the traced messages. The messages themselves are forwarded unchanged."""
+        if self.trace_log is None:
+            return
+        for message in messages:
+            trace = text_trace(message)
+            if trace is not None:
+                self.trace_log.record(event, *trace)
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to encode a broker request as a length-prefixed frame
+def encode_frame(request):
+    """Encode a request dictionary as a length-prefixed JSON frame."""
+    payload = json.dumps(request, separators=(",", ":")).encode("utf-8")
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to read exactly one frame from a binary stream
+def read_frame(stream):
+    """Read one length-prefixed JSON frame from a binary stream. Returns None at end of stream."""
+    header = stream.read(FRAME_HEADER.size)
+    if len(header) < FRAME_HEADER.size:
+        return None
+
+    (length,) = FRAME_HEADER.unpack(header)
+    payload = stream.read(length)
+    if len(payload) < length:
+        return None
+
+    return json.loads(payload.decode("utf-8"))
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to extract the (dst_ip, dst_port, message) tuples of a daemon request
+def request_messages(request):
+    """Return the messages of a single request or of a {"batch": [...]} request. Raises ValueError if malformed."""
+    if not isinstance(request, dict):
+        raise ValueError(f"request is a {type(request).__name__}, not an object")
+    entries = request["batch"] if "batch" in request else [request]
+    if not isinstance(entries, list):
+        raise ValueError("batch is not a list")
+
+    messages = []
+    for entry in entries:
+        if not isinstance(entry, dict):
+            raise ValueError(f"batch entry is a {type(entry).__name__}, not an object")
+        dst_ip, dst_port, message = entry.get("dst_ip"), entry.get("dst_port"), entry.get("message")
+        if not isinstance(dst_ip, str) or not isinstance(dst_port, int) or not isinstance(message, str):
+            raise ValueError("entry needs a string dst_ip, an integer dst_port and a string message")
+        messages.append((dst_ip, dst_port, message))
+    return messages
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to serve the frames of one client (a TCP connection or stdin)
+def serve_frames(reader, writer, dispatcher):
+    """Send every framed request read from the client, acknowledging it when asked to."""
+    while True:
+        try:
+            request = read_frame(reader)
+        except (OSError, ValueError) as e:
+            print(f"(BROKER-DAEMON) Dropping client after invalid frame: {e}")
+            return
+
+        if request is None:
+            return
+
+        # A well-framed but malformed request is dropped alone: the next frame can still be read
+        try:
+            messages = request_messages(request)
+        except ValueError as e:
+            print(f"(BROKER-DAEMON) Dropping invalid request: {e}")
+            continue
+        dispatcher.submit(messages)
+
+        # Acknowledgements are opt-in so fire-and-forget clients never fill the socket buffer
+        if request.get("ack") and writer is not None:
+            writer.write(encode_frame({"ack": True}))
+            writer.flush()
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to run the broker as a long-running daemon
+def run_daemon(port=DAEMON_PORT, use_stdin=False, window=0.0, verbose=False, trace_directory=None, wire="json"):
+    """Keep one layer-3 socket open and send every framed message received on a local socket or stdin."""
+    
+    # Build the layer-3 socket once, instead of once per message
+    l3_socket = conf.L3socket()
+    trace_log = open_trace_log(trace_directory, "broker")
+    dispatcher = BatchDispatcher(l3_socket, window=window, verbose=verbose, trace_log=trace_log, wire=wire)
+
+    try:
+
+        # Read frames from stdin until the parent process closes it
+        if use_stdin:
+            # stdout carries the acknowledgement frames, so log lines go to stderr
+            ack_stream = sys.stdout.buffer
+            sys.stdout = sys.stderr
+            print("(BROKER-DAEMON) Reading framed messages from stdin")
+            serve_frames(sys.stdin.buffer, ack_stream, dispatcher)
+            return
+
+        # Listen on the loopback interface only
+        server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server_socket.bind((DAEMON_HOST, port))
+        server_socket.listen(5)
+        print(f"(BROKER-DAEMON) Listening for framed messages on {DAEMON_HOST}:{port}")
+
+        while True:
+            client_socket, addr = server_socket.accept()
+            client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            print(f"(BROKER-DAEMON) Connection from {addr}")
+            threading.Thread(
+                target=handle_client, args=(client_socket, dispatcher), daemon=True
+            ).start()
+
+    finally:
+        dispatcher.close()
+        l3_socket.close()
+        if trace_log is not None:
+            trace_log.close()
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to handle one TCP client of the daemon
+def handle_client(client_socket, dispatcher):
+    """Serve one client connection until it closes."""
+    with client_socket:
+        reader = client_socket.makefile("rb")
+        writer = client_socket.makefile("wb")
+        serve_frames(reader, writer, dispatcher)
+
+# -----------------------------------------------------------------------------------------------------
+
 # Main function
 if __name__ == "__main__":
     
+    # Verbose output and packet dumps are opt-in
+    verbose = "--verbose" in sys.argv
+    args = [arg for arg in sys.argv[1:] if arg != "--verbose"]
+
+    # Daemon mode: python broker_tcp_sender.py --daemon [--stdin | <listen_port>] [--window <seconds>] [--trace <dir>]
+    #              [--wire json|binary]
+    if args and args[0] == "--daemon":
+        window = 0.0
+        if "--window" in args:
+            index = args.index("--window")
+            window = float(args[index + 1])
+            del args[index:index + 2]
+        trace_directory = None
+        if "--trace" in args:
+            index = args.index("--trace")
+            trace_directory = args[index + 1]
+            del args[index:index + 2]
+        wire = "json"
+        if "--wire" in args:
+            index = args.index("--wire")
+            wire = args[index + 1]
+            del args[index:index + 2]
+            if wire not in WIRE_FORMATS:
+                print(f"Unknown wire format {wire}, expected one of {', '.join(WIRE_FORMATS)}")
+                sys.exit(1)
+        if len(args) >= 2 and args[1] == "--stdin":
+            run_daemon(use_stdin=True, window=window, verbose=verbose, trace_directory=trace_directory, wire=wire)
+        else:
+            run_daemon(port=int(args[1]) if len(args) >= 2 else DAEMON_PORT, window=window, verbose=verbose,
+                       trace_directory=trace_directory, wire=wire)
+        sys.exit(0)
+
     # Check if the number of arguments is correct
-    if len(sys.argv) < 4:
-        print("Usage: python broker.py <dst_ip> <dst_port> <message>")
+    if len(args) < 3:
+        print("Usage: python broker.py <dst_ip> <dst_port> <message> [--verbose]")
+        print("       python broker.py --daemon [--stdin | <listen_port>] [--window <seconds>] [--trace <dir>] "
+              "[--wire json|binary] [--verbose]")
         sys.exit(1)
     
     # Extract arguments
-    dst_ip = sys.argv[1]
-    dst_port = int(sys.argv[2])
-    message = sys.argv[3]
+    dst_ip = args[0]
+    dst_port = int(args[1])
+    message = args[2]
 
     # Print the received message
     print(f"(BROKER-TCP-SENDER) Received message from Unity: {message}")
 
     # Send the TCP packet
-    send_tcp_packet(dst_ip, dst_port, message)
+    send_tcp_packet(dst_ip, dst_port, message, verbose=verbose)
@@ -0,0 +1,162 @@
+# Libraries
+import os
+import sys
+import glob
+import argparse
+import numpy as np
+from trace_log import TRACE_EVENTS, TRACE_HEADER, TRACE_MAGIC, TRACE_RECORD
+
+# -----------------------------------------------------------------------------------------------------
+
+# NumPy view of the trace records written by trace_log.TraceLog
+TRACE_DTYPE = np.dtype([("time", "<f8"), ("origin", "<f8"), ("seq", "<u4"), ("event", "u1"), ("drone", "S16"),
+                        ("padding", "V3")])
+assert TRACE_DTYPE.itemsize == TRACE_RECORD.size
+
+# Latency histogram bins (ms), logarithmic since hops range from microseconds to seconds
+HISTOGRAM_BINS = np.concatenate([[0.0], np.logspace(-2, 4, 13)])
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to read one trace file
+def read_trace_file(path):
+    """Return (process, records) of a trace file. A partially written last record is ignored."""
+    with open(path, "rb") as file:
+        magic, version, process = TRACE_HEADER.unpack(file.read(TRACE_HEADER.size))
+    if magic != TRACE_MAGIC:
+        raise ValueError(f"{path} is not a trace log")
+    count = (os.path.getsize(path) - TRACE_HEADER.size) // TRACE_RECORD.size
+    records = np.fromfile(path, dtype=TRACE_DTYPE, count=count, offset=TRACE_HEADER.size)
+    return process.rstrip(b"\0").decode("utf-8"), records
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to index the first time each sequence id reached each event
+def event_times(records):
+    """Return {event name: (sorted unique seqs, times, origins, drones)}, keeping the first record of each seq."""
+    events = {}
+    for code, name in enumerate(TRACE_EVENTS, 1):
+        selected = records[records["event"] == code]
+        if not len(selected):
+            continue
+        selected = selected[np.lexsort((selected["time"], selected["seq"]))]
+        seqs, first = np.unique(selected["seq"], return_index=True)
+        selected = selected[first]
+        events[name] = (seqs, selected["time"], selected["origin"], selected["drone"])
+    return events
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to compute the latency of every hop
+def hop_latencies(events):
+    """Return [(hop name, latencies in ms, updates lost on the hop)] from Unity to the last traced event.
+
+    Hops join the consecutive traced events on the sequence id with a sorted intersection. Events of
+    processes that were not traced are skipped, so a hop may span several components. Hops between two
+    machines (the broker and the sniffers) also include the clock offset between them.
+    """
+    names = [name for name in TRACE_EVENTS if name in events]
+    if not names:
+        return []
+
+    seqs, times, origins, _ = events[names[0]]
+    hops = [(f"unity -> {names[0]}", (times - origins) * 1000.0, 0)]
+    for previous, current in zip(names, names[1:]):
+        previous_seqs, previous_times = events[previous][:2]
+        current_seqs, current_times = events[current][:2]
+        _, i, j = np.intersect1d(previous_seqs, current_seqs, assume_unique=True, return_indices=True)
+        hops.append((f"{previous} -> {current}", (current_times[j] - previous_times[i]) * 1000.0,
+                     len(previous_seqs) - len(i)))
+
+    seqs, times, origins, _ = events[names[-1]]
+    hops.append((f"unity -> {names[-1]} (end to end)", (times - origins) * 1000.0, 0))
+    return hops
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to format a latency histogram
+def histogram_lines(latencies, width=40):
+    """Return text lines with one bar per logarithmic latency bin."""
+    counts, edges = np.histogram(latencies, bins=np.append(HISTOGRAM_BINS, np.inf))
+    scale = width / max(1, counts.max())
+    return [f"    {low:>9.2f} - {high:<9.2f} ms | {'#' * int(np.ceil(count * scale)):<{width}} {count}"
+            for low, high, count in zip(edges[:-1], edges[1:], counts) if count]
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to compute the update rate of every drone at one event
+def drone_rates(events, event):
+    """Return {drone: (updates, updates per second)} for the records of one event."""
+    _, times, _, drones = events[event]
+    rates = {}
+    for drone in np.unique(drones):
+        drone_times = times[drones == drone]
+        span = drone_times.max() - drone_times.min()
+        rates[drone.decode("utf-8")] = (len(drone_times), (len(drone_times) - 1) / span if span > 0 else 0.0)
+    return rates
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to plot the hop latency histograms
+def plot_hops(hops, output_image_path):
+    """Save one latency histogram per hop in a single image."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, axes = plt.subplots(len(hops), 1, figsize=(10, 2.5 * len(hops)), squeeze=False)
+    for ax, (name, latencies, _) in zip(axes[:, 0], hops):
+        ax.hist(np.clip(latencies, HISTOGRAM_BINS[1], None), bins=HISTOGRAM_BINS[1:])
+        ax.set_xscale("log")
+        ax.set_title(name)
+        ax.set_xlabel("Latency (ms)")
+        ax.grid(True, linestyle='-', color='gray', alpha=0.5)
+    fig.tight_layout()
+    fig.savefig(output_image_path)
+    plt.close(fig)
+    print(f"Plot saved as {output_image_path}")
+
+# -----------------------------------------------------------------------------------------------------
+
+# Main function
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Merge the trace logs and report per-hop latencies and per-drone rates.")
+    parser.add_argument("paths", nargs="*", default=["traces"], help="Trace files or directories of *.trace files")
+    parser.add_argument("--plot", default=None, help="Save the latency histograms in this image")
+    args = parser.parse_args()
+
+    # Merge the records of every process
+    paths = []
+    for path in args.paths:
+        paths.extend(sorted(glob.glob(os.path.join(path, "*.trace"))) if os.path.isdir(path) else [path])
+    parts = []
+    for path in paths:
+        process, records = read_trace_file(path)
+        print(f"{path}: {process}, {len(records)} records")
+        parts.append(records)
+    if not parts:
+        print("No trace files found")
+        sys.exit(1)
+    events = event_times(np.concatenate(parts))
+
+    # Latency of every hop
+    hops = hop_latencies(events)
+    print("\nHop latencies (ms):")
+    for name, latencies, lost in hops:
+        if not len(latencies):
+            print(f"  {name}: no common updates")
+            continue
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+        print(f"  {name}: {len(latencies)} updates | p50 {p50:.3f} | p90 {p90:.3f} | p99 {p99:.3f} | "
+              f"max {latencies.max():.3f} | lost {lost}")
+        print("\n".join(histogram_lines(latencies)))
+
+    # Update rate of every drone at the last traced hop
+    last_event = [name for name in TRACE_EVENTS if name in events][-1]
+    print(f"\nUpdate rates at {last_event}:")
+    for drone, (count, rate) in sorted(drone_rates(events, last_event).items()):
+        print(f"  {drone}: {count} updates, {rate:.2f} updates/s")
+
+    if args.plot:
+        plot_hops(hops, args.plot)
@@ -0,0 +1,409 @@
+# Libraries
+import os
+import sys
+import json
+import math
+import time
+import socket
+import argparse
+import resource
+import threading
+import multiprocessing
+import numpy as np
+from types import SimpleNamespace
+from handshake_protocol import ConvertUnityPositionToMininetWIFI, JsonMessageReader, encode_message, parse_initial_positions
+from position_channel import PositionChannel
+import sniffer_container
+from position_server import PositionCommandServer
+from control_plane import ControlPlane
+from radio_planning import CoverageReplanner, DronePositionTable, plan_coverage
+from trace_log import split_command_trace
+
+# The broker lives one directory up, with the Unity-side scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from broker_tcp_sender import BatchDispatcher, encode_frame, handle_client
+
+# -----------------------------------------------------------------------------------------------------
+
+# Loopback address of every component
+HOST = "127.0.0.1"
+
+# Seconds given to the components to deliver the last updates once Unity stops sending
+DRAIN_SECONDS = 1.0
+
+# Port of the sniffed drone messages, as sent by Unity
+DRONE_PORT = 12345
+
+# Ethernet header put in front of the broker packets, so the sniffers slice them as captured frames
+ETHERNET_HEADER = bytes(12) + b"\x08\x00"
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to reserve a free loopback port
+def free_port(kind=socket.SOCK_STREAM):
+    """Return a port that is free on the loopback interface."""
+    with socket.socket(socket.AF_INET, kind) as probe:
+        probe.bind((HOST, 0))
+        return probe.getsockname()[1]
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to measure the CPU time of the current process
+def cpu_seconds():
+    """User plus system CPU time of this process."""
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to compute the Unity position of a drone at a given time
+def drone_position(i, elapsed):
+    """Drones fly circles of growing radius around the base station, at 1 to 30 m altitude."""
+    angle = elapsed * 0.2 + i
+    radius = 20.0 + (i % 50) * 4.0 + elapsed
+    return {"x": 250.0 + radius * math.cos(angle), "y": 1.0 + i % 30, "z": 250.0 + radius * math.sin(angle)}
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to get the container IP of a drone
+def drone_ip(i):
+    """Return a distinct 10.0.x.y address for each drone index."""
+    return f"10.0.{i // 250}.{i % 250 + 1}"
+
+# -----------------------------------------------------------------------------------------------------
+
+# Class to hand the broker packets to the sniffer stand-ins without a raw socket
+class LoopbackL3Socket:
+    """Layer-3 socket given to the broker BatchDispatcher: instead of sending each built IP/TCP packet, it
+    sends it with an Ethernet header as one UDP datagram to the sniffer process of its destination."""
+
+    def __init__(self, routes):
+        self.routes = routes  # dst_ip -> UDP port of the sniffer process
+        self.sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sent = 0
+
+    def send(self, packet):
+        self.sender.sendto(ETHERNET_HEADER + bytes(packet), (HOST, self.routes[packet.dst]))
+        self.sent += 1
+
+    def close(self):
+        self.sender.close()
+
+# -----------------------------------------------------------------------------------------------------
+
+# Class to give every drone of a sniffer stand-in its own command channel
+class DroneChannels:
+    """Channel interface used by sniffer_container.process_positions, with one PositionChannel per drone as with
+    one sniffer container per drone."""
+
+    def __init__(self, command_port):
+        self.command_port = command_port
+        self.channels = {}
+
+    def channel(self, key):
+        channel = self.channels.get(key)
+        if channel is None:
+            channel = self.channels[key] = PositionChannel(HOST, self.command_port)
+        return channel
+
+    def send_position(self, drone_id, position, trace=None):
+        self.channel(drone_id).send_position(drone_id, position, trace)
+
+    def send_position_entry(self, index, position):
+        self.channel(index).send_position_entry(index, position)
+
+    def close(self):
+        for channel in self.channels.values():
+            channel.close()
+        return sum(channel.coalesced for channel in self.channels.values())
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to run the Mininet-WiFi side: handshake, coverage replies and command server
+def topology_component(handshake_port, command_port, use_control_plane, stop, results):
+    """Stand-in for mininet_topo.minimal_topology without Mininet: same parsing, planning and command serving."""
+    latencies = []
+    commands = {}
+    lock = threading.Lock()
+    start_cpu = cpu_seconds()
+
+    # Handshake, as in process_positions_once
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server_socket.bind((HOST, handshake_port))
+    server_socket.listen(1)
+    client_socket, _ = server_socket.accept()
+    positions = parse_initial_positions(JsonMessageReader(client_socket).read_message())
+    server_socket.close()
+
+    # Coverage plan and first reply, as in minimal_topology
+    ap = SimpleNamespace(wintfs=[SimpleNamespace(txpower=0.0)])
+    drone_table = DronePositionTable(positions["drone_positions"])
+    plan = plan_coverage(positions["ap_position"], drone_table.positions)
+    ap.wintfs[0].txpower = float(plan["tx_power"][0])
+    radius = float(plan["max_distance"][0]) + 10
+
+    # Record every command and the latency of the traced ones
+    def handle_command(line):
+        command, trace = split_command_trace(line)
+        now = time.time()
+        replanner.observe(command)
+        drone_id = command.split(".", 2)[1]
+        with lock:
+            commands[drone_id] = commands.get(drone_id, 0) + 1
+            if trace is not None:
+                latencies.append(now - trace[1])
+
+    # Serve the commands and the coverage replies as minimal_topology does in each mode
+    if use_control_plane:
+        control_plane = ControlPlane(handle_command)
+        control_plane.start(HOST, command_port, unity_socket=client_socket)
+        notify = lambda radius: control_plane.send_to_unity({"coverageRadius": radius})
+    else:
+        notify = lambda radius: client_socket.sendall((json.dumps({"coverageRadius": radius}) + "\n").encode("utf-8"))
+        PositionCommandServer(HOST, command_port, handle_command).start()
+    replanner = CoverageReplanner(ap, positions["ap_position"], drone_table, notify, radius).start()
+    notify(radius)  # Unity starts streaming once it has the first coverage radius
+
+    stop.wait()
+    with lock:
+        results.put(("topology", {"applied": sum(commands.values()), "drones": len(commands),
+                                  "latencies": latencies, "replans": replanner.replans,
+                                  "cpu": cpu_seconds() - start_cpu}))
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to run the broker daemon
+def broker_component(broker_port, routes, window, stop, results):
+    """Serve the framed Unity requests with the BatchDispatcher and handle_client of broker_tcp_sender.
+
+    Packets are built by the broker as for the real network, and handed to a LoopbackL3Socket instead of
+    being sent through a raw socket.
+    """
+    start_cpu = cpu_seconds()
+    l3_socket = LoopbackL3Socket(routes)
+    dispatcher = BatchDispatcher(l3_socket, window=window)
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server_socket.bind((HOST, broker_port))
+    server_socket.listen(5)
+    server_socket.settimeout(0.1)
+
+    while not stop.is_set():
+        try:
+            client_socket, _ = server_socket.accept()
+        except socket.timeout:
+            continue
+        client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        threading.Thread(target=handle_client, args=(client_socket, dispatcher), daemon=True).start()
+
+    server_socket.close()
+    dispatcher.close()
+    l3_socket.close()
+    results.put(("broker", {"packets": l3_socket.sent, "cpu": cpu_seconds() - start_cpu}))
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to run one sniffer stand-in serving several drones
+def sniffer_component(udp_port, command_port, stop, results):
+    """Slice, decode and forward each frame with sniffer_container.extract_payload_from_frame and handle_payload,
+    as its fast capture loop does, with one command channel per drone."""
+    start_cpu = cpu_seconds()
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    receiver.bind((HOST, udp_port))
+    receiver.settimeout(0.1)
+
+    channels = DroneChannels(command_port)
+    sniffer_container.init_forwarding(channels, f"sniffer-{udp_port}")
+    while not stop.is_set():
+        try:
+            frame = receiver.recv(65535)
+        except socket.timeout:
+            continue
+        sniffer_container.handle_payload(sniffer_container.extract_payload_from_frame(frame), time.time())
+
+    coalesced = channels.close()
+    stats = sniffer_container.stats
+    results.put(("sniffer", {"received": stats.seen, "forwarded": stats.parsed, "coalesced": coalesced,
+                             "cpu": cpu_seconds() - start_cpu}))
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to run the fake Unity client
+def unity_component(handshake_port, broker_port, drone_count, rate, duration, results):
+    """Send the initial message, stream one position per drone every 1/rate seconds and read the coverage replies.
+
+    As BaseStationMininetWifi does with the broker daemon, the positions of each tick go in one framed batch.
+    """
+    start_cpu = cpu_seconds()
+    drone_ids = [f"DRO{i + 1:04d}" for i in range(drone_count)]
+    initial = {
+        "label": "FirstSpecialMessage",
+        "baseStation": {"position": {"x": 250.0, "y": 30.0, "z": 250.0}, "id": "ap1"},
+        "drones": [{"position": drone_position(i, 0.0), "id": drone_id} for i, drone_id in enumerate(drone_ids)],
+    }
+
+    handshake_start = time.perf_counter()
+    connection = socket.create_connection((HOST, handshake_port))
+    connection.sendall(encode_message(initial))
+    replies = connection.makefile("r", encoding="utf-8")
+    first_reply = json.loads(replies.readline())
+    handshake = time.perf_counter() - handshake_start
+
+    # Coverage updates arrive while streaming
+    coverage = [first_reply["coverageRadius"]]
+    reader = threading.Thread(target=lambda: coverage.extend(json.loads(line)["coverageRadius"] for line in replies),
+                              daemon=True)
+    reader.start()
+
+    broker = socket.create_connection((HOST, broker_port))
+    broker.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    seq = 0
+    sent = 0
+    late_ticks = 0
+    start = time.perf_counter()
+    next_tick = start
+    while next_tick - start < duration:
+        elapsed = next_tick - start
+        batch = []
+        for i, drone_id in enumerate(drone_ids):
+            seq += 1
+            message = {"label": "Position", "drone": {"position": drone_position(i, elapsed), "id": drone_id},
+                       "trace": {"seq": seq, "t0": time.time()}}
+            batch.append({"dst_ip": drone_ip(i), "dst_port": DRONE_PORT, "message": json.dumps(message)})
+        broker.sendall(encode_frame({"batch": batch}))
+        sent += len(batch)
+
+        # Keep the tick rate; a tick that overruns its period starts the next one right away
+        next_tick += 1.0 / rate
+        delay = next_tick - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            late_ticks += 1
+
+    results.put(("unity", {"sent": sent, "send_seconds": time.perf_counter() - start, "late_ticks": late_ticks,
+                           "handshake": handshake, "coverage_replies": len(coverage),
+                           "cpu": cpu_seconds() - start_cpu}))
+    time.sleep(DRAIN_SECONDS)
+    broker.close()
+    connection.close()
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to run a component with its log lines muted
+def quiet_component(target, *args):
+    """Run a component process without its per-connection log lines, which would bury the report."""
+    sys.stdout = open(os.devnull, "w")
+    target(*args)
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to run the whole bridge for one drone count
+def run_scenario(drone_count, rate, duration, sniffer_count, use_control_plane, window=0.0):
+    """Run Unity, the broker, the sniffers and the topology as separate processes and return their merged results."""
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    stop = context.Event()
+    handshake_port = free_port()
+    command_port = free_port()
+    broker_port = free_port()
+    sniffer_ports = [free_port(socket.SOCK_DGRAM) for _ in range(sniffer_count)]
+    routes = {drone_ip(i): sniffer_ports[i % sniffer_count] for i in range(drone_count)}
+
+    topology = context.Process(target=quiet_component, args=(topology_component, handshake_port, command_port,
+                                                             use_control_plane, stop, results))
+    sniffers = [context.Process(target=quiet_component, args=(sniffer_component, port, command_port, stop, results))
+                for port in sniffer_ports]
+    broker = context.Process(target=quiet_component, args=(broker_component, broker_port, routes, window, stop, results))
+    unity = context.Process(target=quiet_component, args=(unity_component, handshake_port, broker_port,
+                                                          drone_count, rate, duration, results))
+
+    topology.start()
+    for sniffer in sniffers:
+        sniffer.start()
+    broker.start()
+    time.sleep(0.2)  # Let the servers bind before Unity connects
+    unity.start()
+
+    # Wait for Unity to finish, then let the updates drain and stop the others
+    collected = {"sniffer": []}
+    expected = 3 + sniffer_count
+    while expected:
+        name, value = results.get(timeout=duration + 60)
+        if name == "unity":
+            time.sleep(DRAIN_SECONDS)
+            stop.set()
+        if name == "sniffer":
+            collected["sniffer"].append(value)
+        else:
+            collected[name] = value
+        expected -= 1
+
+    for process in [topology, unity, broker] + sniffers:
+        process.join(timeout=5)
+        if process.is_alive():
+            process.terminate()
+    return collected
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to summarize one scenario
+def summarize(drone_count, rate, collected):
+    """Return the report row of a scenario."""
+    unity = collected["unity"]
+    topology = collected["topology"]
+    latencies = np.asarray(topology["latencies"]) * 1000.0
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99]) if len(latencies) else (float("nan"),) * 3
+    send_seconds = unity["send_seconds"]
+    return {
+        "drones": drone_count,
+        "offered": drone_count * rate,
+        "sent_per_s": unity["sent"] / send_seconds,
+        "applied_per_s": topology["applied"] / send_seconds,
+        "applied": topology["applied"],
+        "broker_packets": collected["broker"]["packets"],
+        "coalesced": sum(sniffer["coalesced"] for sniffer in collected["sniffer"]),
+        "p50": p50, "p90": p90, "p99": p99,
+        "handshake_ms": unity["handshake"] * 1000.0,
+        "coverage_replies": unity["coverage_replies"],
+        "late_ticks": unity["late_ticks"],
+        "cpu_unity": unity["cpu"] / send_seconds,
+        "cpu_broker": collected["broker"]["cpu"] / send_seconds,
+        "cpu_sniffers": sum(sniffer["cpu"] for sniffer in collected["sniffer"]) / send_seconds,
+        "cpu_topology": topology["cpu"] / send_seconds,
+    }
+
+# -----------------------------------------------------------------------------------------------------
+
+# Main function
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Benchmark the Unity <-> Mininet-WiFi bridge on loopback, without root or Mininet.")
+    parser.add_argument("--drones", default="10,100,1000", help="Comma-separated drone counts")
+    parser.add_argument("--rate", type=float, default=1.0, help="Position messages per drone per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of position streaming per drone count")
+    parser.add_argument("--sniffers", type=int, default=4, help="Sniffer processes sharing the drones")
+    parser.add_argument("--control-plane", action="store_true", help="Serve the commands with the asyncio ControlPlane")
+    parser.add_argument("--window", type=float, default=0.0, help="Coalescing window (s) of the broker, as its --window")
+    parser.add_argument("--json", default=None, help="Also write the report rows to this JSON file")
+    args = parser.parse_args()
+
+    rows = []
+    print(f"{'drones':>6} | {'offered/s':>9} | {'sent/s':>8} | {'applied/s':>9} | {'coalesced':>9} | "
+          f"{'p50 ms':>7} | {'p90 ms':>7} | {'p99 ms':>8} | {'handshake':>9} | {'replies':>7} | "
+          f"CPU unity / broker / sniffers / topology")
+    for drone_count in [int(value) for value in args.drones.split(",")]:
+        row = summarize(drone_count, args.rate,
+                        run_scenario(drone_count, args.rate, args.duration, args.sniffers, args.control_plane, args.window))
+        rows.append(row)
+        print(f"{row['drones']:>6} | {row['offered']:>9.0f} | {row['sent_per_s']:>8.0f} | {row['applied_per_s']:>9.0f} | "
+              f"{row['coalesced']:>9} | {row['p50']:>7.2f} | {row['p90']:>7.2f} | {row['p99']:>8.2f} | "
+              f"{row['handshake_ms']:>6.1f} ms | {row['coverage_replies']:>7} | "
+              f"{row['cpu_unity']:.0%} / {row['cpu_broker']:.0%} / {row['cpu_sniffers']:.0%} / {row['cpu_topology']:.0%}")
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(rows, file, indent=2)
+    sys.exit(0)
@@ -0,0 +1,123 @@
+# Libraries
+import json
+import random
+import timeit
+import argparse
+from handshake_protocol import ConvertUnityPositionToMininetWIFI
+from position_channel import position_command
+from position_server import parse_command
+from wire_format import POSITION_ENTRY, decode_positions, encode_position_entries, encode_positions, encode_unity_message
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to build the Position messages Unity sends for a set of drones
+def unity_messages(drone_count):
+    """Return (drone index, drone id, Unity position, JSON message) of every drone."""
+    random.seed(0)
+    messages = []
+    for i in range(drone_count):
+        position = (random.uniform(0, 500), random.uniform(0, 30), random.uniform(0, 500))
+        drone_id = f"DRO{i + 1:04d}"
+        message = json.dumps({"label": "Position", "drone": {"position": {"x": position[0], "y": position[1], "z": position[2]},
+                                                             "id": drone_id}})
+        messages.append((i, drone_id, position, message))
+    return messages
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to time a function per update
+def per_update(function, updates, repeat):
+    """Return the best time per update (us) of function, which handles updates updates per call."""
+    number = max(1, 20000 // updates)
+    return min(timeit.repeat(function, number=number, repeat=repeat)) / (number * updates) * 1e6
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to run the JSON and binary paths of every hop
+def run_benchmarks(drone_count, repeat):
+    """Return [(hop, JSON us/update, binary us/update)] and [(hop, JSON bytes/update, binary bytes/update)]."""
+    messages = unity_messages(drone_count)
+    dst_ips = [f"10.0.0.{101 + i}" for i, _, _, _ in messages]
+
+    # What each hop receives on each path
+    json_payloads = [message.encode() for _, _, _, message in messages]
+    binary_payloads = [encode_unity_message(dst_ip, message) for dst_ip, (_, _, _, message) in zip(dst_ips, messages)]
+    text_commands = [position_command(drone_id, ConvertUnityPositionToMininetWIFI(position))
+                     for _, drone_id, position, _ in messages]
+    entries = [POSITION_ENTRY.pack(i, *ConvertUnityPositionToMininetWIFI(position)) for i, _, position, _ in messages]
+    single_messages = [encode_position_entries([entry]) for entry in entries]
+    batch_message = encode_position_entries(entries)
+
+    # Broker: JSON forwards the Unity string, binary converts it (or would receive it already encoded)
+    def broker_json():
+        return [message.encode() for _, _, _, message in messages]
+
+    def broker_binary():
+        return [encode_unity_message(dst_ip, message) for dst_ip, (_, _, _, message) in zip(dst_ips, messages)]
+
+    def broker_native():
+        return [encode_positions([(i, position)]) for i, _, position, _ in messages]
+
+    # Sniffer: decode the payload and build what is forwarded to the topology
+    def sniffer_json():
+        for payload in json_payloads:
+            drone = json.loads(payload.decode("utf-8"))["drone"]
+            position = drone["position"]
+            position_command(drone["id"], ConvertUnityPositionToMininetWIFI((position["x"], position["y"], position["z"]))).encode()
+
+    def sniffer_binary():
+        for payload in binary_payloads:
+            for index, position in decode_positions(payload):
+                encode_position_entries([POSITION_ENTRY.pack(index, *ConvertUnityPositionToMininetWIFI(position))])
+
+    # Topology: parse what the sniffers forwarded into a node and coordinates
+    def topology_text():
+        for command in text_commands:
+            node, _, args = parse_command(command)
+            [float(value) for value in args.split(",")]
+
+    def topology_binary():
+        for message in single_messages:
+            decode_positions(message)
+
+    def topology_batch():
+        decode_positions(batch_message)
+
+    timings = [
+        ("broker encode (Unity JSON -> payload)", per_update(broker_json, drone_count, repeat),
+         per_update(broker_binary, drone_count, repeat)),
+        ("broker encode, from values", per_update(broker_json, drone_count, repeat),
+         per_update(broker_native, drone_count, repeat)),
+        ("sniffer decode + forward", per_update(sniffer_json, drone_count, repeat),
+         per_update(sniffer_binary, drone_count, repeat)),
+        ("topology parse, one per message", per_update(topology_text, drone_count, repeat),
+         per_update(topology_binary, drone_count, repeat)),
+        (f"topology parse, batch of {drone_count}", per_update(topology_text, drone_count, repeat),
+         per_update(topology_batch, drone_count, repeat)),
+    ]
+    sizes = [
+        ("broker -> sniffer payload", sum(map(len, json_payloads)) / drone_count, sum(map(len, binary_payloads)) / drone_count),
+        ("sniffer -> topology command", sum(len(command) + 1 for command in text_commands) / drone_count,
+         sum(map(len, single_messages)) / drone_count),
+        (f"batch of {drone_count}", sum(len(command) + 1 for command in text_commands) / drone_count,
+         len(batch_message) / drone_count),
+    ]
+    return timings, sizes
+
+# -----------------------------------------------------------------------------------------------------
+
+# Main function
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Compare the JSON/text and binary wire formats of the position updates.")
+    parser.add_argument("--drones", type=int, default=100, help="Drones per batch")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing repetitions (the best one is kept)")
+    args = parser.parse_args()
+
+    timings, sizes = run_benchmarks(args.drones, args.repeat)
+    print(f"{'hop':<40} | {'JSON us/upd':>11} | {'binary us/upd':>13} | speedup")
+    for hop, json_time, binary_time in timings:
+        print(f"{hop:<40} | {json_time:>11.3f} | {binary_time:>13.3f} | {json_time / binary_time:>6.2f}x")
+    print(f"\n{'hop':<40} | {'JSON B/upd':>11} | {'binary B/upd':>13} | ratio")
+    for hop, json_size, binary_size in sizes:
+        print(f"{hop:<40} | {json_size:>11.1f} | {binary_size:>13.1f} | {json_size / binary_size:>6.1f}x")
@@ -0,0 +1,187 @@
+# Libraries
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from position_server import parse_command
+from wire_format import WIRE_HEADER, WIRE_MAGIC, decode_positions, message_size
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to get the coalescing key of a queued command
+def position_key(command):
+    """Return the node whose position a setPosition command or a (drone index, position) entry sets, or None."""
+    if isinstance(command, tuple):
+        return ("entry", command[0])
+    parsed = parse_command(command)
+    if parsed is not None and parsed[1] == "setPosition":
+        return parsed[0]
+    return None
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to drop the setPosition commands superseded within a batch
+def coalesce_commands(commands):
+    """Keep only the latest setPosition per node, preserving the order of the remaining commands."""
+    seen = set()
+    kept = []
+    for command in reversed(commands):
+        key = position_key(command)
+        if key is not None:
+            if key in seen:
+                continue
+            seen.add(key)
+        kept.append(command)
+    kept.reverse()
+    return kept
+
+# -----------------------------------------------------------------------------------------------------
+
+# Class to run the Unity <-> Mininet-WiFi control plane on a single event loop
+class ControlPlane:
+    """Event loop multiplexing the Unity connection, the drone command connections and the messages to Unity.
+
+    Commands of all containers go through one bounded queue. When the applier falls behind, the readers
+    stop reading and TCP flow control slows the sniffers down. Commands are applied to the Mininet nodes
+    by a single dedicated thread, so the event loop never blocks on Mininet. Binary position messages
+    (wire_format) are queued as (drone index, position) entries and applied by position_handler.
+    """
+
+    def __init__(self, handler, max_pending_commands=1024, max_outgoing_messages=256, position_handler=None):
+        self.handler = handler
+        self.position_handler = position_handler
+        self.max_pending_commands = max_pending_commands
+        self.max_outgoing_messages = max_outgoing_messages
+        self.applier = ThreadPoolExecutor(max_workers=1, thread_name_prefix="control-plane-apply")
+        self.ready = threading.Event()
+        self.startup_error = None
+        self.loop = None
+        self.commands = None
+        self.outgoing = None
+
+        # Counters of the control plane
+        self.connections = 0
+        self.received = 0
+        self.applied = 0
+        self.coalesced = 0
+        self.outgoing_dropped = 0
+
+    def start(self, host, port, unity_socket=None, timeout=10.0):
+        """Run the event loop in a background thread. The Unity socket, if given, is taken over by the loop.
+
+        Raises the error that prevented the loop from serving (e.g. the port is in use), or TimeoutError if it
+        is not serving after timeout seconds.
+        """
+        threading.Thread(target=self.run, args=(host, port, unity_socket), daemon=True).start()
+        if not self.ready.wait(timeout):
+            raise TimeoutError(f"control plane not listening on {host}:{port} after {timeout} s")
+        if self.startup_error is not None:
+            raise self.startup_error
+        return self
+
+    def run(self, host, port, unity_socket):
+        """Run the event loop until it stops, keeping the error that stopped it before it was serving."""
+        try:
+            asyncio.run(self.main(host, port, unity_socket))
+        except Exception as e:
+            if self.ready.is_set():
+                print(f"(CONTROL-PLANE) Event loop stopped: {e}")
+            else:
+                self.startup_error = e
+        finally:
+            self.ready.set()
+
+    def send_to_unity(self, message):
+        """Queue a message for Unity from any thread. The oldest message is dropped when the queue is full."""
+        self.loop.call_soon_threadsafe(self.enqueue_outgoing, message)
+
+    def enqueue_outgoing(self, message):
+        """Queue a message for Unity (event loop thread only)."""
+        if self.outgoing.full():
+            self.outgoing.get_nowait()
+            self.outgoing_dropped += 1
+        self.outgoing.put_nowait(message)
+
+    async def main(self, host, port, unity_socket):
+        """Serve the drone connections and the Unity connection until the process stops."""
+        self.loop = asyncio.get_running_loop()
+        self.commands = asyncio.Queue(maxsize=self.max_pending_commands)
+        self.outgoing = asyncio.Queue(maxsize=self.max_outgoing_messages)
+
+        server = await asyncio.start_server(self.handle_drone_connection, host, port, backlog=512)
+        tasks = [self.apply_commands()]
+        if unity_socket is not None:
+            reader, writer = await asyncio.open_connection(sock=unity_socket)
+            tasks += [self.read_unity(reader), self.write_unity(writer)]
+
+        print(f"(CONTROL-PLANE) Listening for drone commands on {host}:{port}")
+        self.ready.set()
+        async with server:
+            await asyncio.gather(server.serve_forever(), *tasks)
+
+    async def handle_drone_connection(self, reader, writer):
+        """Queue every newline-terminated command and binary position entry of one container connection."""
+        self.connections += 1
+        try:
+            while True:
+                first = await reader.read(1)
+                if not first:
+                    break
+
+                # Binary position messages start with the magic, text commands with "set."
+                if first == WIRE_MAGIC[:1]:
+                    header = first + await reader.readexactly(WIRE_HEADER.size - 1)
+                    data = header + await reader.readexactly(message_size(header) - WIRE_HEADER.size)
+                    if self.position_handler is None:
+                        raise ValueError("binary position messages are not handled by this control plane")
+                    for entry in decode_positions(data):
+                        self.received += 1
+                        await self.commands.put(entry)
+                    continue
+
+                command = (first + await reader.readline()).decode("utf-8", "replace").strip()
+                if command:
+                    self.received += 1
+                    await self.commands.put(command)  # Waits while the queue is full (backpressure)
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError) as e:
+            print(f"(CONTROL-PLANE) Drone connection closed: {e}")
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def apply_commands(self):
+        """Take every queued command, coalesce them and apply the batch on the applier thread."""
+        while True:
+            batch = [await self.commands.get()]
+            while not self.commands.empty():
+                batch.append(self.commands.get_nowait())
+
+            commands = coalesce_commands(batch)
+            self.coalesced += len(batch) - len(commands)
+            await self.loop.run_in_executor(self.applier, self.apply_batch, commands)
+            self.applied += len(commands)
+
+    def apply_batch(self, commands):
+        """Apply a batch of commands to the Mininet nodes (applier thread only). A failing command is logged
+        and skipped, so it never stops the event loop."""
+        for command in commands:
+            try:
+                if isinstance(command, tuple):
+                    self.position_handler(*command)
+                else:
+                    self.handler(command)
+            except Exception as e:
+                print(f"(CONTROL-PLANE) Error applying {command!r}: {e}")
+
+    async def read_unity(self, reader):
+        """Watch the Unity connection. Unity sends nothing after the initial message."""
+        while await reader.read(64 * 1024):
+            pass
+        print("(CONTROL-PLANE) Unity closed the connection")
+
+    async def write_unity(self, writer):
+        """Send the queued messages to Unity, one JSON document per line."""
+        while True:
+            message = await self.outgoing.get()
+            writer.write((json.dumps(message) + "\n").encode("utf-8"))
+            await writer.drain()  # Waits while Unity does not keep up (backpressure)
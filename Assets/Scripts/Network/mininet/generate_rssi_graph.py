@@ -1,36 +1,174 @@
 # Libraries
 import os
-import csv
+import argparse
+import itertools
+from collections import namedtuple
+import numpy as np
 import matplotlib.pyplot as plt
 
 # -----------------------------------------------------------------------------------------------------
 
-def read_rssi_files(directory):
+# RSSI samples of one drone. time is in seconds since the first sample (the Unix time when not relative), or None
+# for files without timestamps
+RssiSeries = namedtuple("RssiSeries", ["time", "rssi"])
+
+# -----------------------------------------------------------------------------------------------------
+
+def parse_rssi_block(lines, time_column):
+    """Parse a block of CSV lines into RSSI and timestamp arrays, skipping malformed rows."""
+    rows = [line.split(',') for line in lines if line.strip()]
+    columns = 2 if time_column is None else max(2, time_column + 1)
+    try:
+        rssi = np.array([row[1] for row in rows], dtype=np.float32)
+        time = None if time_column is None else np.array([row[time_column] for row in rows], dtype=np.float64)
+        return rssi, time
+    except (IndexError, ValueError):
+        pass
+
+    # Row by row, only for the blocks with a malformed row (e.g. a line still being written)
+    parsed = []
+    for row in rows:
+        try:
+            if len(row) >= columns:
+                parsed.append((float(row[1]), float(row[time_column]) if time_column is not None else 0.0))
+        except ValueError:
+            continue
+    parsed = np.array(parsed, dtype=np.float64).reshape(-1, 2)
+    return parsed[:, 0].astype(np.float32), None if time_column is None else parsed[:, 1]
+
+# -----------------------------------------------------------------------------------------------------
+
+def read_rssi_file(file_path, block_size=65536, relative=True):
+    """Read one RSSI CSV block by block into NumPy arrays, using its Timestamp column when present.
+
+    With relative=False the timestamps are kept as written instead of starting at 0.
+    """
+    rssi_blocks = []
+    time_blocks = []
+    with open(file_path, newline='') as csvfile:
+        header = [column.strip() for column in csvfile.readline().split(',')]
+        time_column = header.index('Timestamp') if 'Timestamp' in header else None
+        while True:
+            lines = list(itertools.islice(csvfile, block_size))
+            if not lines:
+                break
+            rssi, time = parse_rssi_block(lines, time_column)
+            rssi_blocks.append(rssi)
+            if time is not None:
+                time_blocks.append(time)
+
+    rssi = np.concatenate(rssi_blocks) if rssi_blocks else np.zeros(0, dtype=np.float32)
+    if time_column is None:
+        return RssiSeries(None, rssi)
+    time = np.concatenate(time_blocks) if time_blocks else np.zeros(0)
+    return RssiSeries(time - time[0] if relative and len(time) else time, rssi)
+
+# -----------------------------------------------------------------------------------------------------
+
+def read_rssi_files(directory, relative=True):
     """Reads all CSV files in the directory that start with 'DRO' and ends with '.csv'."""
     rssi_data = {}
-    for filename in os.listdir(directory):
+    for filename in sorted(os.listdir(directory)):
         if filename.startswith('DRO') and filename.endswith('.csv'):
             file_path = os.path.join(directory, filename)
-            with open(file_path, newline='') as csvfile:
-                reader = csv.reader(csvfile)
-                next(reader)  # Skip the header
-                rssi_values = [int(row[1]) for row in reader if row]
-                rssi_data[filename.split('.')[0]] = rssi_values  # Use the filename (without .csv) as the key
+            rssi_data[filename.split('.')[0]] = read_rssi_file(file_path, relative=relative)  # Use the filename (without .csv) as the key
     return rssi_data
 
 # -----------------------------------------------------------------------------------------------------
 
-def plot_rssi_data(rssi_data, output_image_path):
+def series_x(series):
+    """Return the x values of a series: its timestamps, or the sample indices of files without them."""
+    return series.time if series.time is not None else np.arange(len(series.rssi), dtype=np.float64)
+
+# -----------------------------------------------------------------------------------------------------
+
+def downsample_minmax(x, y, max_points):
+    """Keep the minimum and the maximum of each bucket of samples, so dips stay visible with few points."""
+    count = len(y)
+    if max_points <= 0 or count <= max_points:
+        return x, y
+
+    # Split the samples into equal buckets, padding the last one with NaN
+    buckets = max(1, max_points // 2)
+    size = -(-count // buckets)
+    buckets = -(-count // size)
+    padded = np.full(buckets * size, np.nan)
+    padded[:count] = y
+    padded = padded.reshape(buckets, size)
+
+    offsets = np.arange(buckets) * size
+    indices = np.unique(np.concatenate([offsets + np.nanargmin(padded, axis=1), offsets + np.nanargmax(padded, axis=1)]))
+    return x[indices], y[indices]
+
+# -----------------------------------------------------------------------------------------------------
+
+def rolling_statistics(y, window, step=1, block_size=65536):
+    """Mean, 5th and 95th percentile of the windows of samples ending every step samples.
+
+    Returns the index of the last sample of each window with the statistics. A step above 1 evaluates
+    only the windows that can be plotted, which keeps the percentiles cheap on long flights.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    if len(y) < window:
+        empty = np.zeros(0)
+        return {'index': np.zeros(0, dtype=np.intp), 'mean': empty, 'p5': empty, 'p95': empty}
+
+    # The mean comes from a cumulative sum, the percentiles from sliding views processed by blocks of windows
+    cumulative = np.concatenate([[0.0], np.cumsum(y)])
+    mean = ((cumulative[window:] - cumulative[:-window]) / window)[::step]
+    views = np.lib.stride_tricks.sliding_window_view(y, window)[::step]
+    percentiles = np.concatenate([np.percentile(views[start:start + block_size], [5, 95], axis=1)
+                                  for start in range(0, len(views), block_size)], axis=1)
+    index = np.arange(window - 1, len(y), step)
+    return {'index': index, 'mean': mean, 'p5': percentiles[0], 'p95': percentiles[1]}
+
+# -----------------------------------------------------------------------------------------------------
+
+def rssi_statistics(rssi_data, threshold=-80.0):
+    """Mean, 5th and 95th percentile RSSI and time spent below threshold for every drone."""
+    statistics = {}
+    for drone_name, series in rssi_data.items():
+        if not len(series.rssi):
+            continue
+        x = series_x(series)
+
+        # Each sample lasts until the next one. The last one lasts the median interval
+        durations = np.diff(x, append=x[-1] + (np.median(np.diff(x)) if len(x) > 1 else 1.0))
+        below = series.rssi < threshold
+        p5, p95 = np.percentile(series.rssi, [5, 95])
+        statistics[drone_name] = {
+            'samples': len(series.rssi),
+            'mean': float(series.rssi.mean()),
+            'p5': float(p5),
+            'p95': float(p95),
+            'below': float(durations[below].sum()),
+            'below_fraction': float(below.mean()),
+        }
+    return statistics
+
+# -----------------------------------------------------------------------------------------------------
+
+def plot_rssi_data(rssi_data, output_image_path, max_points=2000, window=0):
     """Plot RSSI data for all drones and save the image."""
     plt.figure(figsize=(10, 6))  # Set the figure size
 
-    # Plot a line for each drone
-    for drone_name, rssi_values in rssi_data.items():
-        plt.plot(range(len(rssi_values)), rssi_values, label=drone_name)
+    # Plot a line for each drone, with at most max_points points
+    for drone_name, series in rssi_data.items():
+        x = series_x(series)
+        line, = plt.plot(*downsample_minmax(x, series.rssi, max_points), label=drone_name)
+
+        # Rolling mean and 5th-95th percentile band
+        if window > 1 and len(series.rssi) >= window:
+            step = max(1, len(series.rssi) // max_points) if max_points > 0 else 1
+            rolling = rolling_statistics(series.rssi, window, step=step)
+            rolling_x = x[rolling['index']]
+            plt.plot(rolling_x, rolling['mean'], color=line.get_color(), linewidth=2)
+            plt.fill_between(rolling_x, rolling['p5'], rolling['p95'], color=line.get_color(), alpha=0.2)
 
     # Customize plot
+    timed = all(series.time is not None for series in rssi_data.values())
     plt.title('RSSI Data for Drones')
-    plt.xlabel('Time (s)')
+    plt.xlabel('Time (s)' if timed else 'Sample')
     plt.ylabel('RSSI (dBm)')
     plt.legend()
     plt.grid(True)
@@ -44,14 +182,28 @@ def plot_rssi_data(rssi_data, output_image_path):
 # -----------------------------------------------------------------------------------------------------
 
 def main():
-    input_directory = './'  # Set the directory containing the CSV files
-    output_image_path = 'merged_rssi_plot.png'  # Output image path
+    parser = argparse.ArgumentParser(description="Plot the RSSI logged by the drone sniffers.")
+    parser.add_argument("--input-directory", default="./", help="Directory containing the DRO*.csv files")
+    parser.add_argument("--output", default="merged_rssi_plot.png", help="Output image path")
+    parser.add_argument("--max-points", type=int, default=2000, help="Points plotted per drone (0 plots every sample)")
+    parser.add_argument("--window", type=int, default=0, help="Samples of the rolling mean and p5-p95 band (0 disables)")
+    parser.add_argument("--stats", action="store_true", help="Print mean, p5, p95 and time below --threshold per drone")
+    parser.add_argument("--threshold", type=float, default=-80.0, help="RSSI threshold (dBm) of --stats")
+    args = parser.parse_args()
 
     # Step 1: Read all RSSI CSV files in the directory
-    rssi_data = read_rssi_files(input_directory)
+    rssi_data = read_rssi_files(args.input_directory)
 
     # Step 2: Plot the RSSI data and save as an image
-    plot_rssi_data(rssi_data, output_image_path)
+    plot_rssi_data(rssi_data, args.output, max_points=args.max_points, window=args.window)
+
+    # Step 3: Summarize the RSSI of each drone
+    if args.stats:
+        unit = 's' if all(series.time is not None for series in rssi_data.values()) else 'samples'
+        for drone_name, stats in rssi_statistics(rssi_data, args.threshold).items():
+            print(f"{drone_name}: {stats['samples']} samples | mean {stats['mean']:.1f} dBm | p5 {stats['p5']:.1f} | "
+                  f"p95 {stats['p95']:.1f} | below {args.threshold:g} dBm {stats['below']:.1f} {unit} "
+                  f"({stats['below_fraction']:.1%})")
 
 # -----------------------------------------------------------------------------------------------------
 
@@ -0,0 +1,147 @@
+# Libraries
+import json
+import struct
+
+# -----------------------------------------------------------------------------------------------------
+
+# Frame header: 4-byte big-endian payload length
+FRAME_HEADER = struct.Struct("!I")
+
+# Largest message accepted from Unity
+MAX_MESSAGE_SIZE = 64 * 1024 * 1024
+
+# -----------------------------------------------------------------------------------------------------
+
+# Class to convert Unity coordinates to Mininet-WiFi coordinates
+def ConvertUnityPositionToMininetWIFI(unity_position):
+    """Convert Unity coordinates (x, y, z) to Mininet-WiFi coordinates (x, z, y)."""
+    x, y, z = unity_position
+    return (x, z, y)
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to encode a message as a length-prefixed JSON frame
+def encode_message(message):
+    """Encode a dictionary as a 4-byte big-endian length followed by its compact JSON."""
+    payload = json.dumps(message, separators=(",", ":")).encode("utf-8")
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+# -----------------------------------------------------------------------------------------------------
+
+# Class to read JSON messages of any size from a stream socket
+class JsonMessageReader:
+    """Incremental reader of the JSON messages sent by Unity.
+
+    Length-prefixed frames are read with exactly one pass over their bytes. Unframed JSON, as sent by
+    older Unity builds, is accumulated across partial reads and decoded once the buffer looks complete.
+    """
+
+    def __init__(self, sock, chunk_size=64 * 1024):
+        self.sock = sock
+        self.chunk_size = chunk_size
+        self.buffer = bytearray()
+        self.decoder = json.JSONDecoder()
+
+    def fill(self):
+        """Append the next chunk of the socket to the buffer. Returns False at end of stream."""
+        chunk = self.sock.recv(self.chunk_size)
+        if not chunk:
+            return False
+        self.buffer += chunk
+        return True
+
+    def read_message(self):
+        """Return the next message as a dictionary, or None if the connection closes first."""
+
+        # The first byte tells the framing: "{" (or whitespace) for raw JSON, a length prefix otherwise
+        while not self.buffer.lstrip():
+            self.buffer.clear()
+            if not self.fill():
+                return None
+
+        if self.buffer.lstrip()[:1] == b"{":
+            return self.read_unframed()
+        return self.read_framed()
+
+    def read_framed(self):
+        """Read one length-prefixed frame."""
+        while len(self.buffer) < FRAME_HEADER.size:
+            if not self.fill():
+                return None
+
+        (length,) = FRAME_HEADER.unpack_from(self.buffer)
+        if length > MAX_MESSAGE_SIZE:
+            raise ValueError(f"Message of {length} bytes exceeds the {MAX_MESSAGE_SIZE} bytes limit")
+
+        # Receive the rest of the frame directly into a preallocated buffer
+        end = FRAME_HEADER.size + length
+        payload = bytearray(length)
+        received = min(len(self.buffer) - FRAME_HEADER.size, length)
+        payload[:received] = self.buffer[FRAME_HEADER.size:FRAME_HEADER.size + received]
+        del self.buffer[:min(end, len(self.buffer))]
+
+        view = memoryview(payload)
+        while received < length:
+            count = self.sock.recv_into(view[received:], length - received)
+            if count == 0:
+                return None
+            received += count
+
+        return json.loads(payload.decode("utf-8"))
+
+    def read_unframed(self):
+        """Read one raw JSON document, possibly split over many segments."""
+        while True:
+
+            # Only try to decode when the buffer ends like a complete document
+            if self.buffer.rstrip().endswith(b"}"):
+                text = self.buffer.decode("utf-8")
+                start = len(text) - len(text.lstrip())
+                try:
+                    message, end = self.decoder.raw_decode(text, start)
+                    del self.buffer[:len(text[:end].encode("utf-8"))]
+                    return message
+                except json.JSONDecodeError:
+                    pass
+
+            if len(self.buffer) > MAX_MESSAGE_SIZE:
+                raise ValueError(f"Message exceeds the {MAX_MESSAGE_SIZE} bytes limit")
+
+            if not self.fill():
+                if self.buffer.strip():
+                    json.loads(self.buffer.decode("utf-8"))  # Raises the decoding error of the truncated message
+                return None
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to extract the base station and drone positions of the initial message
+def parse_initial_positions(json_data):
+    """Convert the initial Unity message into the positions used to build the topology."""
+    positions = {}
+
+    # Extract the base station position
+    if "baseStation" in json_data:
+        base_station = json_data["baseStation"]
+        base_station_position = base_station["position"]
+        positions["ap_position"] = ConvertUnityPositionToMininetWIFI(
+            (
+                base_station_position["x"],
+                base_station_position["y"],
+                base_station_position["z"],
+            )
+        )
+        positions["ap_id"] = base_station["id"]
+
+    # Extract the drone positions
+    if "drones" in json_data:
+        positions["drone_positions"] = [
+            {
+                "id": drone["id"],
+                "position": ConvertUnityPositionToMininetWIFI(
+                    (drone["position"]["x"], drone["position"]["y"], drone["position"]["z"])
+                ),
+            }
+            for drone in json_data["drones"]
+        ]
+
+    return positions
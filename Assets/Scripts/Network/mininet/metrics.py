@@ -0,0 +1,226 @@
+# Libraries
+import os
+import math
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# -----------------------------------------------------------------------------------------------------
+
+# Per-drone metrics: name -> (Prometheus type, help)
+DRONE_METRICS = {
+    "unetyemu_position_updates_total": ("counter", "Position updates applied to the station"),
+    "unetyemu_last_update_timestamp_seconds": ("gauge", "Unix time of the last position update applied to the station"),
+    "unetyemu_ap_distance_meters": ("gauge", "Distance between the station and the AP at its last position update"),
+    "unetyemu_rssi_dbm": ("gauge", "Last RSSI sampled by the sniffer of the drone"),
+    "unetyemu_sniffer_queue_depth": ("gauge", "Commands waiting in the channel from the sniffer to the topology"),
+    "unetyemu_sniffer_channel_dropped_total": ("counter", "Commands dropped by the full channel of the sniffer"),
+    "unetyemu_sniffer_packets_total": ("counter", "Packets captured by the sniffer"),
+    "unetyemu_sniffer_parsed_total": ("counter", "Packets decoded by the sniffer"),
+    "unetyemu_sniffer_dropped_total": ("counter", "Packets the sniffer could not decode"),
+    "unetyemu_sniffer_kernel_dropped_total": ("counter", "Packets dropped by the kernel before the sniffer read them"),
+    "unetyemu_sniffer_packet_rate": ("gauge", "Packets per second captured by the sniffer over its last report interval"),
+}
+
+# Fields of a sniffer report (position_channel.metrics_command) added to the counters of the drone
+REPORT_COUNTERS = {
+    "seen": "unetyemu_sniffer_packets_total",
+    "parsed": "unetyemu_sniffer_parsed_total",
+    "dropped": "unetyemu_sniffer_dropped_total",
+    "kernel_dropped": "unetyemu_sniffer_kernel_dropped_total",
+}
+
+# Fields of a sniffer report that replace the value of the drone
+REPORT_VALUES = {
+    "rssi": "unetyemu_rssi_dbm",
+    "queue": "unetyemu_sniffer_queue_depth",
+    "channel_dropped": "unetyemu_sniffer_channel_dropped_total",
+}
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to parse the arguments of a sniffer report
+def parse_metrics_report(args):
+    """Return the {name: value} of a "name=value,..." report, skipping the malformed fields."""
+    values = {}
+    for field in args.split(","):
+        name, _, value = field.partition("=")
+        try:
+            values[name.strip()] = float(value)
+        except ValueError:
+            continue
+    return values
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to format a sample value
+def format_value(value):
+    """Format a value as the exposition format expects: integers as is, NaN and infinities by name."""
+    if isinstance(value, int):
+        return str(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to escape a label value
+def escape_label(value):
+    """Escape the backslashes, quotes and newlines of a label value."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+# -----------------------------------------------------------------------------------------------------
+
+# Class to keep the metrics of the drones in process
+class MetricsRegistry:
+    """Per-drone counters and gauges, updated in constant time per event and rendered on demand.
+
+    Every update is a dictionary update under one lock, whatever the number of drones. The text is only
+    built when it is scraped or written, from a copy taken under the lock. Global gauges are read from
+    callbacks at that time, so they cost nothing per event.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {name: {} for name in DRONE_METRICS}
+        self.callbacks = {}  # name -> (type, help, function)
+
+    def register_callback(self, name, metric_type, help_text, function):
+        """Export the value returned by function (called at every render) as a global metric."""
+        self.callbacks[name] = (metric_type, help_text, function)
+
+    def observe_position(self, drone_id, distance=None):
+        """Count a position update applied to a station, with its new AP distance when known."""
+        now = time.time()
+        with self.lock:
+            updates = self.values["unetyemu_position_updates_total"]
+            updates[drone_id] = updates.get(drone_id, 0) + 1
+            self.values["unetyemu_last_update_timestamp_seconds"][drone_id] = now
+            if distance is not None:
+                self.values["unetyemu_ap_distance_meters"][drone_id] = float(distance)
+
+    def observe_report(self, drone_id, args):
+        """Apply the "name=value,..." report of a sniffer: interval counts, RSSI and channel state."""
+        report = parse_metrics_report(args)
+        with self.lock:
+            for field, name in REPORT_COUNTERS.items():
+                if field in report:
+                    values = self.values[name]
+                    values[drone_id] = values.get(drone_id, 0) + int(report[field])
+            for field, name in REPORT_VALUES.items():
+                if field in report:
+                    value = report[field]
+                    self.values[name][drone_id] = int(value) if value.is_integer() else value
+            if report.get("interval", 0) > 0 and "seen" in report:
+                self.values["unetyemu_sniffer_packet_rate"][drone_id] = report["seen"] / report["interval"]
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        with self.lock:
+            snapshot = {name: dict(values) for name, values in self.values.items()}
+
+        lines = []
+        for name, (metric_type, help_text, function) in sorted(self.callbacks.items()):
+            try:
+                value = function()
+            except Exception:
+                continue
+            if value is None:
+                continue
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}", f"{name} {format_value(value)}"]
+        for name, (metric_type, help_text) in DRONE_METRICS.items():
+            values = snapshot[name]
+            if not values:
+                continue
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+            lines += [f'{name}{{drone="{escape_label(drone_id)}"}} {format_value(value)}'
+                      for drone_id, value in sorted(values.items())]
+        return "\n".join(lines) + "\n"
+
+# -----------------------------------------------------------------------------------------------------
+
+# Class to serve the metrics to Prometheus over HTTP
+class MetricsServer:
+    """HTTP endpoint returning the rendered registry on GET /metrics."""
+
+    def __init__(self, registry, host="127.0.0.1", port=9100):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.server = None
+
+    def start(self):
+        """Serve in a background thread."""
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # One line per scrape would flood the Mininet console
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        """Stop serving."""
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+# -----------------------------------------------------------------------------------------------------
+
+# Class to rewrite a metrics file periodically
+class MetricsFileWriter:
+    """Write the rendered registry to a file every interval seconds, e.g. for the node_exporter textfile collector.
+
+    The file is replaced atomically, so readers never see it half written.
+    """
+
+    def __init__(self, registry, path, interval=5.0):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self.stop_event = threading.Event()
+
+    def start(self):
+        """Write in a background thread."""
+        threading.Thread(target=self.run, daemon=True).start()
+        return self
+
+    def stop(self):
+        """Write the file one last time and stop."""
+        self.stop_event.set()
+        self.write()
+
+    def write(self):
+        """Render the registry and replace the file."""
+        temporary_file = f"{self.path}.{os.getpid()}.tmp"
+        with open(temporary_file, "w") as file:
+            file.write(self.registry.render())
+        os.replace(temporary_file, self.path)
+
+    def run(self):
+        """Rewrite the file until stopped."""
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.write()
+            except OSError as e:
+                print(f"Could not write the metrics file {self.path}: {e}")
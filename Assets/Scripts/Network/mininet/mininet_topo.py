@@ -15,31 +15,17 @@ from mn_wifi.wmediumdConnector import interference
 from mn_wifi.telemetry import telemetry
 from containernet.cli import CLI
 import subprocess
-import math
-
-# -----------------------------------------------------------------------------------------------------
-
-# Class to convert Unity coordinates to Mininet-WiFi coordinates
-def ConvertUnityPositionToMininetWIFI(unity_position):
-    """Convert Unity coordinates (x, y, z) to Mininet-WiFi coordinates (x, z, y)."""
-    x, y, z = unity_position
-    return (x, z, y)
-
-# -----------------------------------------------------------------------------------------------------
-
-# Calculate the maximum distance between the ap and the drones to set the coverage radius dinamically
-def calculate_max_distance(ap_position, drone_positions):
-    """Calculate the maximum distance from AP to any drone."""
-    max_distance = 0
-    for drone in drone_positions:
-        drone_pos = drone["position"]
-        distance = math.sqrt(
-            (ap_position[0] - drone_pos[0]) ** 2 +
-            (ap_position[1] - drone_pos[1]) ** 2 + 
-            (ap_position[2] - drone_pos[2]) ** 2
-        )
-        max_distance = max(max_distance, distance)
-    return max_distance
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from position_server import PositionCommandServer, apply_command, parse_command
+from position_channel import METRICS_METHOD
+from control_plane import ControlPlane
+from trace_log import open_trace_log, split_command_trace
+from position_recording import save_handshake
+from handshake_protocol import JsonMessageReader, parse_initial_positions
+from radio_planning import CoverageReplanner, DronePositionTable, plan_coverage
+from metrics import MetricsFileWriter, MetricsRegistry, MetricsServer
 
 # -----------------------------------------------------------------------------------------------------
 
@@ -49,7 +35,7 @@ def send_coverage_range(radius, client_socket):
     try:
         range_message = json.dumps({"coverageRadius": radius})
         print(f"Message to be sent to Unity: {range_message}")
-        client_socket.sendall(range_message.encode("utf-8"))
+        client_socket.sendall((range_message + "\n").encode("utf-8"))  # One message per line, as updates follow
         info(f"Coverage radius {radius} sent to Unity\n")
     except Exception as e:
         info(f"Error sending coverage range: {e}\n")
@@ -57,14 +43,15 @@ def send_coverage_range(radius, client_socket):
 # -----------------------------------------------------------------------------------------------------
 
 # Process the initial positions received from Unity
-def process_positions_once(host, port):
-    """Receive initial positions from Unity."""
+def process_positions_once(host, port, record_directory=None):
+    """Receive initial positions from Unity. With record_directory, the message is saved for replay."""
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     server_socket.bind((host, port))
     server_socket.listen(5)
     info(f"Listening for position updates from Unity on {host}:{port}\n")
 
     positions = {}
+    client_socket = None
     
     try:
         
@@ -72,47 +59,22 @@ def process_positions_once(host, port):
         client_socket, addr = server_socket.accept()
         info(f"Connection from {addr}\n")
 
-        data = client_socket.recv(4096)
-        info(f"Data length received from Unity: {len(data)}\n")
-        
-        print("(... _once) data", data.decode())
-
-        json_data = json.loads(data.decode())
-
-        # Extract the base station position
-        if "baseStation" in json_data:
-            base_station = json_data["baseStation"]
-            base_station_id = base_station["id"]
-            base_station_position = base_station["position"]
-            positions["ap_position"] = ConvertUnityPositionToMininetWIFI(
-                (
-                    base_station_position["x"],
-                    base_station_position["y"],
-                    base_station_position["z"],
-                )
-            )
-            positions["ap_id"] = base_station_id
-            info(f"(... _once) BaseStation ID: {base_station_id}, Position: {positions['ap_position']}\n")
-
-        # Extract the drone positions
-        if "drones" in json_data:
-            positions["drone_positions"] = []
-            for drone in json_data["drones"]:
-                drone_id = drone["id"]
-                drone_position = drone["position"]
-                positions["drone_positions"].append(
-                    {
-                        "id": drone_id,
-                        "position": ConvertUnityPositionToMininetWIFI(
-                            (
-                                drone_position["x"],
-                                drone_position["y"],
-                                drone_position["z"],
-                            )
-                        ),
-                    }
-                )
-            info(f"(... _once) Drone positions parsed: {positions['drone_positions']}\n")
+        # Read the whole message, whatever its size and however it is split into segments
+        start = time.perf_counter()
+        json_data = JsonMessageReader(client_socket).read_message()
+        if json_data is None:
+            raise ConnectionError("Unity closed the connection before sending the initial positions")
+
+        # Extract the base station and drone positions
+        positions = parse_initial_positions(json_data)
+        if record_directory is not None:
+            save_handshake(record_directory, json_data)
+        info(f"(... _once) Message parsed in {(time.perf_counter() - start) * 1000:.1f} ms\n")
+
+        if "ap_position" in positions:
+            info(f"(... _once) BaseStation ID: {positions['ap_id']}, Position: {positions['ap_position']}\n")
+        if "drone_positions" in positions:
+            info(f"(... _once) {len(positions['drone_positions'])} drone positions parsed\n")
 
         info("(... _once) Positions received and converted\n")
 
@@ -120,6 +82,8 @@ def process_positions_once(host, port):
         info(f"Error decoding JSON data: {json_error}\n")
     except Exception as e:
         info(f"Error receiving position: {e}\n")
+    finally:
+        server_socket.close()
 
     return client_socket, positions
 
@@ -143,8 +107,121 @@ def get_bridge_ip():
 
 # -----------------------------------------------------------------------------------------------------
 
+# Docker image used by the drone stations
+DRONE_IMAGE = "ramonfontes/socket_position:python35"
+
+# Directory of the trace logs, relative to this directory (mounted on /root in the drones)
+TRACE_DIRECTORY = "traces"
+
+# Directory of the position recordings, relative to this directory (one subdirectory per run)
+RECORDING_DIRECTORY = "recordings"
+
+# -----------------------------------------------------------------------------------------------------
+
+# Measure the duration of a startup phase
+@contextmanager
+def timed_phase(name, timings):
+    """Store the duration of the enclosed phase in timings and log it."""
+    start = time.perf_counter()
+    yield
+    timings[name] = time.perf_counter() - start
+    info(f"*** Phase '{name}' took {timings[name]:.2f} s\n")
+
+# -----------------------------------------------------------------------------------------------------
+
+# Make sure the drone image is available before creating the stations
+def ensure_docker_image(image):
+    """Pull the image once if it is not present, instead of letting the first station pull it."""
+    inspect = subprocess.run(["docker", "image", "inspect", image], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if inspect.returncode != 0:
+        info(f"*** Pulling Docker image {image}\n")
+        subprocess.run(["docker", "pull", image], check=True)
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to compute the MAC address of a drone
+def drone_mac(i):
+    """Return the MAC of the i-th drone: 00:02:00:00:00:<i + 10> as before for the first 90 drones, whose last
+    octet reads as the decimal i + 10, and 00:02:00:01:<i as two hex octets> beyond, which cannot collide with them."""
+    if i < 90:
+        return f"00:02:00:00:00:{i + 10:02}"
+    return f"00:02:00:01:{i >> 8 & 0xff:02x}:{i & 0xff:02x}"
+
+# -----------------------------------------------------------------------------------------------------
+
+# Create the Docker-backed drone stations, starting their containers through a bounded thread pool
+def add_drone_stations(net, drone_positions, path, workers):
+    """Start the container of every drone concurrently, then add the stations to the network one at a time.
+
+    Containernet is not thread-safe: addStation updates net.stations, nameToNode and the interface and position
+    bookkeeping. Only the DockerSta constructor, which creates and starts the container, runs in the thread pool.
+    addStation is then called in drone order on this thread, and receives the started node from a factory.
+    Returns the stations in drone order.
+    """
+    drone_last_ip_octect_fixed = 101 # last octect is fixed. For instance, "10.0.0." + 101 = "10.0.0.101" | "10.0.0." + 101 + 1 = "10.0.0.102"
+
+    drones = []
+    for i, drone_data in enumerate(drone_positions):
+        drone_name = f"{drone_data['id']}"
+        pos = drone_data["position"]
+        drones.append((drone_name, pos, dict(position=",".join(map(str,pos)), ip=f"10.0.0.{drone_last_ip_octect_fixed + i}",
+                                             volumes=[f"{path}:/root"], dimage=DRONE_IMAGE, cpu_shares=20, mac=drone_mac(i))))
+
+    # Slow part: create and start the Docker containers concurrently
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {drone_name: pool.submit(DockerSta, drone_name, **params) for drone_name, _, params in drones}
+    started = {}
+    failures = []
+    for drone_name, future in futures.items():
+        try:
+            started[drone_name] = future.result()
+        except Exception as e:
+            failures.append(f"{drone_name}: {e}")
+    if failures:
+        for node in started.values():
+            node.terminate()
+        raise RuntimeError(f"Could not start the drone containers ({'; '.join(failures)})")
+
+    def started_station(name, **defaults):
+        station = started[name]
+        station.params.update(defaults)  # Keep the defaults addStation added (channel, mode, ...)
+        return station
+
+    # Registration in the network, one station at a time and in drone order
+    stations = []
+    for drone_name, pos, params in drones:
+        stations.append(net.addStation(drone_name, cls=started_station, **params))
+        info(f"Created drone {drone_name} at position {pos} with IP {params['ip']}\n")
+    return stations
+
+# -----------------------------------------------------------------------------------------------------
+
+# Launch the sniffer of every drone concurrently
+def launch_sniffers(stations, host_ip, headless, workers, trace=False, recording=None, metrics_interval=None):
+    """Start sniffer_container.py in every drone, in an xterm or as a background process logging to a file.
+    With metrics_interval, the sniffers report their metrics to the topology every metrics_interval seconds."""
+    command = f"python3.5 /root/sniffer_container.py {host_ip} --fast"
+    if metrics_interval:
+        command += f" --metrics --stats-interval {metrics_interval}"
+    if trace:
+        command += f" --trace /root/{TRACE_DIRECTORY}"  # The mininet directory is mounted on /root
+    if recording:
+        command += f" --record /root/{RECORDING_DIRECTORY}/{recording}"
+
+    def launch(drone):
+        if headless:
+            drone.cmd(f"nohup {command} > /root/{drone.name}_sniffer.log 2>&1 &")
+        else:
+            makeTerm(drone, title=f'dr+{drone} sniffer', cmd=f"bash -c '{command};'")
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(launch, stations))
+
+# -----------------------------------------------------------------------------------------------------
+
 # Main function to create the topology
-def minimal_topology():
+def minimal_topology(headless=False, workers=8, replan_threshold=10.0, replan_interval=1.0, async_control_plane=False,
+                     trace=False, record=False, plot_telemetry=True, metrics_port=None, metrics_file=None, metrics_interval=5.0):
     
     # Get the path of the current file
     os.system('iptables -A FORWARD -d 172.17.0.0/16 -j ACCEPT')
@@ -154,12 +231,18 @@ def minimal_topology():
     host_ip = get_bridge_ip()
     print(f"Bridge IP: {host_ip}")
 
+    # Pull the drone image once, before Unity connects
+    ensure_docker_image(DRONE_IMAGE)
+    timings = {}
+
     # Create mininet object that supports containernet
     net = Containernet(link=wmediumd, wmediumd_mode=interference,
                        noise_th=-91, fading_cof=3)
 
     info("* Receiving initial positions for AP and drones\n")
-    client_socket, positions = process_positions_once(host="0.0.0.0", port=12345)
+    recording = time.strftime("%Y%m%d-%H%M%S") if record else None
+    record_directory = os.path.join(path, RECORDING_DIRECTORY, recording) if record else None
+    client_socket, positions = process_positions_once(host="0.0.0.0", port=12345, record_directory=record_directory)
     ap_position = positions.get("ap_position")
     ap_id = positions.get("ap_id")
     drone_positions = positions.get("drone_positions", [])
@@ -177,55 +260,123 @@ def minimal_topology():
         position=ap_position
     )
 
-    drone_last_ip_octect_fixed = 101 # last octect is fixed. For instance, "10.0.0." + 101 = "10.0.0.101" | "10.0.0." + 101 + 1 = "10.0.0.102"
-    
     # Create the drones with the received positions
-    for i, drone_data in enumerate(drone_positions):
-        drone_id = drone_data["id"]
-        pos = drone_data["position"]
-        info(f"Initial position for drone {drone_id}: {pos}\n")
-        drone_name = f"{drone_id}"
-
-        net.addStation(drone_name, position=",".join(map(str,pos)), ip=f"10.0.0.{drone_last_ip_octect_fixed + i}",
-                        cls=DockerSta, volumes=[f"{path}:/root"], dimage="ramonfontes/socket_position:python35",
-                        cpu_shares=20, mac=f"00:02:00:00:00:{int(i)+10:02}")
-
-        print("IP FIX:", drone_last_ip_octect_fixed + i)
-        info(f"Created drone {drone_name} at position {pos}\n")
-
+    with timed_phase("add", timings):
+        stations = add_drone_stations(net, drone_positions, path, workers)
 
     info('*** Configuring WiFi nodes\n')
-    net.configureWifiNodes()
+    with timed_phase("configure", timings):
+        net.configureWifiNodes()
 
     info('*** Starting network\n')
-    net.build()
-    net.addNAT().configDefault()
-    ap1.start([])
-
-    # Compute max distance from AP to drones
-    max_distance = calculate_max_distance(ap_position, drone_positions)
+    with timed_phase("build", timings):
+        net.build()
+        net.addNAT().configDefault()
+        ap1.start([])
+
+    # Compute the coverage of the AP over all drones in one vectorized pass
+    drone_table = DronePositionTable(drone_positions)
+    plan = plan_coverage(ap_position, drone_table.positions)
+    max_distance = float(plan["max_distance"][0])
+    radius = max_distance + 10
     
-    # Set power dynamically based on max distance
-    power_dbm = 10 + (10 * 1.5 * math.log10(max_distance + 10))  # Adjusted power
-    ap1.wintfs[0].txpower = min(power_dbm, 30)  # Cap at 30 dBm (max WiFi power)
+    # Set power dynamically based on max distance (capped at 30 dBm, the max WiFi power)
+    ap1.wintfs[0].txpower = float(plan["tx_power"][0])
 
-    info(f"Updated AP power to {ap1.wintfs[0].txpower} dBm for range {max_distance + 50}m\n")
+    info(f"Updated AP power to {ap1.wintfs[0].txpower} dBm for range {radius}m\n")
+    if len(drone_table):
+        info("Coverage percentiles (m): " + ", ".join(f"p{q} {values[0]:.1f}" for q, values in plan["percentiles"].items()) +
+             f" | max path loss {plan['path_loss'].max():.1f} dB\n")
 
     # Send coverage radius back to Unity
-    send_coverage_range(max_distance + 10, client_socket)
+    send_coverage_range(radius, client_socket)
 
     info("*** Drone names ***\n")
     for drone in drone_positions:
         info(f"Drone {drone['id']} created\n")
 
-    net.socketServer(ip=host_ip, port=12346)
-
-    nodes = net.stations + net.aps
-    net.telemetry(nodes=nodes, data_type="position", min_x=-100, max_x=700, min_y=-100, max_y=700)
+    # Trace log of the apply times of traced position updates
+    trace_log = open_trace_log(os.path.join(path, TRACE_DIRECTORY), "topology") if trace else None
+
+    # Per-drone counters and gauges, only with --metrics-port or --metrics-file
+    metrics = MetricsRegistry() if metrics_port or metrics_file else None
+
+    # Apply every command and feed the position updates to the re-planner. Sniffer metrics reports are not node methods
+    def handle_command(line):
+        command, command_trace = split_command_trace(line)
+        parsed = parse_command(command)
+        if metrics is not None and parsed is not None and parsed[1] == METRICS_METHOD:
+            metrics.observe_report(parsed[0], parsed[2])
+            return
+        apply_command(net, command)
+        distance = replanner.observe(command)
+        if metrics is not None and distance is not None:
+            metrics.observe_position(parsed[0], distance)
+        if command_trace is not None and trace_log is not None:
+            trace_log.record("topology_apply", command_trace[0], command_trace[1], parsed[0] if parsed else "")
+
+    # Apply the binary position entries (wire_format), whose drone index is the handshake order
+    def handle_position(index, position):
+        try:
+            drone_id = drone_table.ids[index]
+            net.getNodeByName(drone_id).setPosition(f"{position[0]},{position[1]},{position[2]}")
+        except Exception as e:
+            info(f"Error applying the position of drone {index}: {e}\n")
+            return
+        distance = replanner.observe_position(drone_id, position)
+        if metrics is not None:
+            metrics.observe_position(drone_id, distance)
+
+    # Command server for the sniffers. Unlike net.socketServer, it keeps one persistent connection per container.
+    # The asyncio control plane serves all containers and Unity on one event loop and applies commands on one thread
+    if async_control_plane:
+        control_plane = ControlPlane(handle_command, position_handler=handle_position)
+        notify_unity = lambda radius: control_plane.send_to_unity({"coverageRadius": radius})
+    else:
+        command_server = PositionCommandServer(host_ip, 12346, handle_command, position_handler=handle_position)
+        notify_unity = lambda radius: send_coverage_range(radius, client_socket)
+
+    # Keep the coverage up to date while the drones move
+    replanner = CoverageReplanner(ap1, ap_position, drone_table, notify_unity, radius,
+                                  threshold=replan_threshold, interval=replan_interval).start()
+
+    if async_control_plane:
+        control_plane.start(host_ip, 12346, unity_socket=client_socket)
+    else:
+        command_server.start()
+
+    # Export the metrics, with the global values read at each scrape or write
+    metrics_writer = None
+    if metrics is not None:
+        metrics.register_callback("unetyemu_drones", "gauge", "Drones in the topology", lambda: len(drone_table))
+        metrics.register_callback("unetyemu_ap_tx_power_dbm", "gauge", "Transmission power of the AP",
+                                  lambda: float(ap1.wintfs[0].txpower))
+        metrics.register_callback("unetyemu_coverage_replans_total", "counter", "Coverage re-plans", lambda: replanner.replans)
+        if async_control_plane:
+            metrics.register_callback("unetyemu_control_plane_queue_depth", "gauge", "Commands waiting to be applied",
+                                      lambda: control_plane.commands.qsize())
+            metrics.register_callback("unetyemu_control_plane_coalesced_total", "counter",
+                                      "Position commands superseded before being applied", lambda: control_plane.coalesced)
+        if metrics_port:
+            MetricsServer(metrics, port=metrics_port).start()
+            info(f"*** Serving metrics on http://127.0.0.1:{metrics_port}/metrics\n")
+        if metrics_file:
+            metrics_writer = MetricsFileWriter(metrics, metrics_file, metrics_interval).start()
+            info(f"*** Writing metrics to {metrics_file} every {metrics_interval} s\n")
+
+    # Live position plot of every node. It redraws all nodes, so it is better disabled for large fleets
+    if plot_telemetry:
+        nodes = net.stations + net.aps
+        net.telemetry(nodes=nodes, data_type="position", min_x=-100, max_x=700, min_y=-100, max_y=700)
 
     # Receiver call
-    for drone in net.stations:
-        makeTerm(drone, title=f'dr+{drone} sniffer', cmd=f"bash -c 'python3.5 /root/sniffer_container.py {host_ip};'")
+    with timed_phase("sniffer launch", timings):
+        launch_sniffers(stations, host_ip, headless, workers, trace, recording,
+                        metrics_interval if metrics is not None else None)
+    if record:
+        info(f"*** Recording the position stream in {record_directory}\n")
+
+    info("*** Startup timings: " + " | ".join(f"{name} {seconds:.2f} s" for name, seconds in timings.items()) + "\n")
 
     info('*** Running CLI\n')
     CLI(net)
@@ -237,10 +388,32 @@ def minimal_topology():
 
     info('*** Stopping network\n')
     net.stop()
+    if trace_log is not None:
+        trace_log.close()
+    if metrics_writer is not None:
+        metrics_writer.stop()
 
 # -----------------------------------------------------------------------------------------------------
 
 # Main function
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create the Mininet-WiFi topology of the Unity drones.")
+    parser.add_argument("--headless", action="store_true", help="Run the sniffers in the background instead of one xterm per drone")
+    parser.add_argument("--workers", type=int, default=8, help="Threads used to start the drone containers and launch the sniffers")
+    parser.add_argument("--replan-threshold", type=float, default=10.0, help="Meters a drone must move before the coverage is re-planned")
+    parser.add_argument("--replan-interval", type=float, default=1.0, help="Minimum seconds between two coverage re-plans")
+    parser.add_argument("--async-control-plane", action="store_true", help="Serve Unity and the sniffers on one asyncio event loop")
+    parser.add_argument("--trace", action="store_true", help=f"Record the hops of traced position updates in {TRACE_DIRECTORY}/")
+    parser.add_argument("--record", action="store_true", help=f"Record the handshake and position stream in {RECORDING_DIRECTORY}/ for replay")
+    parser.add_argument("--no-telemetry", dest="plot_telemetry", action="store_false", help="Do not open the live position plot of the nodes")
+    parser.add_argument("--metrics-port", type=int, default=None, help="Serve per-drone metrics in Prometheus format on this local port")
+    parser.add_argument("--metrics-file", default=None, help="Rewrite the per-drone metrics in Prometheus format to this file")
+    parser.add_argument("--metrics-interval", type=float, default=5.0, help="Seconds between sniffer reports and metrics file writes")
+    args = parser.parse_args()
+
     setLogLevel('info')
-    minimal_topology()
+    minimal_topology(headless=args.headless, workers=args.workers,
+                     replan_threshold=args.replan_threshold, replan_interval=args.replan_interval,
+                     async_control_plane=args.async_control_plane, trace=args.trace, record=args.record,
+                     plot_telemetry=args.plot_telemetry, metrics_port=args.metrics_port, metrics_file=args.metrics_file,
+                     metrics_interval=args.metrics_interval)
@@ -0,0 +1,171 @@
+# Libraries
+import socket
+import threading
+import time
+from collections import OrderedDict
+from trace_log import add_command_trace
+from wire_format import POSITION_ENTRY, encode_position_entries
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to build the command that sets the position of a node in Mininet-WiFi
+def position_command(drone_id, position):
+    """Build the set.<id>.setPosition("x,y,z") command for a Mininet-WiFi position."""
+    return "set.{}.setPosition(\"{},{},{}\")".format(drone_id, position[0], position[1], position[2])
+
+# -----------------------------------------------------------------------------------------------------
+
+# Method of the metrics reports of the sniffers. The topology handles it instead of calling a node method
+METRICS_METHOD = "reportMetrics"
+
+# Function to build the command that reports the metrics of a sniffer
+def metrics_command(drone_id, values):
+    """Build the set.<id>.reportMetrics("name=value,...") command of a sniffer metrics report."""
+    fields = ",".join("{}={}".format(name, value) for name, value in sorted(values.items()))
+    return "set.{}.{}(\"{}\")".format(drone_id, METRICS_METHOD, fields)
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to encode a batch of pending commands
+def encode_batch(commands):
+    """Join the text commands as newline-terminated lines, followed by one message with the binary entries."""
+    lines = "".join(command + "\n" for command in commands if not isinstance(command, bytes)).encode()
+    entries = [command for command in commands if isinstance(command, bytes)]
+    return lines + encode_position_entries(entries) if entries else lines
+
+# -----------------------------------------------------------------------------------------------------
+
+# Class to keep one persistent connection from a container to the topology command server
+class PositionChannel(object):
+    """Persistent, auto-reconnecting command channel written by a background thread.
+
+    Commands are kept in a bounded, ordered mapping instead of a plain queue, so a new setPosition for a
+    drone replaces the one still pending and a slow server only receives the latest position. Binary
+    position entries coalesce the same way and are written as one batch message after the text commands.
+    """
+
+    def __init__(self, ip, port, max_pending=256, reconnect_delay=1.0):
+        self.ip = ip
+        self.port = port
+        self.max_pending = max_pending
+        self.reconnect_delay = reconnect_delay
+        self.pending = OrderedDict()
+        self.condition = threading.Condition()
+        self.sequence = 0
+        self.sock = None
+        self.running = True
+        self.deadline = None  # Time until which close lets the pending commands be written
+
+        # Counters of the channel
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.reconnects = 0
+
+        # Background thread that owns the socket
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def send(self, command, key=None):
+        """Queue a command without blocking. Commands sharing a key replace each other while pending."""
+        with self.condition:
+            if key is None:
+                self.sequence += 1
+                key = ("command", self.sequence)
+            elif key in self.pending:
+                del self.pending[key]
+                self.coalesced += 1
+
+            # Bounded queue: the oldest pending command is dropped when full
+            if len(self.pending) >= self.max_pending:
+                self.pending.popitem(last=False)
+                self.dropped += 1
+
+            self.pending[key] = command
+            self.condition.notify()
+
+    def send_position(self, drone_id, position, trace=None):
+        """Queue a setPosition command, coalesced with any pending position of the same drone."""
+        self.send(add_command_trace(position_command(drone_id, position), trace), key=("setPosition", drone_id))
+
+    def send_position_entry(self, index, position):
+        """Queue the binary position entry of a drone index, coalesced with its pending entry."""
+        self.send(POSITION_ENTRY.pack(index, position[0], position[1], position[2]), key=("entry", index))
+
+    def queue_depth(self):
+        """Number of commands waiting to be written."""
+        with self.condition:
+            return len(self.pending)
+
+    def close(self, timeout=5.0):
+        """Write the pending commands, then stop the background thread and close the connection.
+
+        The commands still pending after timeout seconds, e.g. while the server cannot be reached, are dropped.
+        """
+        with self.condition:
+            self.deadline = time.time() + timeout
+            self.running = False
+            self.condition.notify()
+        self.thread.join(timeout + self.reconnect_delay)
+
+    def active(self):
+        """Whether the channel is open, or closing and still allowed to write its pending commands."""
+        return self.running or time.time() < self.deadline
+
+    def connect(self):
+        """Open the connection to the command server, retrying until it succeeds or the channel closes."""
+        while self.active():
+            try:
+                sock = socket.create_connection((self.ip, self.port))
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                print("Connected to command server {}:{}".format(self.ip, self.port))
+                return sock
+            except OSError as e:
+                print("Failed to connect to command server: {}".format(e))
+                time.sleep(self.reconnect_delay)
+        return None
+
+    def run(self):
+        """Write every pending command as a newline-terminated line on the persistent connection."""
+        while True:
+
+            # Wait for pending commands
+            with self.condition:
+                while self.running and not self.pending:
+                    self.condition.wait()
+                if not self.pending or not self.active():
+                    break
+
+            # Connect before taking the commands, so updates arriving meanwhile still coalesce
+            if self.sock is None:
+                self.sock = self.connect()
+                if self.sock is None:
+                    break
+
+            # Take all pending commands at once
+            with self.condition:
+                batch = list(self.pending.items())
+                self.pending.clear()
+
+            try:
+                self.sock.sendall(encode_batch([command for _, command in batch]))
+                self.sent += len(batch)
+            except OSError as e:
+                print("Failed to send command: {}".format(e))
+                self.sock.close()
+                self.sock = None
+                self.reconnects += 1
+
+                # Put back the commands that were not superseded while sending
+                with self.condition:
+                    for key, command in reversed(batch):
+                        if key not in self.pending:
+                            self.pending[key] = command
+                            self.pending.move_to_end(key, last=False)
+                    while len(self.pending) > self.max_pending:
+                        self.pending.popitem(last=False)
+                        self.dropped += 1
+
+        if self.sock is not None:
+            self.sock.close()
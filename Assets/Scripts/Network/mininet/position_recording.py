@@ -0,0 +1,103 @@
+# Libraries
+import os
+import io
+import json
+import time
+import struct
+import threading
+
+# -----------------------------------------------------------------------------------------------------
+
+# Recording file header: magic, format version and record size
+RECORDING_MAGIC = b"UNPR"
+RECORDING_VERSION = 1
+RECORDING_HEADER = struct.Struct("<4sHH")
+
+# Position record: receive time, drone index in the id table and Unity x, y, z. 24 bytes, little-endian
+POSITION_RECORD = struct.Struct("<dIfff")
+
+# Files of a recording directory: one .posrec file per process, its .ids string table and the handshake
+RECORDING_EXTENSION = ".posrec"
+IDS_EXTENSION = ".ids"
+HANDSHAKE_FILE = "handshake.json"
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to get the string table of a recording file
+def ids_path(path):
+    """Return the path of the drone id table of a .posrec file (one id per line, the line number is the index)."""
+    return os.path.splitext(path)[0] + IDS_EXTENSION
+
+# -----------------------------------------------------------------------------------------------------
+
+# Class to append the received drone positions to a binary recording
+class PositionRecorder(object):
+    """Append-only recording of the positions received by one process.
+
+    Each position is one fixed-size record, so the file can be memory-mapped and scanned without parsing.
+    Drone ids are stored once, in the .ids table, and written before the first record that uses them.
+    Records are flushed every flush_interval seconds, so a killed process loses at most that interval.
+    """
+
+    def __init__(self, path, flush_interval=1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.records = 0
+        self.last_flush = time.time()
+
+        # Appending to an existing recording keeps its id table
+        self.ids = {}
+        if os.path.exists(ids_path(path)):
+            with io.open(ids_path(path), encoding="utf-8") as file:
+                for line in file:
+                    self.ids[line.rstrip("\n")] = len(self.ids)
+        self.ids_file = io.open(ids_path(path), "a", encoding="utf-8")
+
+        self.file = open(path, "ab")
+        if self.file.tell() == 0:
+            self.file.write(RECORDING_HEADER.pack(RECORDING_MAGIC, RECORDING_VERSION, POSITION_RECORD.size))
+            self.file.flush()
+
+    def record(self, drone_id, position, now=None):
+        """Append the Unity (x, y, z) position of drone_id received at now."""
+        if now is None:
+            now = time.time()
+        with self.lock:
+            index = self.ids.get(drone_id)
+            if index is None:
+                index = self.ids[drone_id] = len(self.ids)
+                self.ids_file.write(drone_id + "\n")
+                self.ids_file.flush()
+            self.file.write(POSITION_RECORD.pack(now, index, position[0], position[1], position[2]))
+            self.records += 1
+            if now - self.last_flush >= self.flush_interval:
+                self.file.flush()
+                self.last_flush = now
+
+    def close(self):
+        """Flush the buffered records and close the files."""
+        with self.lock:
+            self.file.close()
+            self.ids_file.close()
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to save the initial Unity message of a recording
+def save_handshake(directory, message):
+    """Write the initial (FirstSpecialMessage) Unity message in the recording directory."""
+    os.makedirs(directory, exist_ok=True)
+    with io.open(os.path.join(directory, HANDSHAKE_FILE), "w", encoding="utf-8") as file:
+        json.dump(message, file)
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to open the position recorder of a process, if recording is enabled
+def open_position_recorder(directory, process):
+    """Return a PositionRecorder writing to <directory>/<process>-<pid>.posrec, or None without directory."""
+    if not directory:
+        return None
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, "{}-{}{}".format(process, os.getpid(), RECORDING_EXTENSION))
+    print("Recording positions to {}".format(path))
+    return PositionRecorder(path)
@@ -0,0 +1,108 @@
+# Libraries
+import socket
+import threading
+from wire_format import WIRE_HEADER, WIRE_MAGIC, decode_positions, message_size
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to parse a set.<node>.<method>(<args>) command
+def parse_command(command):
+    """Split a set.<node>.<method>("<args>") command into (node, method, args). Returns None if invalid."""
+    parts = command.strip().split(".", 2)  # The arguments may contain dots (e.g., float coordinates)
+    if len(parts) < 3 or parts[0] != "set":
+        return None
+
+    method, _, args = parts[2].partition("(")
+    args = args.rsplit(")", 1)[0].replace('"', "").replace("'", "")
+    return parts[1], method, args
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to apply a command to a Mininet-WiFi node
+def apply_command(net, command):
+    """Call the requested method of the node, e.g. set.DRO001A.setPosition("1.0,2.0,3.0")."""
+    parsed = parse_command(command)
+    if parsed is None:
+        print(f"Unrecognized command: {command}")
+        return
+
+    node_name, method, args = parsed
+    try:
+        node = net.getNodeByName(node_name)
+        method_to_call = getattr(node, method)
+        if args:
+            method_to_call(args)
+        else:
+            method_to_call()
+    except Exception as e:
+        print(f"Error applying command {command}: {e}")
+
+# -----------------------------------------------------------------------------------------------------
+
+# Class to receive commands from the drone containers over persistent connections
+class PositionCommandServer:
+    """Replacement for the Mininet-WiFi socketServer that accepts many newline-terminated commands per connection.
+
+    A connection that sends a single command without newline and closes (the previous sniffer behaviour)
+    is still handled, since the last line is applied when the connection ends. Binary position messages
+    (wire_format) may be interleaved with the text commands; their entries go to position_handler.
+    """
+
+    def __init__(self, host, port, handler, position_handler=None):
+        self.host = host
+        self.port = port
+        self.handler = handler
+        self.position_handler = position_handler
+        self.server_socket = None
+
+    def start(self):
+        """Start accepting connections in a background thread."""
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_socket.bind((self.host, self.port))
+        self.server_socket.listen(128)
+        threading.Thread(target=self.accept_connections, daemon=True).start()
+        return self
+
+    def stop(self):
+        """Stop accepting new connections."""
+        if self.server_socket is not None:
+            self.server_socket.close()
+            self.server_socket = None
+
+    def accept_connections(self):
+        """Serve each container connection in its own thread."""
+        while self.server_socket is not None:
+            try:
+                conn, addr = self.server_socket.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.handle_connection, args=(conn,), daemon=True).start()
+
+    def handle_connection(self, conn):
+        """Apply every command received on one connection until it closes."""
+        with conn, conn.makefile("rb") as reader:
+            try:
+                while True:
+                    if reader.peek(1)[:1] == WIRE_MAGIC[:1]:  # Text commands start with "set."
+                        self.handle_binary(reader)
+                        continue
+                    line = reader.readline()
+                    if not line:
+                        break
+                    line = line.decode("utf-8").strip()
+                    if line:
+                        self.handler(line)
+            except (OSError, ValueError) as e:  # UnicodeDecodeError is a ValueError
+                print(f"Command connection closed: {e}")
+
+    def handle_binary(self, reader):
+        """Read one binary position message and pass its (drone index, position) entries to position_handler."""
+        header = reader.read(WIRE_HEADER.size)
+        if len(header) < WIRE_HEADER.size:
+            raise ValueError("truncated binary message")
+        data = header + reader.read(message_size(header) - len(header))
+        if self.position_handler is None:
+            raise ValueError("binary position messages are not handled by this server")
+        for index, position in decode_positions(data):
+            self.position_handler(index, position)
@@ -0,0 +1,287 @@
+# Libraries
+import os
+import sys
+import json
+import argparse
+import itertools
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from handshake_protocol import ConvertUnityPositionToMininetWIFI, parse_initial_positions
+from radio_planning import path_loss_db, tx_power_for_range
+from generate_rssi_graph import RssiSeries, read_rssi_files, rssi_statistics
+
+# The mission log loader lives with the MissionsLogs
+MISSIONS_LOGS_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "MissionsLogs")
+sys.path.insert(0, MISSIONS_LOGS_DIRECTORY)
+from missions_logs import load_missions_log, mission_seconds, missions_log_midnight
+
+# -----------------------------------------------------------------------------------------------------
+
+# Radio configuration of mininet_topo.minimal_topology. tx_power "auto" is the heuristic of radio_planning
+DEFAULT_CONFIGURATION = {"mode": "g", "channel": 1, "noise_th": -91.0, "fading_cof": 3.0, "exponent": 2.0,
+                         "tx_power": "auto", "antenna_gain": 5.0}
+
+# Parameters that can be swept, with their parser
+SWEEP_PARAMETERS = {"mode": str, "channel": int, "noise_th": float, "fading_cof": float, "exponent": float,
+                    "tx_power": lambda value: value if value == "auto" else float(value), "antenna_gain": float}
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to get the carrier frequency of a WiFi channel
+def channel_frequency(channel):
+    """Return the center frequency (Hz) of a channel: 5 GHz band from channel 36 on, 2.4 GHz band below.
+
+    The band follows the channel and not the mode, since mode n runs on both bands.
+    """
+    if channel >= 36:
+        return (5000 + 5 * channel) * 1e6
+    if channel == 14:
+        return 2.484e9
+    return (2407 + 5 * channel) * 1e6
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to resample the mission log trajectories on a common time grid
+def mission_trajectories(df, step=1.0):
+    """Return (times, drone ids, positions) of a MissionsLogs frame.
+
+    Positions is a (T, D, 3) array of Mininet-WiFi coordinates, linearly interpolated every step seconds
+    and NaN outside the logged interval of each drone. Logs that run past midnight stay continuous
+    (missions_logs.mission_seconds). The logger writes Latitude = Unity z, Longitude = Unity x and
+    Altitude = Unity y, which are then swapped as for the Unity positions.
+    """
+    df = df.dropna(subset=["CurrentTime"])
+    seconds = mission_seconds(df["CurrentTime"])
+    seconds = seconds - seconds.min()
+    times = np.arange(0.0, seconds.max() + step, step)
+    groups = df.groupby("PlayerName", observed=True, sort=True).indices
+    positions = np.full((len(times), len(groups), 3), np.nan)
+
+    for d, rows in enumerate(groups.values()):
+        # Several rows may share a second: keep the last one of each timestamp
+        order = rows[np.argsort(seconds[rows], kind="stable")]
+        drone_seconds, last = np.unique(seconds[order][::-1], return_index=True)
+        order = order[::-1][last]
+        unity = (df["Longitude"].to_numpy()[order], df["Altitude"].to_numpy()[order], df["Latitude"].to_numpy()[order])
+
+        inside = (times >= drone_seconds[0]) & (times <= drone_seconds[-1])
+        for axis, values in enumerate(ConvertUnityPositionToMininetWIFI(unity)):
+            positions[inside, d, axis] = np.interp(times[inside], drone_seconds, values)
+
+    return times, [str(drone) for drone in groups], positions
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to predict the RSSI and link state of every drone
+def predict_rssi(positions, ap_position, configuration, seed=0):
+    """Predict the RSSI (dBm) and link state of a (T, D, 3) trajectory array under a log-distance model.
+
+    RSSI = tx power + 2 * antenna gain - log-distance path loss - fading, where the fading loss of each
+    sample is drawn uniformly in [0, fading_cof] dB. The link is up while the RSSI is above noise_th.
+    With tx_power "auto", the AP power comes from the distances at the first logged positions, as the
+    topology does from the handshake.
+    """
+    distances = np.linalg.norm(positions - np.asarray(ap_position, dtype=np.float64), axis=2)
+
+    tx_power = configuration["tx_power"]
+    if tx_power == "auto":
+        logged = ~np.isnan(distances)
+        first = distances[np.argmax(logged, axis=0), np.arange(distances.shape[1])]
+        tx_power = float(tx_power_for_range(np.nanmax(first) if logged.any() else 0.0))
+
+    frequency = channel_frequency(configuration["channel"])
+    rssi = tx_power + 2 * configuration["antenna_gain"] - path_loss_db(distances, configuration["exponent"], frequency)
+    if configuration["fading_cof"] > 0:
+        rssi -= np.random.default_rng(seed).uniform(0.0, configuration["fading_cof"], size=rssi.shape)
+
+    return {"tx_power": tx_power, "rssi": rssi, "link": rssi >= configuration["noise_th"]}
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to summarize the link state of every drone
+def link_statistics(times, link, logged):
+    """Return the availability, number of outages and longest outage (s) of each drone column."""
+    step = times[1] - times[0] if len(times) > 1 else 1.0
+    down = logged & ~link
+    statistics = []
+    for d in range(link.shape[1]):
+        # Outage runs are between the rising and falling edges of the down column
+        runs = np.diff(np.flatnonzero(np.diff(np.concatenate([[0], down[:, d].astype(np.int8), [0]]))))[::2]
+        statistics.append({
+            "availability": float(link[logged[:, d], d].mean()) if logged[:, d].any() else float("nan"),
+            "outages": len(runs),
+            "longest_outage": float(runs.max() * step) if len(runs) else 0.0,
+        })
+    return statistics
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to turn a prediction into the RSSI series of generate_rssi_graph
+def predicted_series(times, drone_ids, prediction):
+    """Return {drone id: RssiSeries} of the logged samples, comparable with the measured DRO*_rssi.csv files."""
+    series = {}
+    for d, drone_id in enumerate(drone_ids):
+        logged = ~np.isnan(prediction["rssi"][:, d])
+        series[drone_id] = RssiSeries(times[logged], prediction["rssi"][logged, d].astype(np.float32))
+    return series
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to compare predicted and measured RSSI statistics
+def statistics_error(predicted, measured):
+    """Mean absolute error (dB) of the mean, p5 and p95 RSSI over the drones present in both, or None."""
+    common = sorted(set(predicted) & set(measured))
+    if not common:
+        return None
+    return float(np.mean([abs(predicted[drone][key] - measured[drone][key]) for drone in common
+                          for key in ("mean", "p5", "p95")]))
+
+# -----------------------------------------------------------------------------------------------------
+
+# Inputs shared by the sweep workers, set once per process
+SWEEP_INPUTS = {}
+
+# Function to initialize a sweep worker
+def init_sweep_worker(inputs):
+    """Keep the trajectories and the measured statistics in the worker instead of sending them with every task."""
+    SWEEP_INPUTS.update(inputs)
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to evaluate one configuration of the sweep
+def evaluate_configuration(configuration):
+    """Predict the RSSI of one configuration and return its summary."""
+    inputs = SWEEP_INPUTS
+    prediction = predict_rssi(inputs["positions"], inputs["ap_position"], configuration, inputs["seed"])
+    predicted = rssi_statistics(predicted_series(inputs["times"], inputs["drone_ids"], prediction), inputs["threshold"])
+    logged = ~np.isnan(prediction["rssi"])
+    links = link_statistics(inputs["times"], prediction["link"], logged)
+    return {
+        "configuration": configuration,
+        "tx_power": prediction["tx_power"],
+        "availability": float(prediction["link"][logged].mean()) if logged.any() else float("nan"),
+        "outages": sum(link["outages"] for link in links),
+        "longest_outage": max((link["longest_outage"] for link in links), default=0.0),
+        "mean_rssi": float(np.nanmean(prediction["rssi"])),
+        "error": statistics_error(predicted, inputs["measured"]) if inputs["measured"] else None,
+        "drones": {drone_id: {**predicted.get(drone_id, {}), **link} for drone_id, link in zip(inputs["drone_ids"], links)},
+    }
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to run a parameter sweep on a process pool
+def run_sweep(inputs, grid, workers=None):
+    """Evaluate every combination of the grid values and return the results, best first.
+
+    With measured statistics, the best configuration is the one whose RSSI statistics match them best.
+    Otherwise it is the one with the highest availability, then the lowest AP power.
+    """
+    names = list(grid)
+    configurations = [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_sweep_worker, initargs=(inputs,)) as pool:
+        results = list(pool.map(evaluate_configuration, configurations,
+                                chunksize=max(1, len(configurations) // (4 * (workers or os.cpu_count() or 1)))))
+
+    if inputs["measured"]:
+        results.sort(key=lambda result: (result["error"] is None, result["error"] or 0.0))
+    else:
+        results.sort(key=lambda result: (-result["availability"], result["tx_power"]))
+    return results
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to write the predicted RSSI in the format of the sniffers
+def write_predicted_rssi(directory, series, time_origin):
+    """Write one <drone>_rssi.csv per drone, as rssi_sampler does, so generate_rssi_graph can plot them.
+
+    The series times are relative to the start of the mission log. As the sampler, the Timestamp column
+    holds Unix times: time_origin is the Unix time of the start of the log (see missions_log_origin).
+    """
+    os.makedirs(directory, exist_ok=True)
+    for drone_id, drone_series in series.items():
+        with open(os.path.join(directory, f"{drone_id}_rssi.csv"), "w") as file:
+            file.write("PlayerName, RSSI, Timestamp\n")
+            file.writelines(f"{drone_id}, {rssi:.1f}, {time_origin + time:.3f}\n"
+                            for time, rssi in zip(drone_series.time, drone_series.rssi))
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to get the Unix time of the first row of a mission log
+def missions_log_origin(csv_file, df):
+    """Return the Unix time of the time 0 of mission_trajectories for the frame df loaded from csv_file."""
+    return missions_log_midnight(csv_file) + float(mission_seconds(df["CurrentTime"].dropna()).min())
+
+# -----------------------------------------------------------------------------------------------------
+
+# Main function
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Predict the drone RSSI of a mission log offline and sweep the radio parameters.")
+    parser.add_argument("missions_log", help="MissionsLogs_*.csv file with the drone trajectories")
+    parser.add_argument("--ap", default=None, help="AP position x,y,z in Mininet-WiFi coordinates")
+    parser.add_argument("--handshake", default=None, help="handshake.json of a recording, to take the AP position from")
+    parser.add_argument("--measured", default=None, help="Directory of measured DRO*_rssi.csv files to compare with")
+    parser.add_argument("--step", type=float, default=1.0, help="Seconds between predicted samples")
+    parser.add_argument("--threshold", type=float, default=-80.0, help="RSSI threshold (dBm) of the time-below statistic")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the fading samples")
+    parser.add_argument("--workers", type=int, default=None, help="Sweep processes (default: one per CPU)")
+    parser.add_argument("--top", type=int, default=10, help="Configurations printed")
+    parser.add_argument("--json", default=None, help="Write every result to this JSON file")
+    parser.add_argument("--write-best", default=None, help="Write the predicted DRO*_rssi.csv of the best configuration here")
+    for name, default in DEFAULT_CONFIGURATION.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", default=str(default),
+                            help=f"Comma-separated values of {name} (default {default}; write --{name.replace('_', '-')}=-91,-85 for negative values)")
+    args = parser.parse_args()
+
+    # Trajectories and AP position
+    missions = load_missions_log(args.missions_log)
+    times, drone_ids, positions = mission_trajectories(missions, args.step)
+    if args.ap:
+        ap_position = [float(value) for value in args.ap.split(",")]
+    elif args.handshake:
+        with open(args.handshake) as file:
+            ap_position = list(parse_initial_positions(json.load(file))["ap_position"])
+    else:
+        ap_position = [float(value) for value in np.nanmean(positions.reshape(-1, 3), axis=0)[:2]] + [0.0]
+        print(f"No --ap or --handshake: using the ground point under the mean drone position {ap_position}")
+    print(f"{len(drone_ids)} drones over {times[-1]:.0f} s, AP at {ap_position}")
+
+    # Measured RSSI statistics, keyed by drone id like the predictions
+    measured = {}
+    if args.measured:
+        measured_series = {name[:-len("_rssi")] if name.endswith("_rssi") else name: series
+                           for name, series in read_rssi_files(args.measured).items()}
+        measured = rssi_statistics(measured_series, args.threshold)
+        print(f"Measured RSSI of {len(measured)} drones in {args.measured}")
+
+    grid = {name: [SWEEP_PARAMETERS[name](value) for value in getattr(args, name).split(",")] for name in DEFAULT_CONFIGURATION}
+    inputs = {"times": times, "drone_ids": drone_ids, "positions": positions, "ap_position": ap_position,
+              "measured": measured, "threshold": args.threshold, "seed": args.seed}
+    results = run_sweep(inputs, grid, args.workers)
+
+    # Ranking
+    print(f"\n{len(results)} configurations, best first:")
+    for rank, result in enumerate(results[:args.top], 1):
+        configuration = " ".join(f"{name}={value}" for name, value in result["configuration"].items())
+        error = f" | error {result['error']:.1f} dB" if result["error"] is not None else ""
+        print(f"{rank:>3}. {configuration} | tx {result['tx_power']:.1f} dBm | availability {result['availability']:.1%} | "
+              f"outages {result['outages']} (longest {result['longest_outage']:.0f} s) | mean {result['mean_rssi']:.1f} dBm{error}")
+
+    best = results[0]
+    print("\nBest configuration per drone:")
+    for drone_id, stats in best["drones"].items():
+        line = (f"  {drone_id}: mean {stats.get('mean', float('nan')):.1f} dBm | p5 {stats.get('p5', float('nan')):.1f} | "
+                f"p95 {stats.get('p95', float('nan')):.1f} | availability {stats['availability']:.1%}")
+        if drone_id in measured:
+            line += (f" | measured mean {measured[drone_id]['mean']:.1f} | p5 {measured[drone_id]['p5']:.1f} | "
+                     f"p95 {measured[drone_id]['p95']:.1f}")
+        print(line)
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+    if args.write_best:
+        prediction = predict_rssi(positions, ap_position, best["configuration"], args.seed)
+        write_predicted_rssi(args.write_best, predicted_series(times, drone_ids, prediction),
+                             missions_log_origin(args.missions_log, missions))
+        print(f"Predicted RSSI of the best configuration written to {args.write_best}")
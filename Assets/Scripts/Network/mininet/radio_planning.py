@@ -0,0 +1,190 @@
+# Libraries
+import time
+import threading
+import numpy as np
+from position_server import parse_command
+
+# -----------------------------------------------------------------------------------------------------
+
+# Speed of light (m/s) and default carrier frequency of mode "g", channel 1 (Hz)
+SPEED_OF_LIGHT = 299792458.0
+DEFAULT_FREQUENCY = 2.412e9
+
+# Maximum WiFi transmission power (dBm)
+MAX_TX_POWER = 30.0
+
+# -----------------------------------------------------------------------------------------------------
+
+# Class to keep the positions of all drones in a single (N, 3) array
+class DronePositionTable:
+    """Positions of the drones in Mininet-WiFi coordinates, updated in place by drone id."""
+
+    def __init__(self, drone_positions=()):
+        self.ids = [drone["id"] for drone in drone_positions]
+        self.index = {drone_id: i for i, drone_id in enumerate(self.ids)}
+        self.positions = np.array([drone["position"] for drone in drone_positions], dtype=np.float64).reshape(-1, 3)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def update(self, drone_id, position):
+        """Set the position of a drone, appending it if it is new. Raises ValueError, leaving the table
+        unchanged, if position is not 3 finite coordinates."""
+        try:
+            position = np.asarray(position, dtype=np.float64)
+        except (TypeError, ValueError):
+            raise ValueError(f"invalid position of {drone_id}: {position!r}")
+        if position.shape != (3,) or not np.isfinite(position).all():
+            raise ValueError(f"invalid position of {drone_id}: {position.tolist()}")
+
+        i = self.index.get(drone_id)
+        if i is None:
+            self.positions = np.vstack([self.positions, position.reshape(1, 3)])
+            self.index[drone_id] = len(self.ids)
+            self.ids.append(drone_id)
+        else:
+            self.positions[i] = position
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to compute the distances between every drone and every AP
+def ap_distances(ap_positions, drone_positions):
+    """Return the (N, M) matrix of Euclidean distances between N drones and M APs."""
+    ap_positions = np.asarray(ap_positions, dtype=np.float64).reshape(-1, 3)
+    drone_positions = np.asarray(drone_positions, dtype=np.float64).reshape(-1, 3)
+    return np.linalg.norm(drone_positions[:, None, :] - ap_positions[None, :, :], axis=2)
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to estimate the path loss with the log-distance model
+def path_loss_db(distances, exponent=2.0, frequency=DEFAULT_FREQUENCY, reference_distance=1.0):
+    """Log-distance path loss (dB): free-space loss at the reference distance plus 10*n*log10(d/d0)."""
+    reference_loss = 20.0 * np.log10(4.0 * np.pi * reference_distance * frequency / SPEED_OF_LIGHT)
+    distances = np.maximum(np.asarray(distances, dtype=np.float64), reference_distance)
+    return reference_loss + 10.0 * exponent * np.log10(distances / reference_distance)
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to derive the AP power from the distance it has to cover
+def tx_power_for_range(max_distance):
+    """Transmission power (dBm) used for a coverage distance, capped at the maximum WiFi power."""
+    return np.minimum(10 + (10 * 1.5 * np.log10(np.asarray(max_distance, dtype=np.float64) + 10)), MAX_TX_POWER)
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to plan the coverage of one or several APs
+def plan_coverage(ap_positions, drone_positions, percentiles=(50, 90, 100), exponent=2.0):
+    """Assign every drone to its best AP and compute the coverage of each AP in one vectorized pass.
+
+    Returns a dictionary with, per drone, the assigned AP, its distance and path loss, and, per AP, the
+    number of drones, the max distance, the distance percentiles and the transmission power.
+    """
+    distances = ap_distances(ap_positions, drone_positions)
+    ap_count = distances.shape[1]
+
+    # The best AP is the closest one, which is also the one with the lowest path loss
+    assignment = np.argmin(distances, axis=1) if len(distances) else np.zeros(0, dtype=np.intp)
+    assigned_distance = distances[np.arange(len(distances)), assignment]
+
+    # Per-AP statistics. An AP without drones covers a distance of 0
+    drone_count = np.bincount(assignment, minlength=ap_count)
+    max_distance = np.zeros(ap_count)
+    np.maximum.at(max_distance, assignment, assigned_distance)
+    coverage_percentiles = np.zeros((ap_count, len(percentiles)))
+    for ap in np.flatnonzero(drone_count):
+        coverage_percentiles[ap] = np.percentile(assigned_distance[assignment == ap], percentiles)
+
+    return {
+        "assignment": assignment,
+        "distance": assigned_distance,
+        "path_loss": path_loss_db(assigned_distance, exponent=exponent),
+        "drone_count": drone_count,
+        "max_distance": max_distance,
+        "percentiles": dict(zip(percentiles, coverage_percentiles.T)),
+        "tx_power": tx_power_for_range(max_distance),
+    }
+
+# -----------------------------------------------------------------------------------------------------
+
+# Class to re-plan the AP coverage while the drones move
+class CoverageReplanner:
+    """Keep the AP power and the Unity coverage radius up to date with the setPosition stream.
+
+    Each update only compares the new AP distance of one drone with its distance at the last plan. The
+    vectorized plan is recomputed when some drone moved more than threshold meters, at most once per
+    interval, and Unity is only notified when the radius itself changes by more than threshold.
+    """
+
+    def __init__(self, ap, ap_position, drone_table, notify, radius, threshold=10.0, interval=1.0):
+        self.ap = ap
+        self.ap_position = ap_position
+        self.drone_table = drone_table
+        self.notify = notify  # Called with the new radius to update Unity
+        self.radius = radius
+        self.threshold = threshold
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.planned_distance = ap_distances(ap_position, drone_table.positions)[:, 0]
+        self.dirty = False
+        self.replans = 0
+
+    def start(self):
+        """Start the re-planning loop in a background thread."""
+        threading.Thread(target=self.run, daemon=True).start()
+        return self
+
+    def observe(self, command):
+        """Update the position table with a set.<id>.setPosition("x,y,z") command. Returns the AP distance, or None
+        if the command is not a valid setPosition of a drone of the table."""
+        parsed = parse_command(command)
+        if parsed is None or parsed[1] != "setPosition":
+            return None
+        drone_id, _, args = parsed
+        try:
+            position = [float(value) for value in args.split(",")]
+        except ValueError:
+            return None
+        if len(position) != 3:
+            return None
+        return self.observe_position(drone_id, position)
+
+    def observe_position(self, drone_id, position):
+        """Update the position table with the (x, y, z) Mininet-WiFi position of a drone. Returns its AP distance,
+        or None for nodes that are not drones of the handshake (the AP, unknown names) and invalid positions."""
+        if drone_id not in self.drone_table.index:
+            return None
+        with self.lock:
+            try:
+                self.drone_table.update(drone_id, position)
+            except ValueError:
+                return None
+            i = self.drone_table.index[drone_id]
+            distance = ap_distances(self.ap_position, position)[0, 0]
+            if i >= len(self.planned_distance) or abs(distance - self.planned_distance[i]) > self.threshold:
+                self.dirty = True
+        return distance
+
+    def run(self):
+        """Re-plan at most once per interval, and only after a drone crossed the threshold."""
+        while True:
+            time.sleep(self.interval)
+            if self.dirty:
+                self.replan()
+
+    def replan(self):
+        """Recompute the coverage and push the new radius to Unity if it changed."""
+        with self.lock:
+            positions = self.drone_table.positions.copy()
+            self.dirty = False
+
+        plan = plan_coverage(self.ap_position, positions)
+        with self.lock:
+            self.planned_distance = plan["distance"]
+        self.replans += 1
+
+        radius = float(plan["max_distance"][0]) + 10
+        if abs(radius - self.radius) > self.threshold:
+            self.ap.wintfs[0].txpower = float(plan["tx_power"][0])
+            print(f"Re-planned coverage: AP power {self.ap.wintfs[0].txpower:.1f} dBm, radius {radius:.1f} m")
+            self.notify(radius)
+            self.radius = radius
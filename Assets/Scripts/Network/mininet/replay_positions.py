@@ -0,0 +1,291 @@
+# Libraries
+import os
+import io
+import sys
+import glob
+import json
+import time
+import struct
+import socket
+import argparse
+import threading
+import numpy as np
+from handshake_protocol import ConvertUnityPositionToMininetWIFI, encode_message
+from position_channel import PositionChannel
+from position_recording import HANDSHAKE_FILE, POSITION_RECORD, RECORDING_EXTENSION, RECORDING_HEADER, RECORDING_MAGIC, ids_path
+from wire_format import DRONE_IP_FIRST_OCTET, DRONE_IP_PREFIX
+
+# -----------------------------------------------------------------------------------------------------
+
+# NumPy view of the records written by position_recording.PositionRecorder
+RECORD_DTYPE = np.dtype([("time", "<f8"), ("drone", "<u4"), ("x", "<f4"), ("y", "<f4"), ("z", "<f4")])
+assert RECORD_DTYPE.itemsize == POSITION_RECORD.size
+
+# Frame header of the broker daemon requests (4-byte big-endian payload length, as in broker_tcp_sender.py)
+FRAME_HEADER = struct.Struct("!I")
+
+# Port of the drone sniffers
+DRONE_PORT = 12345
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to memory-map one recording file
+def read_recording_file(path):
+    """Return (drone ids, records) of a .posrec file. The records are memory-mapped; a partial last record is ignored."""
+    with open(path, "rb") as file:
+        magic, version, record_size = RECORDING_HEADER.unpack(file.read(RECORDING_HEADER.size))
+    if magic != RECORDING_MAGIC or record_size != RECORD_DTYPE.itemsize:
+        raise ValueError(f"{path} is not a position recording")
+
+    count = (os.path.getsize(path) - RECORDING_HEADER.size) // RECORD_DTYPE.itemsize
+    records = (np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=RECORDING_HEADER.size, shape=(count,))
+               if count else np.zeros(0, dtype=RECORD_DTYPE))
+    with io.open(ids_path(path), encoding="utf-8") as file:
+        ids = [line.rstrip("\n") for line in file]
+    return ids, records
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to open a recording directory
+def open_recording(directory):
+    """Return the handshake, the drone id table and the (global drone indices, records) of every file.
+
+    The id table starts with the handshake drones, in handshake order, so an index also gives the drone IP.
+    """
+    handshake = None
+    if os.path.exists(os.path.join(directory, HANDSHAKE_FILE)):
+        with io.open(os.path.join(directory, HANDSHAKE_FILE), encoding="utf-8") as file:
+            handshake = json.load(file)
+
+    ids = [drone["id"] for drone in (handshake or {}).get("drones", [])]
+    table = {drone_id: i for i, drone_id in enumerate(ids)}
+    files = []
+    for path in sorted(glob.glob(os.path.join(directory, "*" + RECORDING_EXTENSION))):
+        file_ids, records = read_recording_file(path)
+        for drone_id in file_ids:
+            if drone_id not in table:
+                table[drone_id] = len(ids)
+                ids.append(drone_id)
+        global_index = np.array([table[drone_id] for drone_id in file_ids], dtype=np.uint32)
+
+        # Records are appended in receive order. Sort the rare out-of-order file in memory
+        times = records["time"]
+        if len(times) > 1 and not np.all(times[1:] >= times[:-1]):
+            records = records[np.argsort(times, kind="stable")]
+        files.append((global_index, records))
+
+    return {"handshake": handshake, "ids": ids, "files": files}
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to merge the files of a recording in time order
+def position_windows(recording, window=10.0):
+    """Yield (times, drone indices, Unity positions) of consecutive time windows, merged across all files.
+
+    Only one window of every file is read at a time, so memory stays bounded on multi-hour recordings.
+    """
+    files = [(global_index, records) for global_index, records in recording["files"] if len(records)]
+    if not files:
+        return
+    first = min(records["time"][0] for _, records in files)
+    last = max(records["time"][-1] for _, records in files)
+    starts = [0] * len(files)
+
+    for edge in np.append(np.arange(first + window, last + window, window), np.inf):
+        parts = []
+        for k, (global_index, records) in enumerate(files):
+            end = int(np.searchsorted(records["time"], edge, side="left"))
+            if end > starts[k]:
+                parts.append((global_index, records[starts[k]:end]))
+                starts[k] = end
+        if not parts:
+            continue
+
+        times = np.concatenate([chunk["time"] for _, chunk in parts])
+        drones = np.concatenate([global_index[chunk["drone"]] for global_index, chunk in parts])
+        positions = np.concatenate([np.column_stack([chunk["x"], chunk["y"], chunk["z"]]) for _, chunk in parts])
+        order = np.argsort(times, kind="stable")
+        yield times[order], drones[order], positions[order]
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to summarize a recording
+def recording_summary(recording):
+    """Return the duration, record count and per-drone record counts of a recording, scanning the mapped files."""
+    ids = recording["ids"]
+    counts = np.zeros(len(ids), dtype=np.int64)
+    first, last = np.inf, -np.inf
+    for global_index, records in recording["files"]:
+        if not len(records):
+            continue
+        counts += np.bincount(global_index[records["drone"]], minlength=len(ids))
+        first = min(first, records["time"][0])
+        last = max(last, records["time"][-1])
+    return {"records": int(counts.sum()), "duration": float(last - first) if counts.sum() else 0.0,
+            "drones": {drone_id: int(count) for drone_id, count in zip(ids, counts)}}
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to build the Position message Unity sends for one drone
+def position_message(drone_id, position):
+    """Encode the Unity Position message of a drone, as EncodeDecode.EncodeSingleDronePositionWithLabelAndID."""
+    x, y, z = position
+    return json.dumps({"label": "Position", "drone": {"position": {"x": x, "y": y, "z": z}, "id": drone_id}},
+                      separators=(",", ":"))
+
+# -----------------------------------------------------------------------------------------------------
+
+# Class to replay the positions into the topology command server, as the sniffers do
+class CommandTarget:
+    """Send setPosition commands through one PositionChannel per drone, like one sniffer container per drone."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.channels = {}
+
+    def send(self, drone_id, position):
+        """Queue the position of one drone, in Unity coordinates."""
+        channel = self.channels.get(drone_id)
+        if channel is None:
+            channel = self.channels[drone_id] = PositionChannel(self.host, self.port)
+        channel.send_position(drone_id, ConvertUnityPositionToMininetWIFI(position))
+
+    def flush(self):
+        """The channels write in the background, so there is nothing to flush."""
+
+    def close(self, timeout=5.0):
+        """Wait for the pending commands to be written, close the channels and return their counters."""
+        deadline = time.perf_counter() + timeout
+        for channel in self.channels.values():
+            channel.close(max(0.0, deadline - time.perf_counter()))
+        return {"sent": sum(channel.sent for channel in self.channels.values()),
+                "coalesced": sum(channel.coalesced for channel in self.channels.values())}
+
+# -----------------------------------------------------------------------------------------------------
+
+# Class to replay the positions through the broker daemon, as Unity does
+class BrokerTarget:
+    """Send the Position messages to the broker daemon in batch frames, so they reach the drone sniffers."""
+
+    def __init__(self, port, ids, max_batch=256):
+        self.connection = socket.create_connection(("127.0.0.1", port))
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.drone_ips = {drone_id: f"{DRONE_IP_PREFIX}{DRONE_IP_FIRST_OCTET + i}" for i, drone_id in enumerate(ids)}
+        self.max_batch = max_batch
+        self.batch = []
+        self.sent = 0
+
+    def send(self, drone_id, position):
+        """Queue the Position message of one drone."""
+        self.batch.append({"dst_ip": self.drone_ips[drone_id], "dst_port": DRONE_PORT,
+                           "message": position_message(drone_id, position)})
+        if len(self.batch) >= self.max_batch:
+            self.flush()
+
+    def flush(self):
+        """Send the queued messages as one {"batch": [...]} frame."""
+        if not self.batch:
+            return
+        payload = json.dumps({"batch": self.batch}, separators=(",", ":")).encode("utf-8")
+        self.connection.sendall(FRAME_HEADER.pack(len(payload)) + payload)
+        self.sent += len(self.batch)
+        self.batch = []
+
+    def close(self):
+        """Close the daemon connection and return the counters."""
+        self.flush()
+        self.connection.close()
+        return {"sent": self.sent, "coalesced": 0}
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to replay the initial Unity message to the topology
+def replay_handshake(host, port, handshake):
+    """Send the recorded initial message and count the coverage replies in the background."""
+    connection = socket.create_connection((host, port))
+    connection.sendall(encode_message(handshake))
+    replies = connection.makefile("r", encoding="utf-8")
+    coverage = [json.loads(replies.readline())["coverageRadius"]]
+    print(f"Handshake replayed, coverage radius {coverage[0]:.1f} m")
+    threading.Thread(target=lambda: coverage.extend(json.loads(line)["coverageRadius"] for line in replies),
+                     daemon=True).start()
+    return connection, coverage
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to replay the position stream
+def replay(recording, target, speed=1.0, window=10.0):
+    """Send every recorded position to target at speed times the recorded pace (0 sends as fast as possible)."""
+    ids = recording["ids"]
+    start = time.perf_counter()
+    first = None
+    replayed = 0
+    late = 0.0
+
+    for times, drones, positions in position_windows(recording, window):
+        if first is None:
+            first = times[0]
+        due = ((times - first) / speed).tolist() if speed > 0 else None
+        positions = np.round(positions.astype(np.float64), 4).tolist()  # Float32 digits only
+
+        for i, drone in enumerate(drones.tolist()):
+            if due is not None:
+                delay = due[i] - (time.perf_counter() - start)
+                if delay > 0.001:
+                    target.flush()
+                    time.sleep(delay)
+                else:
+                    late = max(late, -delay)
+            target.send(ids[drone], positions[i])
+            replayed += 1
+
+    target.flush()
+    return {"replayed": replayed, "elapsed": time.perf_counter() - start, "max_late": late}
+
+# -----------------------------------------------------------------------------------------------------
+
+# Main function
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Replay a recorded Unity position stream without Unity.")
+    parser.add_argument("recording", help="Recording directory (recordings/<run>)")
+    parser.add_argument("--summary", action="store_true", help="Only print the content of the recording")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay pace relative to the recording (0 is as fast as possible)")
+    parser.add_argument("--target", choices=["commands", "broker"], default="commands",
+                        help="Send setPosition commands to the topology, or Position messages through the broker daemon")
+    parser.add_argument("--host", default="127.0.0.1", help="Host of the topology (handshake and command server)")
+    parser.add_argument("--command-port", type=int, default=12346, help="Port of the topology command server")
+    parser.add_argument("--broker-port", type=int, default=55556, help="Port of the broker daemon")
+    parser.add_argument("--no-handshake", action="store_true", help="Do not replay the initial message (topology already running)")
+    args = parser.parse_args()
+
+    recording = open_recording(args.recording)
+    summary = recording_summary(recording)
+    print(f"{args.recording}: {len(recording['files'])} files, {summary['records']} positions of "
+          f"{len(summary['drones'])} drones over {summary['duration']:.1f} s")
+    if args.summary:
+        for drone_id, count in summary["drones"].items():
+            print(f"  {drone_id}: {count} positions, {count / summary['duration'] if summary['duration'] else 0.0:.2f}/s")
+        sys.exit(0)
+
+    # The topology is created from the recorded handshake, as if Unity had connected
+    coverage = None
+    if not args.no_handshake:
+        if recording["handshake"] is None:
+            print(f"No {HANDSHAKE_FILE} in {args.recording}, use --no-handshake")
+            sys.exit(1)
+        connection, coverage = replay_handshake(args.host, 12345, recording["handshake"])
+
+    if args.target == "broker":
+        target = BrokerTarget(args.broker_port, recording["ids"])
+    else:
+        target = CommandTarget(args.host, args.command_port)
+
+    result = replay(recording, target, speed=args.speed)
+    stats = target.close()
+    print(f"Replayed {result['replayed']} positions in {result['elapsed']:.2f} s "
+          f"({result['replayed'] / result['elapsed']:.0f}/s) | sent {stats['sent']} | coalesced {stats['coalesced']} | "
+          f"max lateness {result['max_late'] * 1000:.1f} ms")
+    if coverage is not None:
+        print(f"Coverage replies: {len(coverage)}, last radius {coverage[-1]:.1f} m")
@@ -0,0 +1,112 @@
+# Libraries
+import os
+import re
+import subprocess
+import threading
+import time
+
+# -----------------------------------------------------------------------------------------------------
+
+# Pattern of the signal line printed by "iw dev <iface> link"
+IW_SIGNAL_PATTERN = re.compile(r"signal:\s*(-?\d+)")
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to read the signal level from /proc/net/wireless
+def read_rssi_proc(interface, path="/proc/net/wireless"):
+    """Read the signal level (dBm) of an interface from /proc/net/wireless. Returns None if unavailable."""
+    try:
+        with open(path) as wireless:
+            for line in wireless:
+                name, separator, fields = line.partition(":")
+                if separator and name.strip() == interface:
+                    # Columns: status, link quality, signal level, noise level, ...
+                    level = int(float(fields.split()[2]))
+                    return level if level != 0 else None
+    except (OSError, IndexError, ValueError):
+        pass
+    return None
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to read the signal level with iw (one process, no shell pipeline)
+def read_rssi_iw(interface):
+    """Read the signal level (dBm) of an interface from "iw dev <iface> link". Returns None if unavailable."""
+    try:
+        output = subprocess.check_output(["iw", "dev", interface, "link"], stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    match = IW_SIGNAL_PATTERN.search(output.decode("utf-8", "replace"))
+    return int(match.group(1)) if match else None
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to read the signal level with the cheapest available source
+def read_rssi(interface):
+    """Read the signal level (dBm) from /proc/net/wireless, falling back to iw."""
+    rssi = read_rssi_proc(interface)
+    if rssi is None:
+        rssi = read_rssi_iw(interface)
+    return rssi
+
+# -----------------------------------------------------------------------------------------------------
+
+# Class to sample the RSSI at a fixed rate, decoupled from packet arrival
+class RssiSampler(object):
+    """Sample the RSSI of an interface on its own timer and write it to a buffered CSV file."""
+
+    def __init__(self, player_name, interface, output_file, interval=1.0, flush_interval=5.0):
+        self.player_name = player_name
+        self.interface = interface
+        self.output_file = output_file
+        self.interval = interval
+        self.flush_interval = flush_interval
+        self.last_rssi = None
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """Start sampling in a background thread."""
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stop sampling and flush the remaining samples."""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def run(self):
+        """Take one sample per interval and flush the file periodically."""
+
+        # Append to file, creating it if necessary
+        write_header = not os.path.exists(self.output_file)
+
+        with open(self.output_file, "a", buffering=64 * 1024) as file:
+            if write_header:
+                file.write("PlayerName, RSSI, Timestamp\n")  # Write header if new file
+
+            next_sample = time.monotonic()
+            last_flush = next_sample
+
+            while not self.stop_event.is_set():
+                now = time.monotonic()
+                rssi = read_rssi(self.interface)
+
+                # Samples without an association have no signal level and are skipped. The timestamp is the
+                # wall-clock time, so the samples can be joined with the mission logs written by Unity
+                if rssi is not None:
+                    self.last_rssi = rssi
+                    file.write("{}, {}, {:.3f}\n".format(self.player_name, rssi, time.time()))
+
+                if now - last_flush >= self.flush_interval:
+                    file.flush()
+                    last_flush = now
+
+                # Fixed rate: the next sample time does not drift with the sampling cost
+                next_sample += self.interval
+                self.stop_event.wait(max(0.0, next_sample - time.monotonic()))
+
+        print("RSSI samples of {} saved in {}".format(self.player_name, self.output_file))
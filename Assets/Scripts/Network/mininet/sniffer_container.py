@@ -1,8 +1,61 @@
 # Libraries
 from scapy.all import sniff
+import argparse
+import json
 import socket
-import sys
-import os
+import struct
+import threading
+import time
+from position_channel import PositionChannel, metrics_command
+from position_recording import open_position_recorder
+from rssi_sampler import RssiSampler
+from trace_log import message_trace, open_trace_log
+from wire_format import decode_positions, is_binary_message
+
+# -----------------------------------------------------------------------------------------------------
+
+# Kernel-side filter: TCP segments to port 12345 that carry a payload (no SYN/ACK/FIN-only segments)
+BPF_FILTER = "tcp dst port 12345 and (((ip[2:2] - ((ip[0] & 0xf) << 2)) - ((tcp[12] & 0xf0) >> 2)) != 0)"
+
+# Linux AF_PACKET constants
+ETH_P_IP = 0x0800
+SOL_PACKET = 263
+PACKET_STATISTICS = 6
+
+# -----------------------------------------------------------------------------------------------------
+
+# Class to count the packets handled by the sniffer
+class SnifferStats(object):
+    """Counters of the sniffer, printed periodically to size how many drones a container can follow."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Start a new reporting interval."""
+        self.seen = 0
+        self.parsed = 0
+        self.dropped = 0
+        self.kernel_dropped = 0
+        self.parse_time = 0.0
+
+    def report_periodically(self, interval, kernel_stats=None, report=None):
+        """Print the counters of each interval. kernel_stats returns the drops of the capture socket, and report,
+        if given, is called with the counters of the interval."""
+        while True:
+            time.sleep(interval)
+            with self.lock:
+                if kernel_stats is not None:
+                    self.kernel_dropped += kernel_stats()
+                seen, parsed, dropped, kernel_dropped, parse_time = (
+                    self.seen, self.parsed, self.dropped, self.kernel_dropped, self.parse_time)
+                self.reset()
+            print("(SNIFFER-STATS) {:.1f} pkt/s | seen {} | parsed {} | dropped {} | kernel dropped {} | "
+                  "parse {:.1f} us/pkt".format(seen / interval, seen, parsed, dropped, kernel_dropped,
+                                               parse_time / parsed * 1e6 if parsed else 0.0))
+            if report is not None:
+                report(interval, seen, parsed, dropped, kernel_dropped)
 
 # -----------------------------------------------------------------------------------------------------
 
@@ -14,24 +67,18 @@ def ConvertUnityPositionToMininetWIFI(unity_position):
 
 # -----------------------------------------------------------------------------------------------------
 
-# Function to send a command over TCP
-def send_command(ip, port, command):
-    """Send command over TCP."""
-    try:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            s.connect((ip, port))
-            s.sendall(command.encode())  # Send the command as bytes
-            print("Command sent: {}".format(command))
-    except Exception as e:
-        print("Failed to send command: {}".format(e))
-
-# -----------------------------------------------------------------------------------------------------
-
 # Function to process positions from the message
-def process_positions(message):
-    """Process base station and drone positions from the message."""
+def process_positions(message, received=None):
+    """Process base station and drone positions from the message. received is the capture time of the packet."""
     positions = {}
 
+    # Binary messages carry (drone index, Unity position) entries of this drone. They are forwarded as binary
+    # entries, without formatting a text command
+    for index, position in message.get("positions", ()):
+        if position_recorder is not None:
+            position_recorder.record(hostname, position, received)
+        position_channel.send_position_entry(index, ConvertUnityPositionToMininetWIFI(position))
+
     if "drone" in message:
         drone = message["drone"]
         drone_id = drone["id"]
@@ -43,57 +90,222 @@ def process_positions(message):
         # Store single drone position
         positions["drone_positions"] = [{"id": drone_id, "position": converted_position}]
 
-        # Send command to set drone position
-        command = "set.{}.setPosition(\"{},{},{}\")".format(drone_id, converted_position[0], converted_position[1], converted_position[2])
-        send_command("{}".format(host_ip), 12346, command)
-    
+        # Recordings keep the Unity coordinates, so a replay can resend the original messages
+        if position_recorder is not None:
+            position_recorder.record(drone_id, (drone_position["x"], drone_position["y"], drone_position["z"]), received)
+
+        # Traced messages record when they were captured and parsed, and keep their trace towards the topology
+        trace = message_trace(message)
+        if trace is not None and trace_log is not None:
+            trace_log.record("sniffer_receive", trace[0], trace[1], drone_id, now=received)
+            trace_log.record("sniffer_parse", trace[0], trace[1], drone_id)
+
+        # Queue the command to set drone position. It is written by the channel thread
+        position_channel.send_position(drone_id, converted_position, trace)
+        if trace is not None and trace_log is not None:
+            trace_log.record("sniffer_forward", trace[0], trace[1], drone_id)
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to handle the payload of one packet
+def handle_payload(raw_data, received=None):
+    """Decode the payload, set the drone position and update the counters."""
+    start = time.perf_counter()
+    message = decode_message(raw_data)  # Extract formatted message from payload
+    if message:
+        process_positions(message, received)  # Process and set positions
+    elapsed = time.perf_counter() - start
+
+    with stats.lock:
+        stats.seen += 1
+        if message:
+            stats.parsed += 1
+            stats.parse_time += elapsed
+        else:
+            stats.dropped += 1
+
 # -----------------------------------------------------------------------------------------------------
 
 # Function to process the packet and extract the message
 def packet_callback(packet):
     """Callback function for packet sniffing."""
-    print(packet.show2())  # Print detailed packet info
-    message = extract_message_from_packet(packet)  # Extract formatted message from packet
-    positions = process_positions(message)  # Process and set positions
-    log_rssi()  # Log RSSI for this drone
+    if args.debug:
+        print(packet.show2())  # Print detailed packet info
+    handle_payload(extract_payload_from_packet(packet), float(packet.time))
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to extract the payload from a scapy packet
+def extract_payload_from_packet(packet):
+    """Return the TCP payload of a dissected packet."""
+    raw = packet.getlayer("Raw")
+    return bytes(raw.load) if raw is not None else b""
 
 # -----------------------------------------------------------------------------------------------------
 
 # Function to extract the message from the packet
 def extract_message_from_packet(packet):
     """Extract JSON message from packet payload."""
+    return decode_message(extract_payload_from_packet(packet))
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to decode the message carried in a payload
+def decode_message(raw_data):
+    """Decode a JSON or binary (wire_format) payload into a dictionary. Returns an empty dictionary if it is invalid."""
     try:
-        raw_data = bytes(packet["Raw"].load).decode("utf-8")
-        import json
-        return json.loads(raw_data)  # Convert to dictionary
+        if is_binary_message(raw_data):
+            return {"positions": decode_positions(raw_data)}
+        return json.loads(raw_data.decode("utf-8"))  # Convert to dictionary
     except Exception as e:
         print("Error extracting message:", e)
         return {}
 
 # -----------------------------------------------------------------------------------------------------
 
-# Function to log RSSI
-def log_rssi():
-    """Logs RSSI to a file dynamically based on hostname."""
-    rssi = os.popen("iw dev {}-wlan0 link | grep 'signal' | awk '{{print $2}}'".format(hostname)).read().strip()
-    output_file = "/root/{}_rssi.csv".format(hostname)  # File path
+# Function to slice the TCP payload out of a raw frame
+def extract_payload_from_frame(frame):
+    """Return the TCP payload of an Ethernet/IPv4/TCP frame without dissecting it."""
+    if len(frame) < 54 or frame[12:14] != b"\x08\x00":
+        return b""
+    ip_header_length = (frame[14] & 0x0F) * 4
+    ip_total_length = struct.unpack_from("!H", frame, 16)[0]  # Excludes any Ethernet padding
+    tcp_start = 14 + ip_header_length
+    tcp_header_length = (frame[tcp_start + 12] >> 4) * 4
+    return frame[tcp_start + tcp_header_length:14 + ip_total_length]
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to open an AF_PACKET socket with the kernel filter attached
+def open_capture_socket(iface):
+    """Open a raw socket on the interface that only receives frames matching BPF_FILTER."""
+    from scapy.arch.linux import attach_filter
+
+    capture = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_IP))
+    capture.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    attach_filter(capture, BPF_FILTER, iface)
+    capture.bind((iface, ETH_P_IP))
+    return capture
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to capture with the raw socket, without scapy dissection
+def sniff_fast(capture):
+    """Receive raw frames and slice their payload directly."""
 
-    # Append to file, creating it if necessary
-    write_header = not os.path.exists(output_file)
+    def kernel_drops():
+        """Packets dropped by the kernel since the last call (the counters reset when read)."""
+        _, drops = struct.unpack("II", capture.getsockopt(SOL_PACKET, PACKET_STATISTICS, 8))
+        return drops
 
-    with open(output_file, "a") as file:
-        if write_header:
-            file.write("PlayerName, RSSI\n")  # Write header if new file
-        file.write("{}, {}\n".format(hostname, rssi))  # Log RSSI
+    start_stats(kernel_drops)
+    try:
+        while True:
+            frame, address = capture.recvfrom(65535)
+            received = time.time()
+            if address[2] == socket.PACKET_OUTGOING:
+                continue
+            if args.debug:
+                from scapy.all import Ether
+                print(Ether(frame).show2())  # Print detailed packet info
+            handle_payload(extract_payload_from_frame(frame), received)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        capture.close()
 
-    print("Logged RSSI: {} dBm in {}".format(rssi, output_file))
+# -----------------------------------------------------------------------------------------------------
+
+# Function to report the metrics of the sniffer to the topology
+def report_metrics(interval, seen, parsed, dropped, kernel_dropped):
+    """Send the counters of the interval, the last RSSI and the channel state as a coalesced metrics command."""
+    values = {"interval": interval, "seen": seen, "parsed": parsed, "dropped": dropped, "kernel_dropped": kernel_dropped,
+              "queue": position_channel.queue_depth(), "channel_dropped": position_channel.dropped}
+    if rssi_sampler.last_rssi is not None:
+        values["rssi"] = rssi_sampler.last_rssi
+    position_channel.send(metrics_command(hostname, values), key=("metrics", hostname))
 
 # -----------------------------------------------------------------------------------------------------
 
-# Get the hostname and host IP
-hostname = socket.gethostname()
-print("Hostname:", hostname)
-host_ip = sys.argv[1]
+# Function to start the periodic statistics report
+def start_stats(kernel_stats=None):
+    """Print the sniffer counters every --stats-interval seconds, and report them to the topology with --metrics."""
+    if args.stats_interval > 0:
+        report = report_metrics if args.metrics else None
+        reporter = threading.Thread(target=stats.report_periodically, args=(args.stats_interval, kernel_stats, report))
+        reporter.daemon = True
+        reporter.start()
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to set the state used by handle_payload when the module is imported instead of run
+def init_forwarding(channel, name, recorder=None, trace=None):
+    """Set the command channel, hostname, position recorder, trace log and counters of process_positions and handle_payload.
+
+    The script sets them from its options. benchmark_bridge imports the module and calls this instead, so it
+    measures the same decoding and forwarding code.
+    """
+    global position_channel, hostname, position_recorder, trace_log, stats
+    position_channel = channel
+    hostname = name
+    position_recorder = recorder
+    trace_log = trace
+    stats = SnifferStats()
+
+# -----------------------------------------------------------------------------------------------------
+
+# Main function
+if __name__ == "__main__":
+
+    # Command line options
+    parser = argparse.ArgumentParser(description="Sniff drone messages and forward their positions to Mininet-WiFi.")
+    parser.add_argument("host_ip", help="IP of the topology command server")
+    parser.add_argument("--fast", action="store_true", help="Capture with an AF_PACKET socket, without scapy dissection")
+    parser.add_argument("--debug", action="store_true", help="Print every packet (slow)")
+    parser.add_argument("--stats-interval", type=float, default=10.0, help="Seconds between counter reports (0 disables)")
+    parser.add_argument("--trace", default=None, help="Directory of the trace log of traced messages (disabled by default)")
+    parser.add_argument("--record", default=None, help="Directory of the position recording (disabled by default)")
+    parser.add_argument("--metrics", action="store_true", help="Send the counters, RSSI and queue depth to the topology every --stats-interval")
+    args = parser.parse_args()
+
+    # Get the hostname and host IP
+    hostname = socket.gethostname()
+    print("Hostname:", hostname)
+    host_ip = args.host_ip
+    iface = "{}-wlan0".format(hostname)
+    stats = SnifferStats()
+
+    # Per-process trace log, only with --trace
+    trace_log = open_trace_log(args.trace, "sniffer-{}".format(hostname))
+
+    # Per-process position recording, only with --record
+    position_recorder = open_position_recorder(args.record, "sniffer-{}".format(hostname))
+
+    # Persistent connection to the command server of the topology
+    position_channel = PositionChannel(host_ip, 12346)
+
+    # Log RSSI for this drone at a fixed rate, independently of the received packets
+    rssi_sampler = RssiSampler(hostname, iface, "/root/{}_rssi.csv".format(hostname)).start()
+
+    # Open the raw capture socket of the fast mode
+    capture = None
+    if args.fast:
+        try:
+            capture = open_capture_socket(iface)
+        except (OSError, ImportError) as e:
+            print("Fast capture unavailable, using scapy sniff: {}".format(e))
+
+    # Start sniffing on the correct interface
+    if capture is not None:
+        sniff_fast(capture)
+    else:
+        start_stats()
+        sniff(iface=iface, filter=BPF_FILTER, prn=packet_callback, store=False)
 
-# Start sniffing on the correct interface
-sniff(iface="{}-wlan0".format(hostname), filter="dst port 12345", prn=packet_callback)
\ No newline at end of file
+    # Flush the pending positions, remaining RSSI samples, trace records and recorded positions once sniffing stops
+    position_channel.close()
+    rssi_sampler.stop()
+    if trace_log is not None:
+        trace_log.close()
+    if position_recorder is not None:
+        position_recorder.close()
@@ -0,0 +1,86 @@
+# Libraries
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+import tracemalloc
+from handshake_protocol import JsonMessageReader, encode_message, parse_initial_positions
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to build the initial message Unity sends for a given number of drones
+def build_initial_message(drone_count):
+    """Build a FirstSpecialMessage with one base station and drone_count drones."""
+    return {
+        "label": "FirstSpecialMessage",
+        "baseStation": {"position": {"x": 250.0, "y": 30.0, "z": 250.0}, "id": "ap1"},
+        "drones": [
+            {"position": {"x": 100.0 + i % 100, "y": 0.2, "z": 100.0 + i // 100}, "id": f"DRO{i + 1:04d}"}
+            for i in range(drone_count)
+        ],
+    }
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to act as a fake Unity client
+def fake_unity_client(port, payload, segment_size, delay):
+    """Connect to the receiver and send the payload in small segments, as a slow network would."""
+    with socket.create_connection(("127.0.0.1", port)) as client_socket:
+        client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        for offset in range(0, len(payload), segment_size):
+            client_socket.sendall(payload[offset:offset + segment_size])
+            if delay:
+                time.sleep(delay)
+        client_socket.recv(1)  # Keep the connection open until the receiver is done
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to run one stress scenario
+def run_scenario(drone_count, framed, segment_size, delay):
+    """Receive the initial message over loopback and return (drones parsed, parse time, peak memory)."""
+    message = build_initial_message(drone_count)
+    payload = encode_message(message) if framed else json.dumps(message, indent=2).encode("utf-8")
+
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server_socket.bind(("127.0.0.1", 0))
+    server_socket.listen(1)
+    port = server_socket.getsockname()[1]
+
+    client = threading.Thread(target=fake_unity_client, args=(port, payload, segment_size, delay))
+    client.start()
+
+    client_socket, _ = server_socket.accept()
+    tracemalloc.start()
+    start = time.perf_counter()
+    positions = parse_initial_positions(JsonMessageReader(client_socket).read_message())
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    client_socket.close()
+    server_socket.close()
+    client.join()
+    return len(positions.get("drone_positions", [])), len(payload), elapsed, peak
+
+# -----------------------------------------------------------------------------------------------------
+
+# Main function
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Stress the initial Unity handshake with a fake Unity client.")
+    parser.add_argument("--drones", type=int, default=1000, help="Number of drones in the initial message")
+    parser.add_argument("--segment-size", type=int, default=1400, help="Bytes written per send() by the client")
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds between segments")
+    args = parser.parse_args()
+
+    failed = False
+    for framed in (True, False):
+        parsed, size, elapsed, peak = run_scenario(args.drones, framed, args.segment_size, args.delay)
+        status = "OK" if parsed == args.drones else "FAILED"
+        failed = failed or parsed != args.drones
+        print(f"{'framed' if framed else 'unframed':>8}: {status} | {parsed}/{args.drones} drones | "
+              f"{size / 1024:.1f} KiB | parse {elapsed * 1000:.1f} ms | peak memory {peak / 1024:.1f} KiB")
+
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,162 @@
+# Libraries
+import os
+import json
+import time
+import struct
+import threading
+
+# -----------------------------------------------------------------------------------------------------
+
+# Trace file header: magic, format version and process name
+TRACE_MAGIC = b"UNTR"
+TRACE_VERSION = 1
+TRACE_HEADER = struct.Struct("<4sH32s")
+
+# Trace record: event time, origin time (Unity), sequence id, event code and drone id. 40 bytes, little-endian
+TRACE_RECORD = struct.Struct("<ddIB16s3x")
+
+# Hops of a position update, in path order
+TRACE_EVENTS = ["broker_receive", "broker_send", "sniffer_receive", "sniffer_parse", "sniffer_forward", "topology_apply"]
+EVENT_CODES = dict((name, code) for code, name in enumerate(TRACE_EVENTS, 1))
+
+# Separator of the trace suffix of a position command: set.<id>.setPosition("x,y,z")<TAB><seq><TAB><origin>
+TRACE_SEPARATOR = "\t"
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to get the trace of a decoded Unity message
+def message_trace(message):
+    """Return (seq, origin) of a message carrying {"trace": {"seq": ..., "t0": ...}}, or None."""
+    trace = message.get("trace") if isinstance(message, dict) else None
+    if not trace:
+        return None
+    try:
+        return int(trace["seq"]), float(trace["t0"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to get the trace and drone id of an encoded Unity message
+def text_trace(text):
+    """Return (seq, origin, drone_id) of a JSON message string, or None if it carries no trace."""
+    if '"trace"' not in text:
+        return None
+    try:
+        message = json.loads(text)
+    except ValueError:
+        return None
+    trace = message_trace(message)
+    if trace is None:
+        return None
+    return trace[0], trace[1], message.get("drone", {}).get("id", "")
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to append a trace to a position command
+def add_command_trace(command, trace):
+    """Append the (seq, origin) trace to a command line. Commands without trace are returned unchanged."""
+    if trace is None:
+        return command
+    return "{}{}{}{}{:.6f}".format(command, TRACE_SEPARATOR, trace[0], TRACE_SEPARATOR, trace[1])
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to split the trace suffix of a position command
+def split_command_trace(line):
+    """Return (command, (seq, origin) or None) for a command line, with or without trace suffix."""
+    if TRACE_SEPARATOR not in line:
+        return line, None
+    command, seq, origin = line.split(TRACE_SEPARATOR, 2)
+    try:
+        return command, (int(seq), float(origin))
+    except ValueError:
+        return command, None
+
+# -----------------------------------------------------------------------------------------------------
+
+# Class to record trace events in a ring buffer flushed to a per-process file
+class TraceLog(object):
+    """Fixed-size binary trace records of one process.
+
+    Recording packs one record into an in-memory ring under a lock, so it costs the same whatever the
+    load. A background thread appends the new records to the file every flush_interval seconds. If the
+    ring wraps before a flush, the oldest records are lost and counted in lost.
+    """
+
+    def __init__(self, path, process, capacity=65536, flush_interval=1.0):
+        self.path = path
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.ring = bytearray(TRACE_RECORD.size * capacity)
+        self.lock = threading.Lock()
+        self.file_lock = threading.Lock()
+        self.written = 0
+        self.flushed = 0
+        self.lost = 0
+        self.stopped = threading.Event()
+
+        self.file = open(path, "ab")
+        if self.file.tell() == 0:
+            self.file.write(TRACE_HEADER.pack(TRACE_MAGIC, TRACE_VERSION, process.encode("utf-8")[:32]))
+            self.file.flush()
+
+    def start(self):
+        """Start the flushing thread."""
+        flusher = threading.Thread(target=self.run)
+        flusher.daemon = True
+        flusher.start()
+        return self
+
+    def record(self, event, seq, origin, drone_id, now=None):
+        """Record that the update seq of drone_id, created at origin, reached event."""
+        if now is None:
+            now = time.time()
+        with self.lock:
+            offset = (self.written % self.capacity) * TRACE_RECORD.size
+            TRACE_RECORD.pack_into(self.ring, offset, now, origin, seq & 0xFFFFFFFF, EVENT_CODES[event],
+                                   drone_id.encode("utf-8")[:16])
+            self.written += 1
+
+    def flush(self):
+        """Append the records written since the last flush to the file."""
+        with self.file_lock:
+            with self.lock:
+                start = max(self.flushed, self.written - self.capacity)
+                self.lost += start - self.flushed
+                end = self.written
+                first = start % self.capacity
+                count = end - start
+                if first + count <= self.capacity:
+                    data = bytes(self.ring[first * TRACE_RECORD.size:(first + count) * TRACE_RECORD.size])
+                else:
+                    data = bytes(self.ring[first * TRACE_RECORD.size:]) + \
+                        bytes(self.ring[:(first + count - self.capacity) * TRACE_RECORD.size])
+                self.flushed = end
+            if data:
+                self.file.write(data)
+                self.file.flush()
+
+    def run(self):
+        """Flush periodically until closed."""
+        while not self.stopped.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        """Flush the remaining records and close the file."""
+        self.stopped.set()
+        self.flush()
+        with self.file_lock:
+            self.file.close()
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to open the trace log of a process, if tracing is enabled
+def open_trace_log(directory, process):
+    """Return a started TraceLog writing to <directory>/<process>-<pid>.trace, or None without directory."""
+    if not directory:
+        return None
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, "{}-{}.trace".format(process, os.getpid()))
+    print("Tracing to {}".format(path))
+    return TraceLog(path, process).start()
@@ -0,0 +1,101 @@
+# Libraries
+import json
+import struct
+
+# -----------------------------------------------------------------------------------------------------
+
+# Message header: magic, format version, message kind and entry count. 6 bytes, little-endian
+WIRE_MAGIC = b"UW"
+WIRE_VERSION = 1
+WIRE_HEADER = struct.Struct("<2sBBH")
+
+# Kind of the position messages
+KIND_POSITIONS = 1
+
+# Position entry: drone index and x, y, z. 14 bytes. Unity coordinates from the broker to the sniffers,
+# Mininet-WiFi coordinates from the sniffers to the topology
+POSITION_ENTRY = struct.Struct("<Hfff")
+MAX_ENTRIES = 0xFFFF
+
+# Drone addresses, assigned in handshake order by Unity and mininet_topo: the drone index is the last
+# octet minus DRONE_IP_FIRST_OCTET, and the index of the drone in the handshake message
+DRONE_IP_PREFIX = "10.0.0."
+DRONE_IP_FIRST_OCTET = 101
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to check whether a payload is a binary message
+def is_binary_message(data):
+    """Return True if data starts with the binary magic. JSON messages and text commands never do."""
+    return data[:2] == WIRE_MAGIC
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to encode position entries that are already packed
+def encode_position_entries(entries):
+    """Return the position messages carrying the packed POSITION_ENTRY entries, MAX_ENTRIES per message."""
+    messages = []
+    for start in range(0, len(entries), MAX_ENTRIES):
+        chunk = entries[start:start + MAX_ENTRIES]
+        messages.append(WIRE_HEADER.pack(WIRE_MAGIC, WIRE_VERSION, KIND_POSITIONS, len(chunk)) + b"".join(chunk))
+    return b"".join(messages)
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to encode the positions of one or several drones
+def encode_positions(positions):
+    """Encode a list of (drone index, (x, y, z)) as binary position messages."""
+    return encode_position_entries([POSITION_ENTRY.pack(index, position[0], position[1], position[2])
+                                    for index, position in positions])
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to get the size of a message from its header
+def message_size(header):
+    """Return the total size of the message starting with header. Raises ValueError if it is not supported."""
+    magic, version, kind, count = WIRE_HEADER.unpack(header[:WIRE_HEADER.size])
+    if magic != WIRE_MAGIC:
+        raise ValueError("not a binary message")
+    if version != WIRE_VERSION or kind != KIND_POSITIONS:
+        raise ValueError("unsupported binary message (version {}, kind {})".format(version, kind))
+    return WIRE_HEADER.size + count * POSITION_ENTRY.size
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to decode the position messages of a payload
+def decode_positions(data):
+    """Return the (drone index, (x, y, z)) entries of the binary messages in data. Raises ValueError if truncated."""
+    positions = []
+    offset = 0
+    while offset < len(data):
+        size = message_size(data[offset:offset + WIRE_HEADER.size])
+        if offset + size > len(data):
+            raise ValueError("truncated binary message")
+        for index, x, y, z in POSITION_ENTRY.iter_unpack(data[offset + WIRE_HEADER.size:offset + size]):
+            positions.append((index, (x, y, z)))
+        offset += size
+    return positions
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to get the drone index of a drone address
+def drone_index_from_ip(ip):
+    """Return the handshake index of the drone with address 10.0.0.<DRONE_IP_FIRST_OCTET + index>."""
+    return int(ip.rsplit(".", 1)[1]) - DRONE_IP_FIRST_OCTET
+
+# -----------------------------------------------------------------------------------------------------
+
+# Function to convert a Unity message to the binary format when possible
+def encode_unity_message(dst_ip, message):
+    """Return the binary encoding of an untraced Position message, or the JSON message unchanged.
+
+    Traced messages keep their JSON form, since the binary entries carry no trace.
+    """
+    if '"trace"' in message:
+        return message
+    try:
+        drone = json.loads(message)["drone"]
+        position = drone["position"]
+        return encode_positions([(drone_index_from_ip(dst_ip), (position["x"], position["y"], position["z"]))])
+    except (ValueError, KeyError, TypeError, IndexError, struct.error):
+        return message